@@ -41,8 +41,6 @@
 #          the rows and columns
 #TODO: implement transpose and dot product, in relation to quadratic and 
 #          bilinear forms ? 
-#TODO: chi2 distribution/non-central chi2 for the lengths 
-#          (other distributions?)
 #TODO: cleanup the 'square' function 
 #          (now that it is clear that it's half of an SVD)
 #TODO: understand the relationship between these and a hessian matrix.
@@ -87,12 +85,17 @@ Many of the examples only proove that I'm being consistant.
 """
 ############  imports
 
+## builtin
+import mmap
+import itertools
+import collections
+import multiprocessing
+
 ## 3rd party
 import numpy
 numpy.seterr(all = 'ignore')
 
 
-import scipy.stats.distributions
 
 ## local
 import mvn.helpers as helpers
@@ -103,6 +106,7 @@ import mvn.square as square
 
 from mvn.matrix import Matrix
 from mvn.mixture import Mixture
+from mvn.chi2 import GeneralizedChi2, GeneralizedChi
 
 #decorations
 import mvn.decorate as decorate
@@ -111,13 +115,16 @@ import mvn.decorate as decorate
 from mvn.plane import Plane
         
 
-#plotters
+#plotters, they import matplotlib when they're used
 import mvn.plot
 
-#cdf
-import mvn.mvncdf as mvncdf
+#the cdf (:py:mod:`mvn.mvncdf`) pulls in scipy.stats, so it's only imported 
+#when it's used
+
+#sequence engines
+import mvn.filters as filters
 
-__all__ = ['Mvn']
+__all__ = ['Mvn', 'MvnArray', 'SqrtMvn', 'InfoMvn', 'MvnAccumulator']
 
 Mvn = decorate.underConstruction('Mvn')
 Mvn.T = decorate.underConstruction('Mvn.T')
@@ -192,40 +199,119 @@ class Mvn(Plane):
         
         
         """
-        #stack everything to check sizes and automatically inflate any 
-        #functions that were passed in
-        
         if callable(var):
             default = 0
         else:
             var = numpy.array(var).flatten()[:, None]
             default = var.size
 
-        var = var if callable(var) else numpy.array(var).flatten()[:, None]
         mean = mean if callable(mean) else numpy.array(mean).flatten()[None, :]
         vectors = vectors if callable(vectors) else Matrix(vectors)
         
-        stack = helpers.autoshape([
-            [var, vectors],
-            [1  , mean   ],
-        ],default = default)
+        if callable(var) or callable(mean) or callable(vectors):
+            #stack everything to check sizes and automatically inflate any 
+            #functions that were passed in
+            stack = helpers.autoshape([
+                [var, vectors],
+                [1  , mean   ],
+            ],default = default)
 
-        #unpack the stack into the object's parameters
-        self.mean = Matrix(stack[1, 1])
-        self.var = numpy.array(stack[0, 0]).flatten()
-        self.vectors = Matrix(stack[0, 1])
+            (var, vectors, mean) = (stack[0, 0], stack[0, 1], stack[1, 1])
+
+        #everything is a fresh array by now, so wrap them without copying
+        self.mean = Matrix(mean, copy=False)
+        self.var = numpy.asarray(var).ravel()
+        self.vectors = Matrix(vectors, copy=False)
         
-        assert  (numpy.isreal(numpy.asarray(self.mean)).all() 
-            and numpy.isreal(numpy.asarray(self.var)).all()
-            and numpy.isreal(numpy.asarray(self.vectors)).all()
+        assert  all(
+            numpy.isrealobj(item) or numpy.isreal(item).all()
+            for item in (self.mean, self.var, self.vectors)
         ),'real numbers only'
 
         self.cannonize(**kwargs)
+
+    @classmethod
+    def _fromParts(cls, mean, var, vectors, canonical=False, **kwargs):
+        """
+        :param mean: *shape=(1,ndim)* :py:class:`mvn.matrix.Matrix`
+        :param var: *shape=(rank,)* real array
+        :param vectors: *shape=(rank,ndim)* :py:class:`mvn.matrix.Matrix`
+        :param canonical: set it if the vectors are already unitary and 
+            squeezed, to skip :py:meth:`mvn.Mvn.cannonize`
+        :param ** kwargs: passed on to :py:meth:`mvn.Mvn.cannonize`
+
+        the trusted constructor used by the operators. The parts are used as 
+        they are, with no checks, and no copies, so they must already have 
+        the right types and shapes, and must not be shared with another 
+        object.
+
+        >>> X = Mvn._fromParts(
+        ...     mean=A.mean+B.mean,
+        ...     var=numpy.concatenate([A.var, B.var]),
+        ...     vectors=Matrix(numpy.vstack([A.vectors, B.vectors])),
+        ... )
+        >>> assert X == A+B
+        """
+        result = cls.__new__(cls)
+
+        #the object is new, so skip __setattr__ and the property setters
+        state = result.__dict__
+        state['mean'] = mean
+        state['_var'] = var
+        state['_vectors'] = vectors
+        state['_cache'] = {}
+
+        if not canonical:
+            result.cannonize(**kwargs)
+
+        return result
         
     def cannonize(self, square=True, squeeze=True):
         """
         called at the end if :py:meth:`mvn.Mvn.__init__`, used to put the object 
         into a cannonical form
+
+        The work is deferred until the cannonical form is observed, by reading 
+        :py:attr:`mvn.Mvn.var` or :py:attr:`mvn.Mvn.vectors` (and so 
+        :py:attr:`mvn.Mvn.cov`, ==, :py:meth:`mvn.Mvn.det`, 
+        :py:meth:`mvn.Mvn.plot` ...). Until then the operators that only need 
+        the covariance work directly on the unsquared rows, so a long 
+        expression pays for one decomposition at the end, instead of one per 
+        operator:
+
+        >>> X = A+B
+        >>> assert X._pending
+        >>> assert X.vectors*X.vectors.H == Matrix.eye
+        >>> assert not X._pending
+        >>> assert X.cov == A.cov+B.cov
+
+        If the unsquared rows get too numerous (more than 
+        :py:attr:`mvn.Mvn.maxRows` times the number of dimensions) the work 
+        is done immediately.
+        """
+        self._pending = (square, squeeze)
+
+        if self._var.size > self.maxRows*max(self.mean.size, 1):
+            self._settle()
+
+    maxRows = 2
+    """
+    the number of unsquared rows, per dimension, that 
+    :py:meth:`mvn.Mvn.cannonize` will let build up before squaring them
+    """
+
+    lowRank = 0.25
+    """
+    when one side of a sum has a rank of at most this fraction of the 
+    other's, :py:meth:`mvn.Mvn._addMvn` updates the other's 
+    eigen-decomposition instead of stacking them
+    """
+
+    _pending = None
+
+    def _cannonize(self, square=True, squeeze=True):
+        """
+        put the object into a cannonical form, now.
         """
         if square:
             self.copy(self.square())
@@ -233,6 +319,199 @@ class Mvn(Plane):
         if squeeze:
             self.copy(self.squeeze())
 
+    def _settle(self):
+        """
+        do any work deferred by :py:meth:`mvn.Mvn.cannonize`
+        """
+        pending = self._pending
+        if pending:
+            self._pending = None
+            self._cannonize(*pending)
+
+    def _raw(self):
+        """
+        get the (var, vectors), without waiting for any pending 
+        :py:meth:`mvn.Mvn.cannonize`. The vectors may not be squared, but they 
+        give the same covariance.
+
+        >>> (var, vectors) = (A+B)._raw()
+        >>> assert numpy.multiply(vectors.H, var)*vectors == (A+B).cov
+        """
+        return (self._var, self._vectors)
+
+    def _unsquared(self):
+        """
+        True if :py:meth:`mvn.Mvn._raw` may return unsquared vectors
+        """
+        return bool(self._pending and self._pending[0])
+
+    def __setstate__(self, state):
+        """
+        older pickles stored the var and vectors directly. The cache and the 
+        frozen flag are not restored (see :py:meth:`mvn.Mvn.freeze`)
+        """
+        state = dict(state)
+        for name in ('var', 'vectors'):
+            if name in state:
+                state['_'+name] = state.pop(name)
+
+        state['_cache'] = {}
+        state.pop('_frozen', None)
+        self.__dict__.update(state)
+
+    def __copy__(self):
+        """
+        shallow copies share the cache, see :py:meth:`mvn.Mvn._memo`
+        """
+        result = type(self).__new__(type(self))
+        result.__dict__.update(self.__dict__)
+        return result
+
+    ############## cached quantities
+    _frozen = False
+
+    def _memo(self, key, calculate):
+        """
+        :param key: the name of the cached quantity
+        :param calculate: a function that calculates it, from self
+
+        look up a quantity, that only depends on the var and vectors, in the 
+        instance's cache, calculating it if it isn't there. The result is 
+        made read-only so it can't be modified by accident.
+
+        Setting the var or vectors replaces the cache, it is never cleared,
+        so copies that share a cache are not affected.
+        """
+        cache = self.__dict__.setdefault('_cache', {})
+
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        value = cache[key] = calculate(self)
+
+        own = [id(item) for item in self.__dict__.itervalues()]
+        for item in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(item, numpy.ndarray) and id(item) not in own:
+                item.flags.writeable = False
+
+        return value
+
+    def freeze(self):
+        """
+        make the object immutable, so its cached quantities are permanent.
+
+        >>> F = (A+B).freeze()
+        >>> assert F == A+B
+        >>> assert F.cov is F.cov
+        >>> F.mean = B.mean
+        Traceback (most recent call last):
+        ...
+        AttributeError: can't modify a frozen Mvn
+
+        copies (and unpickled objects) are not frozen:
+
+        >>> G = F.copy()
+        >>> G.mean[0, 0] += 1
+        >>> G.var = G.var*2
+        >>> assert F == A+B
+
+        returns self
+        """
+        self.var
+        self.vectors
+        self._lock()
+
+        return self
+
+    def _lock(self):
+        """
+        make the arrays read-only, and set the frozen flag
+        """
+        for value in self.__dict__.itervalues():
+            if isinstance(value, numpy.ndarray):
+                value.flags.writeable = False
+
+        self.__dict__['_frozen'] = True
+
+    def __setattr__(self, name, value):
+        """
+        block attribute changes on frozen objects, see 
+        :py:meth:`mvn.Mvn.freeze`
+        """
+        if self._frozen:
+            raise AttributeError(
+                "can't modify a frozen %s" % type(self).__name__
+            )
+
+        object.__setattr__(self, name, value)
+
+    def copy(self, other=None, deep=False):
+        """
+        :param other:
+        :param deep:
+
+        see :py:meth:`mvn.decorate.automath.Automath.copy`
+
+        Copies of a frozen object are not frozen, they get their own 
+        (writable) arrays.
+        """
+        if other is None:
+            result = Plane.copy(self, deep=deep or self._frozen)
+            result.__dict__.pop('_frozen', None)
+            return result
+
+        if self._frozen:
+            raise AttributeError(
+                "can't modify a frozen %s" % type(self).__name__
+            )
+
+        Plane.copy(self, other, deep=deep or other._frozen)
+        self.__dict__.pop('_frozen', None)
+
+    def _getVar(self):
+        'get the variances'
+        self._settle()
+        return self._var
+
+    def _setVar(self, var):
+        'set the variances'
+        self._settle()
+        self._var = var
+        self._cache = {}
+
+    var = property(
+        fget=_getVar,
+        fset=_setVar,
+        doc="""
+            the variance asociated with each vector
+
+            reading it completes any pending :py:meth:`mvn.Mvn.cannonize`
+        """
+    )
+
+    def _getVectors(self):
+        'get the vectors'
+        self._settle()
+        return self._vectors
+
+    def _setVectors(self, vectors):
+        'set the vectors'
+        self._settle()
+        self._vectors = vectors
+        self._cache = {}
+
+    vectors = property(
+        fget=_getVectors,
+        fset=_setVectors,
+        doc="""
+            unit eigen-vectors, as rows
+
+            reading it completes any pending :py:meth:`mvn.Mvn.cannonize`
+        """
+    )
+
     ############## alternate creation methods
     @classmethod
     def format(cls, something):
@@ -246,7 +525,20 @@ class Mvn(Plane):
         >>> assert isinstance(Mvn.format([1,2,3]),numpy.ndarray)
         >>> assert isinstance(Mvn.format([[1,2,3]]),Matrix)
         >>> assert isinstance(Mvn.format([[[2]]]),numpy.ndarray)
+
+        memory-maps are passed through untouched, so they are not read into 
+        memory, and other iterators are wrapped in a generator, to be read 
+        as chunks of data
+
+        >>> import types
+        >>> assert isinstance(Mvn.format(iter([1,2])), types.GeneratorType)
         '''
+        if isinstance(something, numpy.memmap):
+            return something
+
+        if isinstance(something, collections.Iterator):
+            return (chunk for chunk in something)
+
         array = numpy.array(something)
                      
         if array.ndim == 2:
@@ -445,14 +737,16 @@ class Mvn(Plane):
         mvns = data[ismvn]
     
         data = numpy.array([
-            numpy.squeeze(vector.mean if mvn else vector)
+            numpy.asarray(vector.mean if mvn else vector).ravel()
             for mvn, vector 
             in zip(ismvn, data)
         ])
     
-        N = cls._getN(data, weights)-(not bias)
+        N = cls._getN(data, weights)
+        mean = cls._getMean(data, mean, cls._getWeights(weights, data, N))
+
+        N -= (not bias)
         weights = cls._getWeights(weights, data, N)
-        mean = cls._getMean(data, mean, weights)
     
         subVectors = numpy.vstack([
             mvn.vectors 
@@ -488,6 +782,10 @@ class Mvn(Plane):
         >>> D=Mvn.fromData([[0],[2]],mean=[0])
         >>> assert D.mean == 0
         >>> assert D.var == 2
+
+        >>> D=Mvn.fromData([[0],[2]],bias=False)
+        >>> assert D.mean == 1
+        >>> assert D.var == 2
     
         >>> D = Mvn.fromData(Matrix.zeros([0,3]))
         >>> assert D.ndim == 3
@@ -496,14 +794,15 @@ class Mvn(Plane):
         """        
         N = cls._getN(data, weights)
         
-        if not bias:
-            N -= 1
-        
         if bias and not N:
             return cls.infs(data.shape[1],mean = mean)
             
+        mean = cls._getMean(data, mean, cls._getWeights(weights, data, N))
+
+        if not bias:
+            N -= 1
+
         weights = cls._getWeights(weights, data, N)
-        mean = cls._getMean(data, mean, weights)
     
         vectors = data-mean
     
@@ -512,6 +811,132 @@ class Mvn(Plane):
             var=weights,
             vectors=vectors,
         )
+
+    @classmethod
+    @fromData.__func__.register(type, numpy.memmap)
+    def fromMemmap(
+        cls, data, mean=None, weights=None, bias=True, 
+        workers=None, chunkSize=2**16
+    ):
+        """
+        :param data: *shape=(N,ndim)* a :py:class:`numpy.memmap`
+        :param mean:
+        :param weights:
+        :param bias:
+        :param workers: the number of processes to use, None (the default) 
+            does all the work in this process
+        :param chunkSize: the number of rows in each chunk
+
+        The data is read in chunks, so the full deviation matrix is never 
+        built, see :py:meth:`mvn.Mvn.fromChunks`.
+
+        >>> import tempfile
+        >>> data = numpy.random.randn(1000,3)+numpy.random.randn(1,3)
+        >>> with tempfile.NamedTemporaryFile() as f:
+        ...     mapped = numpy.memmap(f.name, float, 'w+', shape=data.shape)
+        ...     mapped[:] = data
+        ...     assert Mvn.fromData(mapped, chunkSize=300) == Mvn.fromData(data)
+        ...     assert Mvn.fromData(mapped, workers=2, chunkSize=300) == (
+        ...         Mvn.fromData(data)
+        ...     )
+        """
+        if data.ndim == 1:
+            data = data[:, None]
+
+        count = data.shape[0]
+        starts = range(0, count, chunkSize) or [0]
+        stops = starts[1:]+[count]
+
+        #an open memory map can't be pickled, so the workers are sent a 
+        #description of the chunk, if it's possible
+        root = (
+            workers is not None and
+            isinstance(data.base, mmap.mmap) and 
+            data.flags.c_contiguous and
+            data.filename is not None
+        )
+
+        tasks = (
+            (
+                (data.filename, data.dtype, data.shape, data.offset, start, stop) 
+                if root else 
+                data[start:stop],
+                None if weights is None else weights[start:stop],
+            )
+            for (start, stop) in zip(starts, stops)
+        )
+
+        return cls.fromChunks(
+            tasks, mean=mean, bias=bias, 
+            workers=workers, ndim=data.shape[1]
+        )
+
+    @classmethod
+    @fromData.__func__.register(type, type(_ for _ in ()))
+    def fromChunks(cls, chunks, mean=None, bias=True, workers=None, ndim=None):
+        """
+        :param chunks: an iterable of data arrays *shape=(N,ndim)*, or 
+            (data, weights) pairs
+        :param mean:
+        :param bias:
+        :param workers: the number of processes to use, None (the default) 
+            does all the work in this process
+        :param ndim: the number of dimensions, only needed if there may be 
+            no data
+
+        Each chunk is summarized as a weight and an :py:class:`mvn.Mvn`, 
+        (with an :py:class:`mvn.accumulator.MvnAccumulator`, possibly in a 
+        process pool), and the summaries are combined just like an object 
+        array of :py:class:`mvn.Mvn` in :py:meth:`mvn.Mvn.fromArray`.
+
+        >>> data = numpy.random.randn(1000,3)+numpy.random.randn(1,3)
+        >>> weights = numpy.random.rand(1000)
+        >>> chunks = numpy.array_split(data, 7)
+        >>> assert Mvn.fromData(iter(chunks)) == Mvn.fromData(data)
+        >>> assert Mvn.fromData(iter(chunks), bias=False) == (
+        ...     Mvn.fromData(data, bias=False)
+        ... )
+        >>> assert Mvn.fromData(iter(chunks), workers=2) == Mvn.fromData(data)
+        >>>
+        >>> pairs = zip(chunks, numpy.array_split(weights, 7))
+        >>> assert Mvn.fromData(iter(pairs), mean=numpy.zeros(3)) == (
+        ...     Mvn.fromData(data, weights=weights, mean=numpy.zeros(3))
+        ... )
+        """
+        tasks = (
+            chunk if isinstance(chunk, tuple) else (chunk, None) 
+            for chunk in chunks
+        )
+
+        if workers is None:
+            summaries = [_chunkSummary(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(workers)
+            try:
+                summaries = []
+                #feed the pool a few chunks at a time, so an unbounded 
+                #generator doesn't get read into memory
+                while True:
+                    wave = list(itertools.islice(tasks, 2*workers))
+                    if not wave:
+                        break
+                    summaries.extend(pool.map(_chunkSummary, wave))
+            finally:
+                pool.close()
+                pool.join()
+
+        summaries = [summary for summary in summaries if summary is not None]
+
+        if not summaries:
+            assert ndim is not None, 'no data'
+            return cls.fromMatrix(Matrix.zeros([0, ndim]), mean=mean, bias=bias)
+
+        (counts, mvns) = zip(*summaries)
+
+        data = numpy.empty(len(mvns), dtype=object)
+        data[:] = mvns
+
+        return cls.fromArray(data, mean=mean, weights=counts, bias=bias)
     
     @classmethod
     def fromCov(cls, cov, **kwargs):
@@ -742,7 +1167,14 @@ class Mvn(Plane):
     ############ setters/getters -> properties
     def _getCov(self):
         'get the covariance matrix'
-        return numpy.multiply(self.vectors.H, self.var)*self.vectors
+        return self._memo('cov', Mvn._calculateCov)
+
+    def _calculateCov(self):
+        vectors = numpy.asarray(self.vectors)
+        return numpy.dot(
+            vectors.conj().T*self.var, 
+            vectors
+        ).view(Matrix)
 
     
     def _setCov(self, cov):
@@ -830,7 +1262,9 @@ class Mvn(Plane):
 
     def _getScaled(self):
         'get the square-root of the covariance matrix'
-        return Matrix(numpy.multiply(sqrt(self.var[:, None]), self.vectors))
+        return self._memo('scaled', lambda self:
+            (sqrt(self.var[:, None])*numpy.asarray(self.vectors)).view(Matrix)
+        )
             
     scaled = property(
         fget = _getScaled,
@@ -858,6 +1292,12 @@ class Mvn(Plane):
         >>> parts = A._transformParts(N) 
         >>> assert parts[0]*parts[1] == A.transform(N)
         """
+        return self._memo(
+            ('transformParts', power), 
+            lambda self: self._calculateTransformParts(power)
+        )
+
+    def _calculateTransformParts(self, power):
         if power == 0:
             vectors = self.vectors
             varP = numpy.ones_like(self.var)
@@ -868,6 +1308,53 @@ class Mvn(Plane):
         return (numpy.multiply(vectors.H, varP), vectors)
 
 
+    def _whitener(self):
+        """
+        get (whitener, signs), with the mahalanobis distance squared, of a 
+        delta, from the mean, as:
+
+            | ((delta*whitener)**2*signs).sum()
+
+        signs is None if all the variances are positive. The infinite 
+        variances are left out. It is cached, see :py:meth:`mvn.Mvn._memo`.
+
+        >>> (whitener, signs) = A._whitener()
+        >>> assert Matrix(numpy.dot(whitener, whitener.T)) == A.transform(-2)
+        """
+        return self._memo('whitener', type(self)._calculateWhitener)
+
+    def _logNormalizer(self):
+        """
+        the log of the normalizing constant of the density:
+
+            | (rank*log(2*pi)+log(abs(pdet)))/2
+
+        with the log-determinant from :py:meth:`mvn.Mvn.logPdet`. It is 
+        cached, see :py:meth:`mvn.Mvn._memo`.
+
+        >>> assert Matrix(A._logNormalizer()) == (
+        ...     A.rank*numpy.log(2*numpy.pi)+numpy.log(abs(A.pdet()))
+        ... )/2
+        """
+        return self._memo(
+            'logNormalizer', 
+            lambda self: (self.rank*numpy.log(2*numpy.pi)+self.logPdet())/2
+        )
+
+    def _calculateWhitener(self):
+        var = self.var
+        keep = numpy.isfinite(var)
+
+        vectors = numpy.asarray(self.vectors)[keep]
+        var = var[keep]
+
+        whitener = numpy.ascontiguousarray(
+            vectors.conj().T/numpy.sqrt(abs(var))
+        )
+        signs = None if (var > 0).all() else numpy.sign(var)
+
+        return (whitener, signs)
+
     def transform(self, power=1):
         """
         :param power:
@@ -940,12 +1427,16 @@ class Mvn(Plane):
         """
         #no 'square' is necessary here because the rotation matrixes are in 
         #entierly different dimensions
-        return type(mvns[0])(
+        raw = [m._raw() for m in mvns]
+        return type(mvns[0])._fromParts(
             #stack the means
-            mean= numpy.hstack([m.mean for m in mvns]),
+            mean= Matrix(numpy.hstack([m.mean for m in mvns]), copy=False),
             #stack the vector diagonally
-            vectors= helpers.diagstack([m.vectors for m in mvns]),
-            var= numpy.concatenate([m.var for m in mvns]),
+            vectors= Matrix(
+                helpers.diagstack([vectors for (var, vectors) in raw]), 
+                copy=False
+            ),
+            var= numpy.concatenate([var for (var, vectors) in raw]),
             **kwargs
         )
     
@@ -1053,7 +1544,24 @@ class Mvn(Plane):
         
         >>> assert A.pdet() == A.var.prod()
         """
-        return self.var.prod()
+        return self._memo('pdet', lambda self: self.var.prod())
+
+    def logPdet(self):
+        """
+        returns the log of the absolute value of the psudodet of the 
+        covariance matrix, summed from the logs of the variances, so it 
+        doesn't under or overflow in many dimensions, where the pdet does
+        
+        >>> assert Matrix(A.logPdet()) == numpy.log(abs(A.pdet()))
+
+        >>> small = Mvn(var=1e-6*numpy.ones(400))
+        >>> assert small.pdet() == 0
+        >>> assert Matrix(small.logPdet()) == 400*numpy.log(1e-6)
+        """
+        return self._memo(
+            'logPdet', 
+            lambda self: numpy.log(abs(self.var)).sum()
+        )
         
     def trace(self):
         """
@@ -1091,6 +1599,9 @@ class Mvn(Plane):
 
         because doing it with power scales along the eigenvectrs, this scales along the axes
         """
+        return self._memo('width', Mvn._calculateWidth)
+
+    def _calculateWidth(self):
         scaled = numpy.array(self.scaled)
         return (scaled.conj()*scaled).sum(0)**(0.5)
 
@@ -1153,11 +1664,57 @@ class Mvn(Plane):
 
         return perfect+sensor
 
+    def smooth(self, measurements, transform, noise, sensor):
+        """
+        fixed interval (Rauch-Tung-Striebel) smoother over a whole block of 
+        measurements.
+
+        :param self:         the state before the first measurement
+        :param measurements: *shape=(T,ndim)*
+        :param transform:    the state transition, the same as in 
+                             :py:meth:`mvn.Mvn.__mul__`
+        :param noise:        the process noise, added after the transform
+        :param sensor:       the sensor, as in :py:class:`mvn.filters.KalmanFilter`
+
+        returns (states, logLikelihood), where states is the list of 
+        distributions of each state given all the measurements, and 
+        logLikelihood is the total log-likelihood of the measurements.
+
+        The last state is the same as from the operator form of the filter:
+
+        >>> transform = numpy.array([[1, 0], [0.5, 1]])
+        >>> noise = Mvn(vectors=[[1, 0], [0, 1]], var=numpy.array([0.5, 1])**2)
+        >>> sensor = Mvn(vectors=[[1, 0], [0, 1]], var=[1, numpy.inf])
+        >>> state = Mvn(mean=[0, 5], vectors=numpy.eye(2))
+        >>> measurements = numpy.random.randn(20, 2)
+        >>>
+        >>> (states, logL) = state.smooth(measurements, transform, noise, sensor)
+        >>> assert len(states) == 20
+        >>>
+        >>> S = state
+        >>> for z in measurements:
+        ...     S = (S*transform + noise) & (sensor + z)
+        >>> assert states[-1] == S
+
+        see also: :py:meth:`mvn.filters.KalmanFilter.smooth`
+        """
+        KF = filters.KalmanFilter(transform, noise, sensor)
+        (means, covs, logLikelihood) = KF.smooth(measurements, self)
+
+        states = [
+            type(self).fromCov(cov, mean=mean)
+            for (mean, cov) in zip(means, covs)
+        ]
+
+        return (states, logLikelihood)
+
     @decorate.MultiMethod
-    def mah2(self, locations=None, mean=None):
+    def mah2(self, locations=None, mean=None, out=None, chunkSize=2**16):
         """
         :param locations:
         :param mean:
+        :param out: an array to write the results to
+        :param chunkSize: the number of locations processed at once
             
         Return the square of the mahalabois distance from the Mvn to each location.
         the vectors should be along the last dimension of the array.
@@ -1179,11 +1736,6 @@ class Mvn(Plane):
         
         The expected distance squared of a sample from it's parent, is the 
         number of dimensions
-        
-            >>> A.mah2(A).mean = A.ndim
-            
-       for Mvns it currenty just returns an mvn (mean & variance), 
-       but that should be a non-central chi**2 distribution
 
             >>> #warning: this works, but there is probably a better way.
             >>> N=1000
@@ -1192,37 +1744,109 @@ class Mvn(Plane):
             >>> deltas.var/=N
             >>> assert deltas.mah2(0) < (Z**2)
 
+        Between two Mvns it's the distribution of the distance squared 
+        between independent samples, measured with the first one's 
+        covariance, a :py:class:`mvn.chi2.GeneralizedChi2`. So two samples 
+        from the same Mvn are twice the number of dimensions apart:
+
+            >>> assert Matrix(A.mah2(A).mean) == 2*A.ndim
+            >>> Q = A.mah2(B)
+            >>> D = numpy.asarray(A.sample(N)-B.sample(N))
+            >>> deltas = Mvn.fromData(A.mah2(D, mean=numpy.zeros(A.ndim)))
+            >>> deltas.var /= N
+            >>> assert deltas.mah2(Q.mean) < Z**2
+
         negative variances result in negative mah2's.
 
             >>> locations = B.sample([5,5])
             >>> assert -Matrix(A.mah2(locations)) == (~A).mah2(locations)
+
+        The locations can be any array, including a 
+        :py:class:`numpy.memmap`, or an iterator of *(N,ndim)* chunks, see 
+        :py:meth:`mvn.Mvn._score`:
+
+            >>> S = numpy.asarray(A.sample(100))
+            >>> out = numpy.empty(100)
+            >>> assert A.mah2(S, out=out, chunkSize=7) is out
+            >>> assert Matrix(out) == A.mah2(S)
+            >>> chunks = A.mah2(iter(numpy.array_split(S, 3)))
+            >>> assert Matrix(numpy.concatenate(list(chunks))) == A.mah2(S)
         """
         if callable(locations):
             locations = locations(self.mean.shape)
 
-        locations = numpy.asarray(locations)
-        
-        if self.ndim == 1 and locations.ndim == 1 and locations.size != 1:
-            locations = locations[:, None]
+        return self._score(locations, mean, out, chunkSize)
+
+    def _score(
+        self, locations, mean=None, out=None, chunkSize=2**16, log=False
+    ):
+        """
+        :param locations: an array, *shape=(...,ndim)*, or an iterator of 
+            *(N,ndim)* arrays
+        :param mean: a point to measure from, instead of the mean
+        :param out: an array to write the results to
+        :param chunkSize: the number of locations processed at once
+        :param log: calculate the log-density instead of the mah2
+
+        the scoring kernel behind :py:meth:`mvn.Mvn.mah2` and 
+        :py:meth:`mvn.Mvn.logpdf`. The locations are whitened with one 
+        matrix product, with the cached :py:meth:`mvn.Mvn._whitener`, 
+        and squared and summed in place, *chunkSize* rows at a time, so 
+        the temporaries don't grow with the data, and a memory-mapped 
+        input is only paged in a chunk at a time.
+
+        An array input gives an array of results, *shape=(...)*, (written 
+        to out, if it's given). An iterator gives an iterator of results, 
+        one array per chunk, unless out is given, then they are written to 
+        it, in order.
+        """
+        score = self._scorer(mean, log)
+
+        return _stream(score, locations, self.ndim, (), out, chunkSize)
+
+    def _scorer(self, mean=None, log=False):
+        """
+        :param mean: a point to measure from, instead of the mean
+        :param log: calculate the log-density instead of the mah2
+
+        returns a function, score(block, out), that writes the results for 
+        a *(N,ndim)* block of locations to an *(N,)* array 
+        """
+        (whitener, signs) = self._whitener()
 
         if mean is None:
-            mean = self.mean.squeeze()
-        else:
-            mean = numpy.array(mean).squeeze()            
-            
-        deltas = numpy.array(locations)-mean
-        
-        parts = self._transformParts(-2)        
-        
-        scaled = numpy.inner(deltas, parts[1])
-        scaled = numpy.inner(scaled, parts[0])
-        scaled = numpy.array(scaled)
+            mean = self.mean
         
-#isn't there an easy way to write this in tensor notation?
-        return (scaled*deltas).sum(axis=locations.ndim-1)
+        mean = numpy.broadcast_to(numpy.asarray(mean).ravel(), [self.ndim])
+        offset = numpy.dot(mean, whitener)
+
+        if log:
+            constant = self._logNormalizer()
+
+        def score(block, out):
+            white = numpy.dot(block, whitener)
+            white -= offset
+
+            if numpy.iscomplexobj(white):
+                white = numpy.real(white*white.conj())
+            else:
+                numpy.square(white, out=white)
+
+            if signs is not None:
+                white *= signs
+
+            white.sum(1, out=out)
+
+            if log:
+                out *= -0.5
+                out -= constant
+
+            return out
+
+        return score
     
     @mah2.register(Mvn,type(None))
-    def _mah2Self(self, locations, mean = None):
+    def _mah2Self(self, locations, mean=None, out=None, chunkSize=None):
         """
         :param mean:                
         :param locations: no locations given, so it returns the distribution of 
@@ -1230,30 +1854,47 @@ class Mvn(Plane):
                           :type locations:`type(None)`
         
         """
+        import scipy.stats
         return scipy.stats.chi2(self.shape[0])
         
     @mah2.register(Mvn,Mvn)
-    def _mah2Mvn(self, locations, mean = None):
+    def _mah2Mvn(self, locations, mean=None, out=None, chunkSize=None):
         """        
         :param locations:
         :param mean:
-        
+
+        the distribution of the mah2, with self's covariance, between 
+        independent samples of self and the locations, a 
+        :py:class:`mvn.chi2.GeneralizedChi2`
         """    
+        (whitener, signs) = self._whitener()
+        scaled = whitener if signs is None else whitener*signs
+
         delta = (self + [-1]*locations)
-#should be a generalized/non-central chi2
-        return (delta/self).quad()
+        return delta.quad(numpy.dot(scaled, whitener.conj().T))
     
     def mah(self, locations=None, mean = None):
         """
-        return the mahalabois distance from the mvn to each location
+        return the mahalabois distance from the mvn to each location, for 
+        an Mvn it's the root of the distribution of the mah2, a 
+        :py:class:`mvn.chi2.GeneralizedChi`
         
+            >>> R = A.mah(B)
+            >>> assert Matrix(R.squared.mean) == A.mah2(B).mean
+            >>> assert Matrix(R.cdf(1.0)) == A.mah2(B).cdf(1.0)
+
         .. plot:: ../examples/mah.py main
 
         """
         if locations is None:
+            import scipy.stats
             return scipy.stats.chi(self.shape[0])
-        else:
-            return self.mah2(locations)**0.5
+
+        squared = self.mah2(locations, mean)
+        if isinstance(squared, GeneralizedChi2):
+            return GeneralizedChi(squared)
+
+        return squared**0.5
         
     
     @decorate.MultiMethod
@@ -1301,8 +1942,10 @@ class Mvn(Plane):
         :param locations:
         :param mean:
             
+        the distribution of the squared distance between independent 
+        samples of self and the locations, a 
+        :py:class:`mvn.chi2.GeneralizedChi2`
         """
-#TODO: find an implementation of generalized/noncentral chi2 distribution
         return (self + [-1]*locations).quad()
     
     def dist(self, locations=None, mean=None):
@@ -1310,11 +1953,15 @@ class Mvn(Plane):
         :param locations:
         :param mean:
             
-        returns the mahalabois distance to each location
+        returns the distance to each location, for an Mvn, or None, it's the 
+        root of the distribution of the dist2, a 
+        :py:class:`mvn.chi2.GeneralizedChi`
         """
-#TODO: find an implementation of generalized 
-#          noncentral chi and chi2 distribiutions        
-        return dist2(self, locations, mean)**0.5
+        squared = self.dist2(locations, mean)
+        if isinstance(squared, GeneralizedChi2):
+            return GeneralizedChi(squared)
+
+        return squared**0.5
         
     ############## indexing
     
@@ -1593,12 +2240,13 @@ class Mvn(Plane):
         SFvar = self.var[Sfinite]
 
         OFvectors = other.vectors[Ofinite]
+        OFvar = other.var[Ofinite]
 
         cov = lambda vectors, var: numpy.multiply(vectors.H,  var)*vectors
 
         #compare the finite and infinite covariances 
         return (
-            cov(SFvectors,SFvar) == cov(OFvectors,SFvar) and
+            cov(SFvectors,SFvar) == cov(OFvectors,OFvar) and
             SIvectors.H*SIvectors == OIvectors.H*OIvectors
         )
 
@@ -1714,104 +2362,159 @@ class Mvn(Plane):
 
         return self._minMax(calcMax = 0)
 
-    def inBox(self, lower, upper, **kwargs):
+    def inBox(
+        self, lower, upper, errors=False, workers=None, maxpts=None, 
+        method='genz', **kwargs
+    ):
         """
-        :param lower:
-        :param upper:
+        :param lower: *shape=(...,ndim)*, the lower corner of each box
+        :param upper: *shape=(...,ndim)*, the upper corner of each box
+        :param errors: if true, return (probability, error), where error is 
+            the estimated absolute error of each probability
+        :param workers: the number of processes to spread the boxes across, 
+            None (the default) does all the work in this process
+        :param maxpts: the maximum number of integrand evaluations per box
+        :param method: 'genz' (the default) integrates in numpy, with 
+            :py:func:`mvn.mvncdf.genzcdf`, 'mvndst' uses the Fortran routine 
+            from scipy, if it's available. Boxes with two or three free axes 
+            are calculated exactly, see :py:func:`mvn.mvncdf.tvnormcdf`, 
+            unless the method is 'mvndst'
+        :param ** kwargs: abseps and releps, the error tolerances, (and 
+            maxtime for genz) are passed on to 
+            :py:func:`mvn.mvncdf.mvstdnormcdfs`
             
         returns the probability that all components of a sample are between the 
         lower and upper limits 
 
-#TODO: fix
-
-        >>> N = 100
+        >>> N = 1000
         >>> data = A.sample(N)
         >>> limits = A.sample(2)
         >>> upper = limits.max(0)
         >>> lower = limits.min(0)
-        >>> print Mvn.mean(((data<upper) & (data>lower)).all(1))
-        >>> print A.inBox(lower,upper)
-        >>> assert A.inBox(lower,upper) == Mvn.mean(
-        ...     ((data<upper) & (data>lower)).all(1)
+        >>> inside = Mvn.fromData(((data<upper) & (data>lower)).all(1))
+        >>> inside.var /= N
+        >>> assert inside.mah2(A.inBox(lower, upper, abseps=1e-4)) < 3**2
+
+        The limits broadcast against each other, so many boxes can be 
+        calculated at once, the result has the shape of the limits, without 
+        the last axis. The Mvn is only standardized once, and the boxes 
+        share its correlation matrix:
+
+        >>> lowers = numpy.asarray(A.mean)-numpy.random.rand(5, A.ndim)
+        >>> uppers = numpy.asarray(A.mean)+numpy.random.rand(5, A.ndim)
+        >>> (P, E) = A.inBox(lowers, uppers, errors=True, abseps=1e-4)
+        >>> assert P.shape == E.shape == (5,)
+        >>> assert (E < 1e-4).all()
+        >>> assert all(
+        ...     abs(p-A.inBox(l, u, abseps=1e-4)) < 3e-4
+        ...     for (p, l, u) in zip(P, lowers, uppers)
         ... )
 
+        Swapping the limits, along an axis, changes the sign of the result.
+
+        With the 'genz' method nothing is raised when the tolerance can't be 
+        met in the budget, check the errors instead. With 'mvndst' that 
+        raises :py:class:`mvn.mvncdf.MvnDstError`, unless errors is true.
+
 #TODO: this could be expanded to return a gaussian mixture, 
               with one (Mvn) component instead of just a  weight...
         """
-#TODO: vectorize?
-        lower = lower-self.mean
-        upper = upper-self.mean
+        for (name, limit) in (('lower', lower), ('upper', upper)):
+            if isinstance(limit, Mvn):
+                #the uncertainty in the limit is added to self
+                self = self+(limit-limit.mean)
+                if name == 'lower':
+                    lower = limit.mean
+                else:
+                    upper = limit.mean
+
+        ndim = self.ndim
+        mean = numpy.asarray(self.mean, dtype=float).ravel()
+        (std, correl) = self._standardized()
+
+        (lower, upper) = numpy.broadcast_arrays(
+            numpy.asarray(lower, dtype=float), 
+            numpy.asarray(upper, dtype=float),
+        )
+        single = lower.size == ndim
+        shape = lower.shape[:-1]
+
+        lower = lower.reshape([-1, ndim])-mean
+        upper = upper.reshape([-1, ndim])-mean
+
+        #swapping the limits changes the sign of the integral
+        swap = lower > upper
+        signs = (-1.0)**swap.sum(1)
+        (lower, upper) = (
+            numpy.where(swap, upper, lower), 
+            numpy.where(swap, lower, upper),
+        )
 
-#TODO: multimethod?
-#TODO: verify--> this looks wrong
-        if isinstance(lower, Mvn):
-            l = lower.mean
-            lower.mean = Matrix.zeros
-            self = self+lower
-            lower = l
-            
-        if isinstance(upper, Mvn):
-            u = upper.mean
-            upper.mean = Matrix.zeros
-            self = self+upper
-            upper = u
-
-        lower = numpy.array(lower)
-        upper = numpy.array(upper)
-        
-#TODO: add tolerence on this comparison 
-#        (the cdf calculation fails if upper-lower < ~1e-8)
-        if Matrix(lower).approx(upper).any():
-            return 0.0
-            
-        upper = upper.squeeze()
-        lower = lower.squeeze()
-        
-        upInfs = numpy.isinf(upper)
-        lowInfs = numpy.isinf(lower)        
-        bothInfs = (upInfs & lowInfs)
-        
-        if bothInfs.any():
-                
-            #But any time the inf in upper is negative, the sign 
-            #is inverted, so count the inversions
-            infFlips = (-1.0)**(
-                numpy.sign(upper[bothInfs])< 
-                numpy.sign(lower[bothInfs])
-            ).sum()
-            
-            #if we've made it here, any slots that are both inf 
-            #have different signs, so it's like we're integrating 
-            #the marginal
-            self = self[:, ~bothInfs]
-            upper = upper[~bothInfs]        
-            lower = lower[~bothInfs]
-            
-            if not self:
-                return infFlips
-                
+        empty = ((lower == upper) | self.approx(lower, upper)).any(1)
+
+        #axes with no variance are either inside the box or not
+        free = std > 0
+        inside = (
+            (lower[:, ~free] <= 0) & (upper[:, ~free] >= 0)
+        ).all(1)
+
+        lower = lower[:, free]/std[free]
+        upper = upper[:, free]/std[free]
+
+        count = lower.shape[0]
+        if not free.any():
+            (values, error) = (numpy.ones(count), numpy.zeros(count))
+        elif free.sum() == 1:
+            import scipy.special
+            values = scipy.special.ndtr(upper[:, 0])-scipy.special.ndtr(lower[:, 0])
+            error = numpy.zeros(count)
         else:
-            infFlips = 1.0 
-        
-        
-        if self.ndim == 1:
-            gaus1D = scipy.stats.norm(0, self.var**0.5)
-            return gaus1D.cdf(upper)-gaus1D.cdf(lower)
+            import mvn.mvncdf as mvncdf
 
-        Iwidth = self.width()**-1
-        
-        self = self*Iwidth
-        lower = lower*Iwidth
-        upper = upper*Iwidth
+            (values, error, informs) = mvncdf.mvstdnormcdfs(
+                lower, upper, correl, 
+                maxpts=maxpts, workers=workers, method=method, **kwargs
+            )
 
-        result = infFlips*mvncdf.mvstdnormcdf(
-            lower, upper, self.corr, 
-            abseps = self.atol,
-            releps = self.rtol            
-        )
-        
-        assert 0 <= abs(result) <= 1
-        return result
+            failed = informs.nonzero()[0]
+            if method == 'mvndst' and failed.size and not errors:
+                raise mvncdf.MvnDstError(
+                    informs[failed[0]], error[failed[0]]
+                )
+
+        keep = inside & ~empty
+        result = numpy.where(keep, signs*values, 0.0)
+        error = numpy.where(keep, error, 0.0)
+
+        if single:
+            (result, error) = (result[0], error[0])
+        else:
+            (result, error) = (result.reshape(shape), error.reshape(shape))
+
+        return (result, error) if errors else result
+
+    def _standardized(self):
+        """
+        get (std, correl), the standard deviation along each axis, and the 
+        correlation matrix of the axes with a non-zero standard deviation. 
+        They're used by :py:meth:`mvn.Mvn.inBox`, and cached, see 
+        :py:meth:`mvn.Mvn._memo`. The mean is left out, because setting it 
+        doesn't clear the cache.
+
+        >>> (std, correl) = A._standardized()
+        >>> assert Matrix(std) == A.width()
+        """
+        return self._memo('standardized', Mvn._calculateStandardized)
+
+    def _calculateStandardized(self):
+        cov = numpy.real(numpy.asarray(self.cov))
+        std = numpy.sqrt(abs(numpy.diag(cov)))
+        std = numpy.where(self.approx(std), 0.0, std)
+
+        free = std > 0
+        corr = cov[free][:, free]/numpy.outer(std[free], std[free])
+
+        return (std, corr)
         
     def bBox(self, nstd=2):
         """
@@ -1996,6 +2699,13 @@ class Mvn(Plane):
         >>> assert (L1&L2).mean==[0,1]
         >>> assert (L1&L2).var==1
         >>> assert (L1&L2).vectors==[1,0]
+
+        a flat side's missing directions stay fixed, even if it also has 
+        infinite variances:
+
+        >>> L1=Mvn(mean=[1,2,3],vectors=[[1,0,0],[0,1,0]],var=[1,numpy.inf])
+        >>> L2=Mvn.eye(3, mean=[5,7,11])
+        >>> assert (L1&L2).mean==[3,7,3]
         
     """
         #check if they both fill the space
@@ -2003,14 +2713,142 @@ class Mvn(Plane):
             #then this is a standard parallel operation
             result = (self**(-1)+other**(-1))**(-1) 
         else:
-            Dmean = Plane.__and__(self, other).mean
-
-            #do the blending, 
-            #  while compensating for the mean of the working plane
-            result = ((self-Dmean)**-1+(other-Dmean)**-1)**-1+Dmean
+            #the zero variances are constraints, see Mvn.fuse
+            result = type(self).fuse([self, other])
 
         return result
 
+    @classmethod
+    def fuse(cls, mvns, weights=None):
+        """
+        :param mvns: an iterable of Mvns, with the same number of dimensions
+        :param weights: *shape=(len(mvns),)*, multiplies each one's
+            information, defaults to ones
+
+        blend any number of Mvns at once, the same as folding them together
+        with the & operator, but without the pairwise inversions:
+
+        >>> import operator
+        >>> abc = [A, B, C]
+        >>> assert Mvn.fuse(abc) == A & B & C
+        >>> assert Mvn.fuse(abc) == reduce(operator.and_, abc)
+
+        the inverse variances of all the vectors are stacked into one
+        precision matrix, and information vector, and that is decomposed
+        once. The zero variances, of the flat members, are constraints. They
+        are handled like :py:meth:`mvn.plane.Plane.__and__`, all at once:
+        the precision is decomposed inside the intersection of the planes,
+        around a mean that is on all of them:
+
+        >>> L1=Mvn(mean=[1,0],vectors=[0,1],var=numpy.inf)
+        >>> L2=Mvn(mean=[0,1],vectors=[1,0],var=numpy.inf)
+        >>> L3=Mvn(mean=[0,0],vectors=Matrix.eye, var=[1,1])
+        >>> assert Mvn.fuse([L1, L2]).mean == [1, 1]
+        >>> assert Mvn.fuse([L1, L2]).var.size == 0
+        >>> assert Mvn.fuse([L1, L3]) == L1 & L3
+
+        infinite variances carry no information:
+
+        >>> assert Mvn.fuse([A, B & ~B]) == A & (B & ~B)
+
+        a weight multiplies a member's information, like repeating it:
+
+        >>> assert Mvn.fuse([A, C], weights=[2, 1]) == A & A & C
+        >>> assert Mvn.fuse([A, C], weights=[0, 1]) == C
+        """
+        mvns = list(mvns)
+        assert mvns, 'nothing to fuse'
+
+        if weights is None:
+            weights = numpy.ones(len(mvns))
+        else:
+            weights = numpy.asarray(weights, dtype=float).ravel()
+
+        assert weights.size == len(mvns), 'one weight per Mvn'
+
+        ndim = mvns[0].ndim
+
+        rows = []
+        scales = []
+        projections = []
+        nulls = []
+        offsets = []
+        for (item, weight) in zip(mvns, weights):
+            assert item.ndim == ndim, 'all the Mvns need the same ndim'
+
+            if not weight:
+                continue
+
+            mean = numpy.asarray(item.mean)
+            var = item.var
+            vectors = numpy.asarray(item.vectors)
+
+            #infinite variances add nothing to the precision
+            finite = numpy.isfinite(var)
+            rows.append(vectors[finite])
+            scales.append(weight/var[finite])
+            projections.append(numpy.dot(vectors[finite], mean.T).ravel())
+
+            #the missing directions are constraints
+            if item.flat:
+                null = numpy.asarray(Matrix(vectors).null())
+                nulls.append(null)
+                offsets.append(numpy.dot(null, mean.T).ravel())
+
+        rows = numpy.vstack(rows+[numpy.zeros([0, ndim])])
+        scales = numpy.concatenate(scales+[numpy.zeros(0)])
+        projections = numpy.concatenate(projections+[numpy.zeros(0)])
+
+        precision = numpy.dot(rows.T*scales, rows)
+        info = numpy.dot(projections*scales, rows)[None, :]
+
+        #the intersection of the planes, see Plane.__and__
+        if nulls:
+            null = numpy.vstack(nulls)
+            offset = numpy.concatenate(offsets)
+
+            (u, s, vt) = numpy.linalg.svd(null, full_matrices=True)
+            rank = (~helpers.approx(s)).sum()
+
+            base = numpy.dot(
+                numpy.dot(offset, u[:, :rank])/s[:rank],
+                vt[:rank]
+            )[None, :]
+            free = vt[rank:]
+        else:
+            base = numpy.zeros([1, ndim])
+            free = numpy.eye(ndim)
+
+        #decompose the precision, in the free subspace, around the base
+        if free.shape[0]:
+            (val, vec) = numpy.linalg.eigh(
+                helpers.dots(free, precision, free.T)
+            )
+            (inverse, zero) = helpers.pseudoInverse(val)
+
+            local = numpy.dot(info-numpy.dot(base, precision), free.T)
+
+            var = numpy.where(zero, numpy.inf, inverse)
+            vectors = numpy.dot(vec.T, free)
+            mean = base+numpy.dot(numpy.dot(local, vec)*inverse, vectors)
+
+            #sign the vectors so their largest component is positive
+            largest = abs(vectors).argmax(1)
+            vectors *= numpy.sign(
+                vectors[numpy.arange(vectors.shape[0]), largest]
+            )[:, None]
+        else:
+            var = numpy.zeros(0)
+            vectors = numpy.zeros([0, ndim])
+            mean = base
+
+        return cls._fromParts(
+            mean=Matrix(mean, copy=False),
+            var=var,
+            vectors=Matrix(vectors, copy=False),
+            square=False,
+        )
+
     def __pow__(self, power):
         """
         :param power:
@@ -2099,9 +2937,9 @@ class Mvn(Plane):
         V = self.vectors            
         dmean = self.mean-self.mean*V.H*V        
         
-        return type(self)(
+        return type(self)._fromParts(
             mean=self.mean*transform+dmean,
-            vectors=self.vectors,
+            vectors=V.copy(),
             var=self.var**power,
             square=False,
         )
@@ -2321,11 +3159,13 @@ class Mvn(Plane):
         assert numpy.isreal(scalar)
         scalar = numpy.real(scalar)
 
-        return type(self)(
+        (var, vectors) = self._raw()
+
+        return type(self)._fromParts(
             mean= scalar*self.mean,
-            var = scalar*self.var,
-            vectors = self.vectors,
-            square = not numpy.isreal(scalar),
+            var = scalar*var,
+            vectors = vectors.copy(),
+            square = self._unsquared(),
         )
 
     @__mul__.register(Mvn,Matrix)
@@ -2351,10 +3191,13 @@ class Mvn(Plane):
             >>> assert (A*M).mean==A.mean*M
 
         """
-        return type(self)(
-            mean=self.mean*matrix,
-            var=self.var,
-            vectors=self.vectors*matrix,
+        (var, vectors) = self._raw()
+        matrix = numpy.asarray(matrix)
+
+        return type(self)._fromParts(
+            mean=Matrix(numpy.dot(self.mean, matrix), copy=False),
+            var=var.copy(),
+            vectors=Matrix(numpy.dot(vectors, matrix), copy=False),
         )
 
     @__rmul__.register(Mvn,Matrix)
@@ -2411,17 +3254,16 @@ class Mvn(Plane):
             vector.size == self.ndim)
         ),'vector multiply, vector.size must match mvn.ndim'
         
-        return type(self)(
-            mean=numpy.multiply(self.mean,vector),
-            vectors=numpy.multiply(self.vectors,vector),
-            var=self.var,
+        (var, vectors) = self._raw()
+
+        return type(self)._fromParts(
+            mean=Matrix(numpy.multiply(self.mean,vector), copy=False),
+            vectors=Matrix(numpy.multiply(vectors,vector), copy=False),
+            var=var.copy(),
         )
             
 
     def quad(self, matrix=None):
-        #TODO: noncentral Chi & Chi2 distribution gives the *real* distribution 
-        #       of the length & length^2 this just has the right mean and
-        #       variance
         """
         :param matrix:
             
@@ -2436,23 +3278,32 @@ class Mvn(Plane):
         If you're creative with the marix transform you can make lots of 
             interesting things happen
 
-        TODO: Chi & Chi2 distribution gives the *real* distribution of the length & length^2
-                this has the right mean and variance so it's like a maximul entropy model
-                (ref: http://en.wikipedia.org/wiki/Principle_of_maximum_entropy )
+        It returns the exact distribution, a 
+        :py:class:`mvn.chi2.GeneralizedChi2`, with the usual mean and 
+        variance:
+
+            >>> Q = A.quad()
+            >>> assert Matrix(Q.mean) == A.mean*A.mean.H+A.trace()
+            >>> assert Matrix(Q.var) == (
+            ...     2*(A*A).trace()+4*(A*A.mean.H).trace()
+            ... )
+            >>> M = Matrix.randn([A.ndim, A.ndim])
+            >>> Q = A.quad(M)
+            >>> assert Matrix(Q.mean) == A.mean*M*A.mean.H+numpy.trace(M*A.cov)
+
+        and its cdf, sf, ppf and samples:
+
+            >>> Q = Mvn(mean=[1, 2, 3], var=[1, 2, 4]).quad()
+            >>> x = Q.ppf([0.05, 0.5, 0.95])
+            >>> assert abs(Q.cdf(x)-[0.05, 0.5, 0.95]).max() < 1e-8
         """
         if matrix is not None:
-            matrix = (matrix+matrix.H)/2
- 
-        transformed = self if matrix is None else self*matrix
-        flattened   = (transformed*self.mean.H).inflate()
+            matrix = numpy.asarray(matrix)
 
-        cov = self.cov
-        if matrix is not None:
-            cov = matrix*cov
-            
-        return type(self)(
-            mean=flattened.mean+numpy.trace(cov) ,
-            var=4.0*flattened.var+2.0*numpy.trace(transformed.cov*self.cov),
+        return GeneralizedChi2.fromQuadraticForm(
+            mean=numpy.asarray(self.mean),
+            factor=numpy.asarray(self.scaled),
+            matrix=matrix,
         )
 
     #TODO: add a test case to show why quad and dot are different
@@ -2564,15 +3415,210 @@ class Mvn(Plane):
             ...     vectors=numpy.vstack([A.vectors,B.vectors]),
             ...     var = numpy.concatenate([A.var,B.var]),
             ... )
+
+        If one side is settled, and the other has a low rank (see 
+        :py:attr:`mvn.Mvn.lowRank`), the eigen-decomposition is updated 
+        with :py:func:`mvn.square.update` instead:
+
+            >>> noise = Mvn(vectors=Matrix.randn([1, 10]), var=2)
+            >>> state = Mvn.rand(10).freeze()
+            >>> X = state+noise
+            >>> assert not X._unsquared()
+            >>> assert X == Mvn(
+            ...     mean=state.mean+noise.mean,
+            ...     vectors=numpy.vstack([state.vectors, noise.vectors]),
+            ...     var=numpy.concatenate([state.var, noise.var]),
+            ... )
         """
-        return type(self)(
+        (selfVar, selfVectors) = self._raw()
+        (otherVar, otherVectors) = other._raw()
+
+        for (big, small) in [(self, other), (other, self)]:
+            (bigVar, bigVectors) = big._raw()
+            (smallVar, smallVectors) = small._raw()
+
+            if (
+                not big._unsquared() and
+                0 < smallVar.size <= self.lowRank*bigVar.size and
+                numpy.isfinite(bigVar).all() and
+                numpy.isfinite(smallVar).all() and
+                numpy.isfinite(smallVectors).all()
+            ):
+                (var, vectors) = square.update(
+                    bigVar, bigVectors, smallVar, smallVectors
+                )
+
+                return type(self)._fromParts(
+                    mean=self.mean+other.mean,
+                    vectors=vectors,
+                    var=var,
+                    square=False,
+                )
+
+        return type(self)._fromParts(
             mean=self.mean+other.mean,
-            vectors=numpy.vstack([self.vectors,other.vectors]),
-            var = numpy.concatenate([self.var,other.var]),
+            vectors=Matrix(numpy.vstack([selfVectors,otherVectors]), copy=False),
+            var = numpy.concatenate([selfVar,otherVar]),
         )
 
 
         
+    def logpdf(self, locations, out=None, chunkSize=2**16):
+        """
+        :param locations:
+        :param out: an array to write the results to
+        :param chunkSize: the number of locations processed at once
+
+        Returns the log of the probability density at the locations, without 
+        ever calculating the density itself, so points far out in the tails 
+        don't underflow to zero. Like :py:meth:`mvn.Mvn.mah2` it streams 
+        the locations through :py:meth:`mvn.Mvn._score`, so it accepts 
+        :py:class:`numpy.memmap` data or an iterator of chunks.
+
+            >>> data = A.sample(25)
+            >>> assert Matrix(A.logpdf(data)) == -A.entropy(data)
+            >>> assert Matrix(numpy.exp(A.logpdf(data))) == A.density(data)
+
+            >>> far = A.mean+1e3*A.vectors[0]
+            >>> assert numpy.isfinite(A.logpdf(far))
+
+            >>> S = numpy.asarray(A.sample(100))
+            >>> out = numpy.empty(100)
+            >>> assert A.logpdf(S, out=out, chunkSize=7) is out
+            >>> assert Matrix(out) == A.logpdf(S)
+        """
+        return self._score(locations, None, out, chunkSize, log=True)
+
+    @classmethod
+    def logpdfMany(cls, mvns, locations, out=None, chunkSize=None):
+        """
+        :param mvns: an iterable of K Mvns, with the same number of 
+            dimensions, or an :py:class:`mvn.mvnarray.MvnArray`
+        :param locations: *shape=(...,ndim)*, an array, a 
+            :py:class:`numpy.memmap`, or an iterator of *(N,ndim)* chunks
+        :param out: an array to write the results to, *shape=(...,K)*
+        :param chunkSize: the number of locations processed at once, by 
+            default the whitened chunk holds about 2**18 values, so it stays 
+            in the cache
+
+        the log-density of each Mvn at each location, *shape=(...,K)*, with 
+        one column per Mvn, so a log-sum-exp over the components is a 
+        reduction along the last axis:
+
+            >>> abc = [A, B & ~B, C]
+            >>> data = A.sample(20)
+            >>> L = Mvn.logpdfMany(abc, data)
+            >>> assert L.shape == (20, 3)
+            >>> assert all(
+            ...     Matrix(L[:, k]) == m.logpdf(data) 
+            ...     for k, m in enumerate(abc)
+            ... )
+
+        The whiteners (see :py:meth:`mvn.Mvn._whitener`) of all the Mvns are 
+        stacked side by side, so each chunk of locations is read once, and 
+        whitened for every Mvn with one matrix product:
+
+            >>> out = numpy.empty([20, 3])
+            >>> assert Mvn.logpdfMany(abc, data, out=out, chunkSize=7) is out
+            >>> assert Matrix(out) == L
+            >>> chunks = Mvn.logpdfMany(abc, iter(numpy.array_split(data, 3)))
+            >>> assert Matrix(numpy.vstack(list(chunks))) == L
+        """
+        mvns = list(mvns)
+        assert mvns, 'no Mvns to score'
+
+        ndim = mvns[0].ndim
+        assert all(mvn.ndim == ndim for mvn in mvns), (
+            'the Mvns must have the same number of dimensions'
+        )
+
+        whiteners = []
+        offsets = []
+        signs = []
+        constants = []
+        for mvn in mvns:
+            (whitener, sign) = mvn._whitener()
+            whiteners.append(whitener)
+            offsets.append(numpy.dot(numpy.asarray(mvn.mean).ravel(), whitener))
+            signs.append(
+                numpy.ones(whitener.shape[1]) if sign is None else sign
+            )
+            constants.append(mvn._logNormalizer())
+
+        whitener = numpy.ascontiguousarray(numpy.hstack(whiteners))
+        offset = numpy.concatenate(offsets)
+        signs = numpy.concatenate(signs)
+        constants = numpy.array(constants)
+        signed = None if (signs > 0).all() else signs
+
+        #each Mvn's columns are summed with reduceat, which can't handle 
+        #empty segments, those Mvns have a zero mah2
+        sizes = numpy.array([w.shape[1] for w in whiteners])
+        filled = sizes > 0
+        starts = (numpy.cumsum(sizes)-sizes)[filled]
+
+        def score(block, out):
+            white = numpy.dot(block, whitener)
+            white -= offset
+
+            if numpy.iscomplexobj(white):
+                white = numpy.real(white*white.conj())
+            else:
+                numpy.square(white, out=white)
+
+            if signed is not None:
+                white *= signed
+
+            if filled.all():
+                numpy.add.reduceat(white, starts, axis=1, out=out)
+            else:
+                out[:, ~filled] = 0
+                if starts.size:
+                    out[:, filled] = numpy.add.reduceat(white, starts, axis=1)
+
+            out *= -0.5
+            out -= constants
+
+            return out
+
+        if chunkSize is None:
+            chunkSize = max(1, 2**18//max(1, whitener.shape[1]))
+
+        return _stream(
+            score, locations, ndim, (len(mvns),), out, chunkSize
+        )
+
+    def logLikelihood(self, data, weights=None, chunkSize=2**16):
+        """
+        :param data: *shape=(N,ndim)*, an array, a :py:class:`numpy.memmap`, 
+            or an iterator of *(N,ndim)* chunks
+        :param weights: *shape=(N,)*, optional weight for each sample, not 
+            allowed with an iterator
+        :param chunkSize: the number of samples processed at once
+
+        the (weighted) sum of the log-density of the samples, see 
+        :py:meth:`mvn.Mvn.logpdf`
+
+            >>> data = A.sample(20)
+            >>> assert Matrix(A.logLikelihood(data)) == A.logpdf(data).sum()
+            >>> weights = numpy.random.rand(20)
+            >>> assert Matrix(A.logLikelihood(data, weights)) == numpy.dot(
+            ...     weights, A.logpdf(data)
+            ... )
+            >>> chunks = iter(numpy.array_split(numpy.asarray(data), 3))
+            >>> assert Matrix(A.logLikelihood(chunks)) == A.logLikelihood(data)
+        """
+        scores = self.logpdf(data, chunkSize=chunkSize)
+
+        if isinstance(scores, collections.Iterator):
+            assert weights is None, 'weights need array data'
+            return sum(chunk.sum() for chunk in scores)
+
+        if weights is None:
+            return scores.sum()
+
+        return numpy.dot(numpy.ravel(weights), scores.ravel())
+
     def density(self, locations):
         """
         :param locations:
@@ -2593,7 +3639,12 @@ class Mvn(Plane):
         >>> ratio = (a*b)/ab
         >>> assert Matrix(0) == ratio.var()
         """
-        return numpy.exp(-self.entropy(locations)) 
+        result = self.logpdf(locations)
+
+        if isinstance(result, numpy.ndarray):
+            return numpy.exp(result, out=result)
+
+        return numpy.exp(result)
     
 
     def entropy(self, data=None, base=None):
@@ -2675,17 +3726,13 @@ class Mvn(Plane):
 #TODO: multimethod
         if isinstance(data, Mvn):
             baseE = (
-                numpy.log(abs(data.pdet()))+
+                data.logPdet()+
                 data.rank*numpy.log(2*numpy.pi*numpy.e)
             )/2
             if data is not self:
                 baseE += self.KLdiv(data)
         else:
-            baseE = (
-                self.mah2(data)+
-                self.rank*numpy.log(2*numpy.pi)+
-                numpy.log(abs(self.pdet()))
-            )/2
+            baseE = -self.logpdf(data)
 
         return baseE/numpy.log(base)
         
@@ -2765,7 +3812,7 @@ class Mvn(Plane):
                 baseE = (
                     (other/self).trace()+
                     ((self**-1)*(self.mean-other.mean).H).cov-
-                    numpy.log(abs(other.pdet()/self.pdet()))-
+                    (other.logPdet()-self.logPdet())-
                     self.rank
                 )/2
                 return (baseE/numpy.log(base))[0, 0]
@@ -2874,15 +3921,97 @@ class Mvn(Plane):
         return self.Plotter(self).plot(axis,**kwargs)
 
 
-#def setup(module):
-#    import mvn.test.fixture
-#    
-#    module.__dict__.update(mvn.test.fixture.lookup['last'])
-#    return module
+def _stream(score, locations, ndim, width, out=None, chunkSize=2**16):
+    """
+    :param score: a function, score(block, out), that writes the results for 
+        an *(N,ndim)* block of locations to an *(N,)+width* array 
+    :param locations: an array, *shape=(...,ndim)*, or an iterator of 
+        *(N,ndim)* arrays
+    :param ndim: the number of dimensions of a location
+    :param width: the shape of the result for each location
+    :param out: an array to write the results to
+    :param chunkSize: the number of locations processed at once
+
+    drives a scoring kernel over the locations, *chunkSize* rows at a time, 
+    see :py:meth:`mvn.Mvn._score` and :py:meth:`mvn.Mvn.logpdfMany`.
+
+    An array input gives an array of results, *shape=(...)+width*, (written 
+    to out, if it's given). An iterator gives an iterator of results, 
+    one array per chunk, unless out is given, then they are written to 
+    it, in order.
+    """
+    if isinstance(locations, collections.Iterator):
+        chunks = (
+            _stream(score, chunk, ndim, width, None, chunkSize) 
+            for chunk in locations
+        )
+
+        if out is None:
+            return chunks
+
+        target = out.reshape((-1,)+width)
+        start = 0
+        for result in chunks:
+            result = result.reshape((-1,)+width)
+            target[start:start+result.shape[0]] = result
+            start += result.shape[0]
+
+        return out
+
+    locations = numpy.asarray(locations)
+    
+    if ndim == 1 and locations.ndim == 1 and locations.size != 1:
+        locations = locations[:, None]
+
+    shape = locations.shape[:-1]
+    locations = locations.reshape([-1, ndim])
+
+    result = numpy.empty(shape+width) if out is None else out
+    target = result.reshape((-1,)+width)
+
+    assert numpy.may_share_memory(target, result) or not target.size, (
+        'out must be contiguous'
+    )
+
+    for start in xrange(0, locations.shape[0], chunkSize):
+        stop = start+chunkSize
+        score(locations[start:stop], target[start:stop])
+
+    if out is None and not result.shape:
+        return result[()]
+
+    return result
+
+
+def _chunkSummary(task):
+    """
+    :param task: a (data, weights) pair, where the data is either an array, 
+        or a description of a chunk of a memory-mapped file
+
+    used by :py:meth:`mvn.Mvn.fromChunks`, returns (count, Mvn) or None for 
+    an empty chunk. This is a module level function, so it can be sent to 
+    a process pool.
+    """
+    (data, weights) = task
+
+    if isinstance(data, tuple):
+        (filename, dtype, shape, offset, start, stop) = data
+        data = numpy.memmap(
+            filename, dtype=dtype, mode='r', shape=shape, offset=offset
+        )[start:stop]
+
+    accumulator = MvnAccumulator().update(data, weights)
+
+    if not accumulator.count:
+        return None
+
+    return (accumulator.count, accumulator.result())
+
 
-if __debug__:
-    import mvn.test.fixture 
-    globals().update(mvn.test.fixture.lookup['last'])
+from mvn.mvnarray import MvnArray
+from mvn.squareroot import SqrtMvn
+from mvn.information import InfoMvn
+from mvn.accumulator import MvnAccumulator
     
     
     
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+"""
+***************
+Mvn Accumulator
+***************
+
+One pass, constant memory, estimation of an :py:class:`mvn.Mvn` from data
+that does not fit in memory.
+
+:py:meth:`mvn.Mvn.fromData` builds an *(N,ndim)* block of deviations, and
+squares it. The accumulator only keeps the total weight, the mean, and the
+*(ndim,ndim)* matrix of summed squared deviations, and updates them one batch
+at a time, with the pairwise update from Chan, Golub and LeVeque
+(the batched form of Welford's algorithm):
+
+    >>> from mvn import Mvn
+    >>> data = numpy.random.randn(1000, 3)+numpy.random.randn(1, 3)
+    >>>
+    >>> acc = MvnAccumulator()
+    >>> for batch in numpy.array_split(data, 7):
+    ...     acc = acc.update(batch)
+    >>> assert acc.result() == Mvn.fromData(data)
+    >>> assert acc.result(bias=False) == Mvn.fromData(data, bias=False)
+
+Accumulators from separate streams can be merged:
+
+    >>> left = MvnAccumulator().update(data[:300])
+    >>> right = MvnAccumulator().update(data[300:])
+    >>> assert left.merge(right).result() == Mvn.fromData(data)
+"""
+
+import numpy
+
+from mvn import Mvn
+
+
+class MvnAccumulator(object):
+    """
+    .. inheritance-diagram:: mvn.accumulator.MvnAccumulator
+
+    Attributes:
+        | **count** : the total weight seen so far
+        | **mean** : *shape=(ndim,)*, the weighted mean
+        | **scatter** : *shape=(ndim,ndim)*, the weighted sum of the outer
+            products of the deviations from the mean
+    """
+
+    def __init__(self, ndim=None):
+        """
+        :param ndim: the number of dimensions, if None it is taken from the
+            first update
+        """
+        self.count = 0.0
+        self.mean = None
+        self.scatter = None
+
+        if ndim is not None:
+            self._start(ndim)
+
+    def _start(self, ndim):
+        """
+        set the state for an empty accumulator with ndim dimensions
+        """
+        self.mean = numpy.zeros(ndim)
+        self.scatter = numpy.zeros([ndim, ndim])
+
+    @property
+    def ndim(self):
+        """
+        the number of dimensions, or None before the first update
+        """
+        return None if self.mean is None else self.mean.size
+
+    def update(self, batch, weights=None):
+        """
+        :param batch: *shape=(N,ndim)*, each row is a sample. 1d data is
+            treated as N samples with one dimension, like
+            :py:meth:`mvn.Mvn.fromData`. An :py:class:`mvn.Mvn` is treated as
+            a summary of weights (default 1) samples, like the object arrays
+            in :py:meth:`mvn.Mvn.fromArray`.
+        :param weights: *shape=(N,)*, optional weight for each sample
+
+        add a batch of samples, returns self
+
+        >>> from mvn import Mvn
+        >>> data = numpy.random.randn(10, 2)
+        >>> weights = numpy.random.rand(10)
+        >>> acc = MvnAccumulator()
+        >>> acc = acc.update(data[:4], weights[:4]).update(data[4:], weights[4:])
+        >>> assert acc.result() == Mvn.fromData(data, weights=weights)
+
+        >>> mvns = [Mvn.fromData(data[:4]), Mvn.fromData(data[4:])]
+        >>> acc = MvnAccumulator()
+        >>> acc = acc.update(mvns[0], 4).update(mvns[1], 6)
+        >>> assert acc.result() == Mvn.fromData(data)
+        """
+        if isinstance(batch, Mvn):
+            weight = 1.0 if weights is None else float(numpy.sum(weights))
+            mean = numpy.asarray(batch.mean).ravel()
+            scatter = weight*numpy.asarray(batch.cov)
+
+            return self._combine(weight, mean, scatter)
+
+        batch = numpy.asarray(batch, dtype=float)
+        if batch.ndim == 1:
+            batch = batch[:, None]
+
+        if weights is None:
+            weights = numpy.ones(batch.shape[0])
+        else:
+            weights = numpy.asarray(weights, dtype=float).ravel()
+
+        assert weights.size == batch.shape[0], (
+            'there must be one weight per sample'
+        )
+
+        count = weights.sum()
+        if not count:
+            if self.mean is None:
+                self._start(batch.shape[1])
+            return self
+
+        mean = numpy.dot(weights, batch)/count
+        deltas = batch-mean
+        scatter = numpy.dot((deltas*weights[:, None]).T, deltas)
+
+        return self._combine(count, mean, scatter)
+
+    def merge(self, other):
+        """
+        :param other: another :py:class:`mvn.accumulator.MvnAccumulator`
+
+        add the samples from another accumulator to this one, returns self
+        """
+        if other.mean is None:
+            return self
+
+        return self._combine(other.count, other.mean, other.scatter)
+
+    def _combine(self, count, mean, scatter):
+        """
+        merge in the (count, mean, scatter) summary of another set of samples
+        """
+        if self.mean is None:
+            self._start(mean.size)
+
+        assert mean.size == self.mean.size, 'dimension mismatch'
+
+        total = self.count+count
+        if not total:
+            return self
+
+        delta = mean-self.mean
+
+        self.scatter = (
+            self.scatter+scatter+
+            numpy.outer(delta, delta)*(self.count*count/total)
+        )
+        self.mean = self.mean+delta*(count/total)
+        self.count = total
+
+        return self
+
+    def result(self, bias=True, **kwargs):
+        """
+        :param bias: like :py:meth:`mvn.Mvn.fromData`, if false the scatter
+            is divided by count-1 instead of count
+        :param ** kwargs: passed on to :py:meth:`mvn.Mvn.fromCov`
+
+        return the :py:class:`mvn.Mvn` for the samples seen so far
+        """
+        assert self.mean is not None, 'no data'
+
+        denominator = self.count-(not bias)
+        if denominator <= 0:
+            return Mvn.infs(self.ndim, mean=self.mean if self.count else None)
+
+        return Mvn.fromCov(
+            self.scatter/denominator,
+            mean=self.mean,
+            **kwargs
+        )
+
+    def __repr__(self):
+        return '%s(count=%r, mean=%r)' % (
+            type(self).__name__,
+            self.count,
+            self.mean,
+        )
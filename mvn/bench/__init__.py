@@ -0,0 +1,524 @@
+#! /usr/bin/env python
+"""
+**********
+Benchmarks
+**********
+
+Timings for the core :py:class:`mvn.Mvn` operators, over a grid of
+dimensions, ranks (flatness), and with or without an infinite variance.
+
+The results are plain data, so they can be saved as JSON, and compared
+against a saved baseline:
+
+    >>> results = run(ndims=[2], flats=[0], infinite=[False],
+    ...     select=['add', 'mah2'], budget=0.001, repeat=1)
+    >>> sorted(record['case'] for record in results['records'])
+    [u'add', u'mah2']
+    >>> assert not compare(results, results)
+
+From the command line:
+
+    | python -m mvn.bench --output baseline.json
+    | python -m mvn.bench --baseline baseline.json
+
+the second form exits with a non-zero status if anything is slower than the
+baseline by more than the tolerance.
+
+The operands are reused between repetitions, so the per-instance caches
+(see :py:meth:`mvn.Mvn.freeze`) are warm, and results that are computed
+lazily (:py:meth:`mvn.Mvn.cannonize`) are forced by reading the variances.
+"""
+
+import sys
+import json
+import timeit
+import platform
+import optparse
+import collections
+
+import numpy
+
+import mvn
+import mvn.square
+from mvn import Mvn
+from mvn.matrix import Matrix
+from mvn.mixture import Mixture
+
+cases = collections.OrderedDict()
+"""
+the benchmark cases, by name. Each takes the operands from
+:py:func:`mvn.bench.makeObjects` and returns the function to time.
+"""
+
+def case(name):
+    """
+    decorator to register a benchmark case, under the given name
+    """
+    def register(function):
+        cases[name] = function
+        return function
+    return register
+
+settle = lambda item: item.var
+
+@case('construct')
+def _construct(fix):
+    A = fix['A']
+    return lambda: Mvn(vectors=A.vectors, var=A.var, mean=A.mean)
+
+@case('square')
+def _square(fix):
+    (A, B) = (fix['A'], fix['B'])
+    vectors = numpy.vstack([A.vectors, B.vectors])
+    var = numpy.concatenate([A.var, B.var])
+    return lambda: mvn.square.square(vectors=vectors, var=var)
+
+@case('and')
+def _and(fix):
+    (A, B) = (fix['A'], fix['B'])
+    return lambda: settle(A & B)
+
+@case('infoAnd')
+def _infoAnd(fix):
+    (A, B) = [mvn.InfoMvn.fromMvn(fix[name]) for name in 'AB']
+    return lambda: settle(A & B)
+
+@case('pow')
+def _pow(fix):
+    A = fix['A']
+    return lambda: settle(A**-1)
+
+@case('mulScalar')
+def _mulScalar(fix):
+    A = fix['A']
+    return lambda: settle(A*2.5)
+
+@case('mulMatrix')
+def _mulMatrix(fix):
+    (A, M) = (fix['A'], fix['M'])
+    return lambda: settle(A*M)
+
+@case('mulMvn')
+def _mulMvn(fix):
+    (A, B) = (fix['A'], fix['B'])
+    return lambda: settle(A*B)
+
+@case('add')
+def _add(fix):
+    (A, B) = (fix['A'], fix['B'])
+    return lambda: settle(A+B)
+
+@case('given')
+def _given(fix):
+    A = fix['A']
+    return lambda: settle(A.given(dims=0, value=1.0))
+
+@case('marginal')
+def _marginal(fix):
+    A = fix['A']
+    return lambda: settle(A.marginal(0))
+
+@case('mah2')
+def _mah2(fix):
+    (A, data) = (fix['A'], fix['data'])
+    return lambda: A.mah2(data)
+
+@case('density')
+def _density(fix):
+    (A, data) = (fix['A'], fix['data'])
+    return lambda: A.density(data)
+
+@case('logpdf')
+def _logpdf(fix):
+    (A, data) = (fix['A'], fix['data'])
+    return lambda: A.logpdf(data)
+
+@case('logpdfMany')
+def _logpdfMany(fix):
+    (A, B, data) = (fix['A'], fix['B'], fix['data'])
+    mvns = [A, B, (A+B).freeze(), (B*2).freeze()]
+    return lambda: Mvn.logpdfMany(mvns, data)
+
+@case('entropy')
+def _entropy(fix):
+    A = fix['A']
+    return lambda: A.entropy()
+
+@case('KLdiv')
+def _KLdiv(fix):
+    (A, B) = (fix['A'], fix['B'])
+    return lambda: A.KLdiv(B)
+
+@case('inBox')
+def _inBox(fix):
+    B = fix['B']
+    (lower, upper) = (fix['lower'], fix['upper'])
+    return lambda: B.inBox(lower, upper)
+
+@case('inBoxBatch')
+def _inBoxBatch(fix):
+    B = fix['B']
+    scales = numpy.linspace(0.5, 2, 100)[:, None]
+    (lower, upper) = (fix['lower']*scales, fix['upper']*scales)
+    return lambda: B.inBox(lower, upper)
+
+@case('inBoxTrivariate')
+def _inBoxTrivariate(fix):
+    B = fix['B'][:, :3]
+    scales = numpy.linspace(0.5, 2, 100)[:, None]
+    (lower, upper) = (fix['lower'][:3]*scales, fix['upper'][:3]*scales)
+    return lambda: B.inBox(lower, upper)
+
+@case('inBoxMvndst')
+def _inBoxMvndst(fix):
+    B = fix['B']
+    scales = numpy.linspace(0.5, 2, 100)[:, None]
+    (lower, upper) = (fix['lower']*scales, fix['upper']*scales)
+    return lambda: B.inBox(lower, upper, errors=True, method='mvndst')
+
+@case('quadCdf')
+def _quadCdf(fix):
+    Q = fix['B'].quad()
+    x = Q.mean+numpy.sqrt(Q.var)*numpy.linspace(-2, 4, 100)
+    return lambda: Q.cdf(x)
+
+@case('sample')
+def _sample(fix):
+    A = fix['A']
+    return lambda: A.sample(fix['count'])
+
+@case('mixtureFit')
+def _mixtureFit(fix):
+    (A, B, data) = (fix['A'], fix['B'], fix['data'])
+    mixture = Mixture([A, B])
+    return lambda: mixture.fit(data, maxIter=1)
+
+
+def makeObjects(ndim, flat=0, infinite=False, seed=0, count=200):
+    """
+    :param ndim: the number of dimensions
+    :param flat: the number of missing dimensions in A (ndim-rank)
+    :param infinite: if true, A gets an extra direction with infinite variance
+    :param seed: the random seed
+    :param count: the number of data points
+
+    build the operands for the benchmark cases
+
+    >>> fix = makeObjects(3, flat=1, infinite=True)
+    >>> assert fix['A'].shape == (3, 3)
+    >>> assert numpy.isinf(fix['A'].var).sum() == 1
+    >>> assert fix['data'].shape == (200, 3)
+    """
+    numpy.random.seed(seed)
+
+    A = Mvn.rand([ndim-flat, ndim])
+    if infinite:
+        A = A+Mvn(
+            vectors=Matrix.randn([1, ndim]).unit(),
+            var=numpy.inf,
+            mean=numpy.zeros(ndim),
+        )
+
+    B = Mvn.rand(ndim)
+    width = B.width()
+
+    data = numpy.asarray(B.sample(count))
+
+    return {
+        'A': A.freeze(),
+        'B': B.freeze(),
+        'M': Matrix.randn([ndim, ndim]),
+        'data': data,
+        'count': count,
+        'lower': numpy.asarray(B.mean).ravel()-width,
+        'upper': numpy.asarray(B.mean).ravel()+width,
+    }
+
+
+def timeCase(function, budget=0.02, repeat=3):
+    """
+    :param function: a function with no arguments
+    :param budget: the minimum time, in seconds, for each repetition
+    :param repeat: the number of repetitions
+
+    returns the best time per call, in seconds, calibrating the number of
+    calls per repetition like :py:mod:`timeit` does.
+    """
+    timer = timeit.Timer(function)
+
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= budget:
+            break
+        number *= 10
+
+    times = [elapsed]+timer.repeat(repeat-1, number)
+
+    return min(times)/number
+
+
+def run(
+    ndims=(2, 5, 10), flats=(0, 1), infinite=(False, True),
+    select=None, seed=0, budget=0.02, repeat=3
+):
+    """
+    :param ndims: the numbers of dimensions to try
+    :param flats: the numbers of missing dimensions to try, skipped if larger
+        than ndim
+    :param infinite: the infinite-variance options to try
+    :param select: the names of the cases to run, default all of
+        :py:data:`mvn.bench.cases`
+    :param seed: the random seed for the operands
+    :param budget: see :py:func:`mvn.bench.timeCase`
+    :param repeat: see :py:func:`mvn.bench.timeCase`
+
+    run the benchmarks, returns a dictionary of the environment, and a list
+    of records. A case that raises records the error instead of a time.
+    """
+    names = list(cases) if select is None else list(select)
+
+    records = []
+    for ndim in ndims:
+        for flat in flats:
+            if flat >= ndim:
+                continue
+
+            for inf in infinite:
+                fix = makeObjects(ndim, flat, inf, seed)
+
+                for name in names:
+                    record = {
+                        'case': name,
+                        'ndim': ndim,
+                        'rank': ndim-flat,
+                        'infinite': inf,
+                    }
+
+                    try:
+                        record['seconds'] = timeCase(
+                            cases[name](fix), budget, repeat
+                        )
+                    except Exception as error:
+                        record['error'] = '%s: %s' % (
+                            type(error).__name__, error
+                        )
+
+                    records.append(record)
+
+    #a round trip through json, so fresh results look just like loaded ones
+    return json.loads(json.dumps({
+        'environment': environment(),
+        'records': records,
+    }))
+
+
+def fusion(
+    counts=(2, 10, 100, 1000), ndim=5, seed=0, budget=0.02, repeat=3
+):
+    """
+    :param counts: the numbers of Mvns to blend together
+    :param ndim: the number of dimensions
+    :param seed: the random seed for the operands
+    :param budget: see :py:func:`mvn.bench.timeCase`
+    :param repeat: see :py:func:`mvn.bench.timeCase`
+
+    time :py:meth:`mvn.Mvn.fuse` against folding the same Mvns together 
+    with the & operator. The records have the same form as the ones from 
+    :py:func:`mvn.bench.run`, with the count in the case name:
+
+    >>> results = fusion(counts=[3], ndim=2, budget=0.001, repeat=1)
+    >>> sorted(record['case'] for record in results['records'])
+    [u'fold3', u'fuse3']
+    """
+    numpy.random.seed(seed)
+
+    records = []
+    for count in counts:
+        mvns = [Mvn.rand(ndim).freeze() for n in range(count)]
+
+        functions = [
+            ('fold', lambda: settle(reduce(lambda a, b: a & b, mvns))),
+            ('fuse', lambda: settle(Mvn.fuse(mvns))),
+        ]
+
+        for (name, function) in functions:
+            records.append({
+                'case': '%s%d' % (name, count),
+                'ndim': ndim,
+                'rank': ndim,
+                'infinite': False,
+                'seconds': timeCase(function, budget, repeat),
+            })
+
+    return json.loads(json.dumps({
+        'environment': environment(),
+        'records': records,
+    }))
+
+
+def environment():
+    """
+    the versions that the timings depend on
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+    }
+
+
+def _key(record):
+    return (record['case'], record['ndim'], record['rank'], record['infinite'])
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    :param results: from :py:func:`mvn.bench.run`
+    :param baseline: from :py:func:`mvn.bench.run`, probably loaded from a file
+    :param tolerance: the allowed fractional slow-down
+
+    return a list of the regressions, as (record, baseline-record) pairs.
+    A case that used to work, and now raises, is a regression. Cases missing
+    from either side are ignored.
+
+    >>> old = {'records':[
+    ...     {'case':'add', 'ndim':2, 'rank':2, 'infinite':False, 'seconds':1.0}
+    ... ]}
+    >>> new = {'records':[
+    ...     {'case':'add', 'ndim':2, 'rank':2, 'infinite':False, 'seconds':1.5}
+    ... ]}
+    >>> assert compare(new, old)
+    >>> assert not compare(new, old, tolerance=1)
+    >>> assert not compare(old, new)
+    """
+    base = dict((_key(record), record) for record in baseline['records'])
+
+    regressions = []
+    for record in results['records']:
+        old = base.get(_key(record))
+
+        if old is None or 'seconds' not in old:
+            continue
+
+        if (
+            'seconds' not in record or
+            record['seconds'] > old['seconds']*(1+tolerance)
+        ):
+            regressions.append((record, old))
+
+    return regressions
+
+
+def report(results, baseline=None, stream=sys.stdout):
+    """
+    print a table of the results, with the ratio to the baseline, if given
+    """
+    base = {} if baseline is None else dict(
+        (_key(record), record) for record in baseline['records']
+    )
+
+    for record in results['records']:
+        line = '%-12s ndim=%-3d rank=%-3d inf=%-d ' % _key(record)
+
+        if 'seconds' not in record:
+            line += ' '+record['error']
+        else:
+            line += '%10.1fus' % (record['seconds']*1e6)
+
+            old = base.get(_key(record), {})
+            if 'seconds' in old:
+                line += '  x%.2f' % (record['seconds']/old['seconds'])
+
+        stream.write(line+'\n')
+
+
+def parse(argv):
+    parser = optparse.OptionParser(usage='python -m mvn.bench [options]')
+
+    parser.add_option(
+        '--ndim', action='append', type=int, dest='ndims',
+        help='a number of dimensions to try (repeatable)'
+    )
+    parser.add_option(
+        '--flat', action='append', type=int, dest='flats',
+        help='a number of missing dimensions to try (repeatable)'
+    )
+    parser.add_option(
+        '--case', action='append', dest='select',
+        help='a case to run (repeatable), default all of: '+', '.join(cases)
+    )
+    parser.add_option(
+        '--finite', action='store_true', default=False,
+        help='skip the infinite variance cases'
+    )
+    parser.add_option(
+        '--fusion', action='store_true', default=False,
+        help='time Mvn.fuse against the & fold, for 2 to 1000 Mvns, instead'
+    )
+    parser.add_option(
+        '--output',
+        help='save the results, as json, to this file'
+    )
+    parser.add_option(
+        '--baseline',
+        help='compare against results saved with --output'
+    )
+    parser.add_option(
+        '--tolerance', type=float, default=0.25,
+        help='the allowed fractional slow-down (default 0.25)'
+    )
+    parser.add_option(
+        '--budget', type=float, default=0.02,
+        help='the minimum seconds per repetition (default 0.02)'
+    )
+    parser.add_option(
+        '--seed', type=int, default=0,
+        help='the random seed for the operands'
+    )
+
+    (settings, remainder) = parser.parse_args(argv)
+    assert not remainder
+    return settings
+
+
+def main(argv=None):
+    """
+    run the benchmarks from the command line, returns the exit status
+    """
+    settings = parse([] if argv is None else argv)
+
+    if settings.fusion:
+        results = fusion(seed=settings.seed, budget=settings.budget)
+    else:
+        results = run(
+            ndims=settings.ndims or (2, 5, 10),
+            flats=settings.flats or (0, 1),
+            infinite=(False,) if settings.finite else (False, True),
+            select=settings.select,
+            seed=settings.seed,
+            budget=settings.budget,
+        )
+
+    baseline = None
+    if settings.baseline:
+        baseline = json.load(open(settings.baseline))
+
+    report(results, baseline)
+
+    if settings.output:
+        json.dump(results, open(settings.output, 'w'), indent=1, sort_keys=True)
+
+    if baseline is None:
+        return 0
+
+    regressions = compare(results, baseline, settings.tolerance)
+    for (record, old) in regressions:
+        sys.stderr.write('regression: %s was %s, now %s\n' % (
+            '%s ndim=%d rank=%d inf=%d' % _key(record),
+            old['seconds'],
+            record.get('seconds', record.get('error')),
+        ))
+
+    return 1 if regressions else 0
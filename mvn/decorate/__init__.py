@@ -7,6 +7,7 @@ Useful Decorators
 
 # builtin
 import types
+import inspect
 import itertools
 import collections
 
@@ -143,20 +144,35 @@ class MultiMethod(object):
     Ex,num
     >>> e+[]
     Ex,anything
+
+    subclasses use the registration for their nearest base class, 
+    so bool is an int, and a subclass of Ex is an Ex:
+
+    >>> e+True
+    Ex,num
+    >>> class Sub(Ex):
+    ...     pass
+    >>> Sub()+e
+    Ex,Ex
+    >>> @Ex.__add__.register(Ex,Sub)
+    ... def addSub(self,other):
+    ...     print 'Ex,Sub'
+    >>> e+Sub()
+    Ex,Sub
+
+    The match for each tuple of argument types is cached, so after the first 
+    call dispatch is one dictionary lookup. Registering a new function 
+    clears the cache.
     """
     def __new__(baseClass,defaultFun):
         # this caller is the object that will be returned
         @decorator 
         def caller(defaultFun,*args,**kwargs): 
             types = tuple(arg.__class__ for arg in args)
-            while True:
-                try:
-                    found = subClass.typemap[types]
-                except KeyError:
-                    #pop types until you find a match
-                    types = types[:-1]
-                else:
-                    break
+            try:
+                found = cache[types]
+            except KeyError:
+                found = cache[types] = subClass.resolve(types)
 
             return found(*args,**kwargs)
 
@@ -167,6 +183,8 @@ class MultiMethod(object):
         subClass = type(defaultFun.__name__,(baseClass,),{})
         #add the prototype function as the default in the typemap
         subClass.typemap={(): defaultFun}
+        #and the resolved functions, by the exact argument types
+        subClass.cache = cache = {}
         #and put the decorator into the subclass
         subClass.__call__=staticmethod(decorated)
         
@@ -176,6 +194,37 @@ class MultiMethod(object):
         
         return decorated
 
+    @classmethod
+    def resolve(cls,types):
+        """
+        find the function to call for a tuple of argument types.
+
+        The registrations for the longest leading run of arguments win, 
+        then the one whose types are nearest, by method resolution order, 
+        comparing from the leftmost argument.
+        """
+        mros = [inspect.getmro(T) for T in types]
+
+        for length in range(len(types), -1, -1):
+            best = None
+
+            for (key, function) in cls.typemap.iteritems():
+                if len(key) != length:
+                    continue
+
+                try:
+                    distance = tuple(
+                        mro.index(T) for (mro, T) in zip(mros, key)
+                    )
+                except ValueError:
+                    continue
+
+                if best is None or distance < best[0]:
+                    best = (distance, function)
+
+            if best is not None:
+                return best[1]
+
     def register(self,*types):
         """
         types can be individual types or sequences of types
@@ -205,6 +254,7 @@ class MultiMethod(object):
             
                 self.typemap[types] = function
 
+            self.cache.clear()
             self.last = function
 
             if function.__name__ == self.__call__.__name__:
@@ -257,6 +307,7 @@ class MultiMethod(object):
                 )
                 m.typemap.clear()
                 m.typemap.update(replace)
+                m.cache.clear()
 
         return cls
 
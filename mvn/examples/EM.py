@@ -33,8 +33,7 @@ for N in range(10):
         pi2/(pi1+pi2)
     ]
 
-    d1 = R1.density(data)*pi1
-    d2 = R2.density(data)*pi2
+    (d1,d2) = (numpy.exp(Mvn.logpdfMany([R1,R2],data))*[pi1,pi2]).T
 
     (W1,W2) = [
         d1/(d1+d2),
@@ -4,6 +4,7 @@
 .. plot:: ./examples/dist.py main
 """
 
+import numpy
 import pylab
 
 from mvn import Mvn
@@ -57,6 +58,22 @@ def hist(red,blue,ax=None,orientation='vertical'):
     )
     
 
+def cdf(red, blue, ax=None):
+    """
+    compare a theoretical cdf to the empirical one
+    """
+    if ax is None:
+        ax=pylab.gca()
+
+    blue = numpy.sort(blue)
+    ax.step(
+        blue, numpy.arange(1, blue.size+1)/float(blue.size), 
+        where='post', zorder=0, alpha=alpha,
+    )
+
+    ax.plot(blue, red.cdf(blue), color='r', zorder=1)
+
+
 def main():
     
     #get axis
@@ -75,8 +92,10 @@ def main():
     
     print errors
     
-    hist(A.dist2(),errors,ax0)
-    
+    cdf(A.mah2(), errors, ax0)
+
+    #the squared distances, without squishing
+    cdf(A.dist2(), (numpy.asarray(data-A.mean)**2).sum(1), ax1)
     
     pylab.show()
 
@@ -0,0 +1,448 @@
+#! /usr/bin/env python
+"""
+*******
+Filters
+*******
+
+Sequence engines built on the same model as the operator form of the
+kalman filter:
+
+    >>> state[t+1] = (state[t]*transform + noise) & (sensor + measurement[t]) #doctest: +SKIP
+
+The operator form builds several new :py:class:`mvn.Mvn` objects, and squares
+them, at every step. The classes here run the same model over a whole block of
+measurements, working directly on preallocated mean and covariance arrays.
+"""
+
+import numpy
+import scipy.linalg
+
+
+class KalmanFilter(object):
+    """
+    .. inheritance-diagram:: mvn.filters.KalmanFilter
+
+    A linear kalman filter, equivalent to the operator form:
+
+    >>> from mvn import Mvn
+    >>>
+    >>> transform = numpy.array([[1, 0], [0.5, 1]])
+    >>> noise = Mvn(vectors=[[1, 0], [0, 1]], var=numpy.array([0.5, 1])**2)
+    >>> sensor = Mvn(vectors=[[1, 0], [0, 1]], var=[1, numpy.inf])
+    >>> state = Mvn(mean=[0, 5], vectors=numpy.eye(2))
+    >>>
+    >>> T = 100
+    >>> measurements = numpy.random.randn(T, 2)+numpy.arange(T)[:, None]
+    >>>
+    >>> KF = KalmanFilter(transform, noise, sensor)
+    >>> (means, covs) = KF.filter(measurements, state)
+    >>> assert means.shape == (T, 2)
+    >>> assert covs.shape == (T, 2, 2)
+    >>>
+    >>> S = state
+    >>> for (z, mean, cov) in zip(measurements, means, covs):
+    ...     S = (S*transform + noise) & (sensor + z)
+    ...     assert S == Mvn.fromCov(cov, mean=mean)
+
+    The sensor is an :py:class:`mvn.Mvn` in the state space: its mean is the
+    sensor's bias, directions with infinite variance are not measured, and
+    the missing directions of a flat sensor are measured exactly.
+
+    The covariances do not depend on the measurements, so they (and the
+    gains) are iterated first, using the Joseph form update, with a cholesky
+    solve for the gain. Once they stop changing (within
+    :py:attr:`mvn.filters.KalmanFilter.rtol`,
+    :py:attr:`mvn.filters.KalmanFilter.atol`) the remaining means are a
+    linear recurrence with constant coefficients, which is evaluated with a
+    parallel scan, in log2(T) matrix multiplies over the whole block.
+    """
+
+    rtol = 1e-12
+    """
+    relative tolerence for detecting the steady state
+    """
+
+    atol = 1e-15
+    """
+    absolute tolerence for detecting the steady state
+    """
+
+    def __init__(self, transform, noise, sensor):
+        """
+        :param transform: *shape=(ndim,ndim)*, the state transition matrix
+            (right multiplied, like: state*transform)
+        :param noise: :py:class:`mvn.Mvn`, the process noise
+        :param sensor: :py:class:`mvn.Mvn`, the sensor's bias and noise
+        """
+        transform = numpy.asarray(transform, dtype=float)
+        ndim = transform.shape[0]
+
+        assert transform.shape == (ndim, ndim), 'transform must be square'
+        assert noise.ndim == ndim, 'noise must match the transform'
+        assert sensor.ndim == ndim, 'sensor must match the transform'
+        assert numpy.isfinite(noise.var).all(), 'noise must be finite'
+
+        self.transform = transform
+        self.noise = noise
+        self.sensor = sensor
+
+        #internally everything is done with column vectors
+        self.F = transform.T
+        self.Q = numpy.array(noise.cov)
+        self.q = numpy.array(noise.mean).ravel()
+
+        #infinite sensor variances carry no information,
+        #so only the finite directions are measured, 
+        #and the missing directions of a flat sensor are measured exactly
+        inflated = sensor.inflate()
+        finite = numpy.isfinite(inflated.var)
+        self.H = numpy.array(inflated.vectors)[finite, :]
+        self.R = numpy.diag(inflated.var[finite])
+        self.bias = numpy.array(sensor.mean).ravel()
+
+    @property
+    def ndim(self):
+        """
+        the number of dimensions of the state
+        """
+        return self.F.shape[0]
+
+    def _start(self, state):
+        """
+        :param state:
+
+        unpack the initial state
+        """
+        assert state.ndim == self.ndim, 'state must match the transform'
+        assert numpy.isfinite(state.var).all(), (
+            'the covariance form needs a finite initial state'
+        )
+        return (numpy.array(state.mean).ravel(), numpy.array(state.cov))
+
+    def _observe(self, measurements):
+        """
+        :param measurements:
+
+        project the measurements, plus the sensor bias, onto the measured
+        directions
+        """
+        measurements = numpy.asarray(measurements, dtype=float)
+        assert measurements.ndim == 2, 'measurements must have shape (T,ndim)'
+        assert measurements.shape[1] == self.ndim, (
+            'measurements must have shape (T,ndim)'
+        )
+
+        return numpy.dot(measurements+self.bias, self.H.T)
+
+    def _step(self, P):
+        """
+        :param P: the current covariance
+
+        one predict/update step of the covariance, returns:
+            (predicted covariance, gain, updated covariance, cholesky factor 
+            of the innovation covariance)
+        """
+        (F, Q, H, R) = (self.F, self.Q, self.H, self.R)
+
+        predicted = numpy.dot(numpy.dot(F, P), F.T)+Q
+
+        if not H.shape[0]:
+            return (predicted, numpy.zeros([self.ndim, 0]), predicted, None)
+
+        PHt = numpy.dot(predicted, H.T)
+        S = numpy.dot(H, PHt)+R
+
+        factor = scipy.linalg.cho_factor(S)
+        gain = scipy.linalg.cho_solve(factor, PHt.T).T
+
+        IKH = numpy.eye(self.ndim)-numpy.dot(gain, H)
+        KR = numpy.dot(gain, R)
+
+        updated = (
+            numpy.dot(numpy.dot(IKH, predicted), IKH.T)+
+            numpy.dot(KR, gain.T)
+        )
+        updated = (updated+updated.T)/2
+
+        return (predicted, gain, updated, factor)
+
+    def _covPass(self, P, covs):
+        """
+        :param P: the initial covariance
+        :param covs: *shape=(T,ndim,ndim)*, buffer for the updated covariances
+
+        fill the covariance buffer, and return a list of
+        (predicted covariance, gain, innovation factor) up to the point where 
+        the filter reaches its steady state (the last entry applies to all 
+        the remaining steps)
+        """
+        count = covs.shape[0]
+        steps = []
+
+        for t in xrange(count):
+            (predicted, gain, P, factor) = self._step(P)
+
+            covs[t] = P
+
+            steady = (
+                t and
+                numpy.allclose(gain, steps[-1][1], self.rtol, self.atol) and
+                numpy.allclose(P, covs[t-1], self.rtol, self.atol)
+            )
+
+            steps.append((predicted, gain, factor))
+
+            if steady:
+                covs[t+1:] = P
+                break
+
+        return steps
+
+    @staticmethod
+    def _scan(b, power):
+        """
+        :param b: *shape=(T,ndim)*
+        :param power: *shape=(ndim,ndim)*
+
+        evaluate the linear recurrence:
+            b[t] = b[t-1]*power+b[t]
+        in place, with a Hillis-Steele scan, in log2(T) matrix multiplies
+        """
+        shift = 1
+        while shift < b.shape[0]:
+            b[shift:] += numpy.dot(b[:-shift], power)
+            power = numpy.dot(power, power)
+            shift *= 2
+
+        return b
+
+    def _meanPass(self, x, ys, steps, means):
+        """
+        :param x: the initial mean
+        :param ys: the projected measurements, from
+            :py:meth:`mvn.filters.KalmanFilter._observe`
+        :param steps: from :py:meth:`mvn.filters.KalmanFilter._covPass`
+        :param means: *shape=(T,ndim)*, buffer for the updated means
+        """
+        (F, H, q) = (self.F, self.H, self.q)
+        count = means.shape[0]
+        transient = min(len(steps)-1, count) if steps else 0
+
+        for t in xrange(transient):
+            gain = steps[t][1]
+            predicted = numpy.dot(F, x)+q
+            x = predicted+numpy.dot(gain, ys[t]-numpy.dot(H, predicted))
+            means[t] = x
+
+        if transient == count:
+            return means
+
+        #the steady state is a linear recurrence with constant coefficents:
+        #    x[t] = A*x[t-1]+b[t]
+        gain = steps[-1][1]
+        IKH = numpy.eye(self.ndim)-numpy.dot(gain, H)
+        A = numpy.dot(IKH, F)
+
+        b = means[transient:]
+        numpy.dot(ys[transient:], gain.T, out=b)
+        b += numpy.dot(IKH, q)
+        b[0] += numpy.dot(A, x)
+
+        #in row vector form
+        self._scan(b, A.T)
+
+        return means
+
+    def _logLikelihood(self, x, ys, steps, means):
+        """
+        :param x: the initial mean
+        :param ys: the projected measurements
+        :param steps: from :py:meth:`mvn.filters.KalmanFilter._covPass`
+        :param means: the filtered means
+
+        the total log-likelihood of the innovations
+        """
+        (F, H, q) = (self.F, self.H, self.q)
+        (count, nmeasured) = ys.shape
+
+        if not nmeasured:
+            return 0.0
+
+        previous = numpy.vstack([x[None, :], means[:-1]])
+        innovations = ys-numpy.dot(numpy.dot(previous, F.T)+q, H.T)
+
+        total = count*nmeasured*numpy.log(2*numpy.pi)
+        for (t, (_, _, (factor, lower))) in enumerate(steps):
+            if t == len(steps)-1:
+                rows = innovations[t:]
+            else:
+                rows = innovations[t:t+1]
+
+            #S = U.T*U or L*L.T
+            white = scipy.linalg.solve_triangular(
+                factor, rows.T, trans=0 if lower else 1, lower=lower
+            )
+            logdet = 2*numpy.log(abs(numpy.diag(factor))).sum()
+
+            total += (white**2).sum()+rows.shape[0]*logdet
+
+        return -total/2
+
+    def filter(self, measurements, state, out=None):
+        """
+        :param measurements: *shape=(T,ndim)*
+        :param state: :py:class:`mvn.Mvn` the state before the first step
+        :param out: optional (means, covs) tuple of buffers to fill, with
+            shapes *(T,ndim)* and *(T,ndim,ndim)*
+
+        run the filter over the whole block of measurements, returns
+        (means, covs) for each updated state
+        """
+        (x, P) = self._start(state)
+        ys = self._observe(measurements)
+
+        (means, covs) = self._buffers(ys.shape[0], out)
+
+        steps = self._covPass(P, covs)
+        self._meanPass(x, ys, steps, means)
+
+        return (means, covs)
+
+    def _buffers(self, count, out):
+        """
+        allocate the output buffers, if they weren't supplied
+        """
+        if out is not None:
+            return out
+
+        ndim = self.ndim
+        return (numpy.empty([count, ndim]), numpy.empty([count, ndim, ndim]))
+
+    def smooth(self, measurements, state, out=None):
+        """
+        :param measurements: *shape=(T,ndim)*
+        :param state: :py:class:`mvn.Mvn` the state before the first step
+        :param out: optional (means, covs) tuple of buffers to fill, with
+            shapes *(T,ndim)* and *(T,ndim,ndim)*
+
+        fixed interval, Rauch-Tung-Striebel, smoother. Returns 
+        (means, covs, logLikelihood), where the means and covs describe the 
+        distribution of each state given all the measurements, and 
+        logLikelihood is the total log-likelihood of the innovations.
+
+        One forward pass fills the buffers with the filtered states, then a 
+        backward pass overwrites them with the smoothed states. The only other 
+        things stored are the predicted covariances and gains up to the point 
+        where the filter reaches its steady state, after that the backward 
+        pass is also a constant coefficient recurrence, and gets the same 
+        parallel scan as the forward pass.
+
+        The last smoothed state is the last filtered state:
+
+        >>> from mvn import Mvn
+        >>>
+        >>> transform = numpy.array([[1, 0], [0.5, 1]])
+        >>> noise = Mvn(vectors=[[1, 0], [0, 1]], var=numpy.array([0.5, 1])**2)
+        >>> sensor = Mvn(vectors=[[1, 0], [0, 1]], var=[1, numpy.inf])
+        >>> state = Mvn(mean=[0, 5], vectors=numpy.eye(2))
+        >>> measurements = numpy.random.randn(100, 2)
+        >>>
+        >>> KF = KalmanFilter(transform, noise, sensor)
+        >>> (means, covs) = KF.filter(measurements, state)
+        >>> (smoothMeans, smoothCovs, logL) = KF.smooth(measurements, state)
+        >>> assert numpy.allclose(smoothMeans[-1], means[-1])
+        >>> assert numpy.allclose(smoothCovs[-1], covs[-1])
+
+        and the smoothed states are never less certain than the filtered ones
+
+        >>> assert (smoothCovs.trace(axis1=1, axis2=2) <= 
+        ...     covs.trace(axis1=1, axis2=2)+1e-12).all()
+        """
+        (x, P) = self._start(state)
+        ys = self._observe(measurements)
+
+        (means, covs) = self._buffers(ys.shape[0], out)
+
+        steps = self._covPass(P, covs)
+        self._meanPass(x, ys, steps, means)
+
+        logLikelihood = self._logLikelihood(x, ys, steps, means)
+
+        self._backwardPass(steps, means, covs)
+
+        return (means, covs, logLikelihood)
+
+    def _smootherGain(self, P, predicted):
+        """
+        :param P: the filtered covariance at t
+        :param predicted: the predicted covariance at t+1
+        """
+        FP = numpy.dot(self.F, P)
+        return scipy.linalg.solve(predicted, FP, sym_pos=True).T
+
+    def _backwardPass(self, steps, means, covs):
+        """
+        :param steps: from :py:meth:`mvn.filters.KalmanFilter._covPass`
+        :param means: the filtered means, overwritten with the smoothed means
+        :param covs: the filtered covariances, overwritten with the smoothed 
+            covariances
+        """
+        (F, q) = (self.F, self.q)
+        count = means.shape[0]
+        
+        if count < 2:
+            return
+
+        #from here on, the filtered covariance and the next predicted 
+        #covariance, and so the smoother gain, are constant
+        steady = min(len(steps)-1, count-1)
+        
+        (predicted, _, _) = steps[-1]
+        gain = self._smootherGain(covs[-1], predicted)
+
+        #covariance, from the end, until it stops changing
+        smoothed = covs[-1]
+        t = count-2
+        while t >= steady:
+            smoothed = covs[t]+numpy.dot(
+                numpy.dot(gain, smoothed-predicted), gain.T
+            )
+            if numpy.allclose(smoothed, covs[t+1], self.rtol, self.atol):
+                covs[steady:t+1] = smoothed
+                break
+            covs[t] = smoothed
+            t -= 1
+
+        #means, xs[t] = G*xs[t+1]+(I-G*F)*x[t]-G*q, as a reversed scan
+        if steady < count-1:
+            b = means[steady:][::-1]
+            b[1:] = (
+                numpy.dot(b[1:], (numpy.eye(self.ndim)-numpy.dot(gain, F)).T)-
+                numpy.dot(gain, q)
+            )
+            self._scan(b, gain.T)
+        
+        #the transient part
+        for t in xrange(steady-1, -1, -1):
+            (predicted, _, _) = steps[t+1]
+            gain = self._smootherGain(covs[t], predicted)
+
+            prediction = numpy.dot(F, means[t])+q
+            means[t] += numpy.dot(gain, means[t+1]-prediction)
+            covs[t] += numpy.dot(
+                numpy.dot(gain, covs[t+1]-predicted), gain.T
+            )
+
+    def run(self, measurements, state):
+        """
+        :param measurements: *shape=(T,ndim)*
+        :param state: :py:class:`mvn.Mvn` the state before the first step
+
+        like :py:meth:`mvn.filters.KalmanFilter.filter` but returns a list
+        of Mvns, with the same type as the state
+        """
+        (means, covs) = self.filter(measurements, state)
+        return [
+            type(state).fromCov(cov, mean=mean)
+            for (mean, cov) in zip(means, covs)
+        ]
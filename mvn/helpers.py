@@ -309,10 +309,64 @@ def parallel(*items):
     to be exactly what we need for kalman sensor fusion. 
     
     >>> assert parallel(1.0,2.0) == 1/(1/1.0+1/2.0)
+
+    things with a 'fuse' class method, like :py:meth:`mvn.Mvn.fuse`, use 
+    it instead of the pairwise inversions
     """
+    fuse = getattr(type(items[0]), 'fuse', None)
+    if fuse is not None:
+        return fuse(items)
+
     inverted = [item**(-1) for item in items]
     return sum(inverted[1:], inverted[0])**(-1)
 
+def pseudoInverse(val):
+    """
+    :param val: eigenvalues, of a symmetric matrix
+
+    returns (inverse, zero), where zero marks the values that are zero 
+    relative to the largest, and inverse is 1/val, with zeros there.
+
+    >>> (inverse, zero) = pseudoInverse(numpy.array([2.0, 1e-20, -4.0]))
+    >>> assert (inverse == [0.5, 0, -0.25]).all()
+    >>> assert (zero == [False, True, False]).all()
+    """
+    scale = abs(val).max() if val.size else 0
+
+    if not scale:
+        return (numpy.zeros_like(val), numpy.ones(val.shape, bool))
+
+    zero = approx(val/scale)
+    inverse = numpy.where(zero, 0, 1.0/numpy.where(zero, 1, val))
+
+    return (inverse, zero)
+
+def logSumExp(values, axis=-1):
+    """
+    :param values: an array of logs
+    :param axis: the axis to sum along
+
+    returns log(exp(values).sum(axis)), without the exponentials under or 
+    overflowing: the largest value along the axis is factored out first. 
+    If all the values along the axis are -inf, so is the result.
+
+    >>> values = numpy.log(numpy.random.rand(4, 3))
+    >>> assert approx(
+    ...     logSumExp(values), numpy.log(numpy.exp(values).sum(-1))
+    ... ).all()
+    >>> assert approx(logSumExp(numpy.array([-1000.0, -1000.0])), 
+    ...     numpy.log(2)-1000)
+    >>> assert logSumExp(numpy.array([-numpy.inf, -numpy.inf])) == -numpy.inf
+    """
+    values = numpy.asarray(values)
+
+    top = values.max(axis)
+    top = numpy.where(numpy.isfinite(top), top, 0)
+    shifted = numpy.exp(values-numpy.expand_dims(top, axis))
+
+    with numpy.errstate(divide='ignore'):
+        return numpy.log(shifted.sum(axis))+top
+
 def approx(self, other = 0.0, rtol=1e-5, atol=1e-8):
     """
     element-wise version of :py:func:`numpy.allclose`
@@ -329,7 +383,7 @@ def approx(self, other = 0.0, rtol=1e-5, atol=1e-8):
     delta = numpy.abs(self-other)
         
     if not delta.size:
-        return numpy.empty(delta.shape, delta.dtype)
+        return numpy.zeros(delta.shape, bool)
         
     infs = numpy.multiply(~numpy.isfinite(self), ~numpy.isfinite(other))
     
@@ -0,0 +1,526 @@
+#! /usr/bin/env python
+"""
+*********************
+Information-Form Mvn
+*********************
+
+An :py:class:`mvn.Mvn` that can be stored as a precision matrix and an
+information vector, instead of a mean and an eigen-decomposition:
+
+    | **precision** : *shape=(ndim,ndim)*, the inverse of the covariance
+    | **info** : *shape=(1,ndim)*, mean*precision
+
+In that form the blend (&) is two additions, so fusing many measurements
+costs one decomposition, when the result is read, instead of three powers
+per blend:
+
+    >>> from mvn import Mvn
+    >>> sensors = [InfoMvn.fromMvn(Mvn.rand(3)) for n in range(10)]
+    >>>
+    >>> fused = reduce(lambda a, b: a & b, sensors)
+    >>> assert fused._var is None
+    >>> assert fused == reduce(lambda a, b: a & b, map(Mvn.fromMvn, sensors))
+
+Directions with zero information, infinite variance, are exact: they are
+just zeros in the precision matrix. Directions with zero variance have no
+finite precision, so anything flat falls back to the :py:class:`mvn.Mvn`
+implementation.
+"""
+
+import numpy
+
+import mvn.helpers as helpers
+
+from mvn import Mvn
+from mvn.matrix import Matrix
+
+
+class InfoMvn(Mvn):
+    """
+    .. inheritance-diagram:: mvn.information.InfoMvn
+
+    A multivariate normal distribution, that can be stored in information
+    form, a precision matrix and an information vector.
+
+    The constructor takes the same arguments as :py:class:`mvn.Mvn`, and
+    the object starts in the moment form:
+
+    >>> I = InfoMvn(vectors=[[1,0],[1,1]], var=[1,2], mean=[1,2])
+    >>> assert I == Mvn(vectors=[[1,0],[1,1]], var=[1,2], mean=[1,2])
+    >>> assert I.precision*I.cov == Matrix.eye
+
+    Objects in the information form only calculate the mean and
+    eigen-decomposition the first time they're read:
+
+    >>> J = InfoMvn.fromInfo(I.precision, I.info)
+    >>> assert J._var is None
+    >>> assert J == I
+    >>> assert J._var is not None
+    """
+
+    #objects built by :py:meth:`mvn.Mvn._fromParts` start in the moment form
+    _precision = None
+    _info = None
+    _mean = None
+
+    @classmethod
+    def _fromParts(cls, mean, var, vectors, canonical=False, **kwargs):
+        """
+        see :py:meth:`mvn.Mvn._fromParts`, the mean is stored behind a
+        property here
+        """
+        result = cls.__new__(cls)
+
+        state = result.__dict__
+        state['_mean'] = mean
+        state['_var'] = var
+        state['_vectors'] = vectors
+        state['_cache'] = {}
+
+        if not canonical:
+            result.cannonize(**kwargs)
+
+        return result
+
+    @classmethod
+    def _fromInfo(cls, precision, info):
+        """
+        :param precision: *shape=(ndim,ndim)* :py:class:`mvn.matrix.Matrix`
+        :param info: *shape=(1,ndim)* :py:class:`mvn.matrix.Matrix`
+
+        the trusted version of :py:meth:`mvn.information.InfoMvn.fromInfo`,
+        the arrays are used as they are, with no checks and no copies.
+        """
+        result = cls.__new__(cls)
+        result._setInfo(precision, info)
+
+        return result
+
+    @classmethod
+    def fromInfo(cls, precision, info=Matrix.zeros):
+        """
+        :param precision: *shape=(ndim,ndim)*, a symmetric matrix, the inverse
+            of the covariance
+        :param info: *shape=(1,ndim)*, the information vector, mean*precision
+
+        >>> I = InfoMvn.fromInfo(numpy.diag([1.0, 4.0]), [2, 2])
+        >>> assert I == Mvn(var=[1, 0.25], mean=[2, 0.5])
+
+        zeros in the precision are directions with no information:
+
+        >>> I = InfoMvn.fromInfo(numpy.diag([1.0, 0.0]), [2, 0])
+        >>> assert I == Mvn(var=[1, numpy.inf], mean=[2, 0])
+        """
+        precision = Matrix(precision)
+        ndim = precision.shape[0]
+
+        assert precision.shape == (ndim, ndim), 'precision must be square'
+
+        if callable(info):
+            info = info([1, ndim])
+
+        info = Matrix(numpy.array(info).reshape([1, -1]))
+
+        assert info.shape == (1, ndim), 'info must have ndim elements'
+
+        return cls._fromInfo(precision, info)
+
+    @classmethod
+    def fromMvn(cls, other, mean=None):
+        """
+        :param other: an :py:class:`mvn.Mvn`
+        :param mean: ignored, for compatibility with :py:meth:`mvn.Mvn.fromMvn`
+
+        convert an :py:class:`mvn.Mvn` to a
+        :py:class:`mvn.information.InfoMvn`, the information form is
+        calculated on first use
+
+        >>> I = InfoMvn.fromMvn(A)
+        >>> assert I == A
+        >>> assert isinstance(I, InfoMvn)
+        """
+        if isinstance(other, InfoMvn):
+            return other.copy(deep=True)
+
+        return cls._fromParts(
+            mean=other.mean.copy(),
+            var=other.var.copy(),
+            vectors=other.vectors.copy(),
+            canonical=True,
+        )
+
+    def toMvn(self):
+        """
+        convert back to a plain :py:class:`mvn.Mvn`
+
+        >>> I = InfoMvn.fromMvn(A)
+        >>> assert type(I.toMvn()) is Mvn
+        >>> assert I.toMvn() == A
+        """
+        return Mvn._fromParts(
+            mean=self.mean.copy(),
+            var=self.var.copy(),
+            vectors=self.vectors.copy(),
+            canonical=not self._unsquared(),
+        )
+
+    ############ information form and lazy moments
+    def _setInfo(self, precision, info):
+        """
+        switch to the information form
+        """
+        self._precision = precision
+        self._info = info
+        self._mean = None
+        self._var = None
+        self._vectors = None
+        self._cache = {}
+
+    def _decompose(self):
+        """
+        calculate the mean and eigen-decomposition from the information
+        form, with one eigen-decomposition of the precision. The precision
+        is kept in the cache.
+        """
+        precision = self._precision
+        info = numpy.asarray(self._info)
+
+        (val, vec) = numpy.linalg.eigh(numpy.asarray(precision))
+        (inverse, zero) = helpers.pseudoInverse(val)
+
+        var = numpy.where(zero, numpy.inf, inverse)
+        mean = numpy.dot(numpy.dot(info, vec)*inverse, vec.T)
+
+        keep = ~self.approx(var)
+
+        self._precision = None
+        self._info = None
+        self._mean = Matrix(mean, copy=False)
+        self._var = var[keep]
+        self._vectors = Matrix(vec.T[keep, :])
+        self._cache = {'precision': precision}
+
+    def _raw(self):
+        """
+        see :py:meth:`mvn.Mvn._raw`
+        """
+        if self._precision is not None:
+            self._decompose()
+
+        return Mvn._raw(self)
+
+    def _getPrecision(self):
+        'get the precision matrix, or None if there is no finite precision'
+        if self._precision is not None:
+            return self._precision
+
+        return self._memo('precision', _precision)
+
+    precision = property(
+        fget=_getPrecision,
+        doc="""
+            the inverse of the covariance matrix, or None if the object is
+            flat
+
+            >>> I = InfoMvn.fromMvn(A)
+            >>> if not A.flat:
+            ...     assert I.precision == A.cov**-1
+            >>> assert InfoMvn.fromMvn(A & ~A).precision == Matrix.zeros
+            >>> assert InfoMvn.fromMvn(Mvn.zeros(3)).precision is None
+        """
+    )
+
+    def _getInfo(self):
+        'get the information vector, or None if there is no finite precision'
+        if self._precision is not None:
+            return self._info
+
+        precision = self.precision
+        if precision is None:
+            return None
+
+        return self.mean*precision
+
+    info = property(
+        fget=_getInfo,
+        doc="""
+            the information vector, mean*precision, or None if the object is
+            flat
+
+            >>> I = InfoMvn.fromMvn(A)
+            >>> if not A.flat:
+            ...     assert I.info == A.mean*A.cov**-1
+        """
+    )
+
+    def _readMean(self):
+        'get the mean'
+        if self._precision is not None:
+            self._decompose()
+        return self._mean
+
+    def _writeMean(self, mean):
+        'set the mean'
+        if self._precision is not None:
+            self._decompose()
+        self._mean = mean
+
+    mean = property(
+        fget=_readMean,
+        fset=_writeMean,
+        doc="""
+            the mean, calculated on first use
+
+            >>> I = InfoMvn.fromInfo(numpy.eye(2), [1, 2])
+            >>> assert I.mean == [1, 2]
+        """
+    )
+
+    def _getVar(self):
+        'get the variances'
+        if self._precision is not None:
+            self._decompose()
+        return Mvn._getVar(self)
+
+    def _setVar(self, var):
+        'set the variances'
+        if self._precision is not None:
+            self._decompose()
+        Mvn._setVar(self, var)
+
+    var = property(
+        fget=_getVar,
+        fset=_setVar,
+        doc="""
+            the variance asociated with each vector, calculated on first use
+
+            >>> I = InfoMvn.fromMvn(A)
+            >>> assert Matrix(sorted(I.var)) == sorted(A.var)
+        """
+    )
+
+    def _getVectors(self):
+        'get the vectors'
+        if self._precision is not None:
+            self._decompose()
+        return Mvn._getVectors(self)
+
+    def _setVectors(self, vectors):
+        'set the vectors'
+        if self._precision is not None:
+            self._decompose()
+        Mvn._setVectors(self, vectors)
+
+    vectors = property(
+        fget=_getVectors,
+        fset=_setVectors,
+        doc="""
+            the unit eigen-vectors, as rows, calculated on first use
+
+            >>> I = InfoMvn.fromMvn(A)
+            >>> assert I.vectors*I.vectors.H == Matrix.eye
+        """
+    )
+
+    ############ operators
+    def __and__(self, other):
+        """
+        :param other:
+
+        self & other
+
+        when neither side is flat the blend is the sum of the precisions and
+        of the information vectors:
+
+        >>> I = InfoMvn.fromMvn(A)
+        >>> J = InfoMvn.fromMvn(C)
+        >>> assert I & J == A & C
+        >>> assert (I & J)._var is None
+        >>> assert (I & J).precision == I.precision+J.precision
+
+        the other side can be a plain :py:class:`mvn.Mvn`, on either side:
+
+        >>> assert I & C == A & C
+        >>> assert C & I == C & A
+        >>> assert isinstance(C & I, InfoMvn)
+
+        otherwise it falls back to the :py:class:`mvn.Mvn` implementation:
+
+        >>> assert I & B == A & B
+        >>> L1 = InfoMvn(mean=[1,0], vectors=[0,1], var=numpy.inf)
+        >>> L2 = InfoMvn(mean=[0,1], vectors=[1,0], var=numpy.inf)
+        >>> assert (L1&L2).mean == [1,1]
+        >>> assert (L1&L2).var.size == 0
+        """
+        (precision, info) = _infoParts(self)
+        (otherPrecision, otherInfo) = _infoParts(other)
+
+        if precision is None or otherPrecision is None:
+            return Mvn.__and__(self, other)
+
+        return type(self)._fromInfo(precision+otherPrecision, info+otherInfo)
+
+    def __rand__(self, other):
+        """
+        :param other:
+
+        other & self, defined here so that python calls it before
+        :py:meth:`mvn.Mvn.__and__` when the left side is a plain
+        :py:class:`mvn.Mvn`
+        """
+        return self & other
+
+    def given(self, dims, value=None):
+        """
+        :param dims:
+        :param value:
+
+        see :py:meth:`mvn.Mvn.given`
+
+        A value with a full rank variance only adds information on the given
+        dimensions:
+
+        >>> I = InfoMvn.fromMvn(C)
+        >>> x = Mvn(mean=[1, 2], var=[0.5, 2])
+        >>> assert I.given([0, 1], x) == C.given([0, 1], x)
+        >>> assert I.given([0, 1], x)._var is None
+
+        An exact value conditions the remaining block, with one
+        decomposition of its precision:
+
+        >>> assert I.given(0, 1) == C.given(0, 1)
+        >>> assert I.given([1, 2], [[3, 4]]) == C.given([1, 2], [[3, 4]])
+        """
+        precision = self.precision
+
+        if value is None or precision is None:
+            return Mvn.given(self, dims, value)
+
+        value = type(self).fromData(value)
+
+        fixed = helpers.binindex(dims, self.ndim)
+        free = ~fixed
+
+        (valuePrecision, valueInfo) = _infoParts(value)
+
+        if valuePrecision is not None:
+            precision = numpy.array(precision)
+            info = numpy.array(self.info)
+
+            precision[numpy.ix_(fixed, fixed)] += valuePrecision
+            info[:, fixed] += valueInfo
+
+            return type(self)._fromInfo(
+                Matrix(precision, copy=False),
+                Matrix(info, copy=False),
+            )
+
+        if value.var.size or not free.any():
+            return Mvn.given(self, dims, value)
+
+        precision = numpy.asarray(precision)
+        info = numpy.asarray(self.info)
+        point = numpy.asarray(value.mean)
+
+        conditional = type(self)._fromInfo(
+            Matrix(precision[numpy.ix_(free, free)]),
+            Matrix(
+                info[:, free] -
+                numpy.dot(point, precision[numpy.ix_(fixed, free)])
+            ),
+        )
+
+        mean = Matrix.zeros([1, self.ndim])
+        mean[:, fixed] = point
+        mean[:, free] = conditional.mean
+
+        vectors = Matrix.zeros([conditional.rank, self.ndim])
+        vectors[:, free] = conditional.vectors
+
+        return type(self)._fromParts(
+            mean=mean,
+            var=conditional.var.copy(),
+            vectors=vectors,
+            canonical=True,
+        )
+
+    def marginal(self, index):
+        """
+        :param index:
+
+        see :py:meth:`mvn.Mvn.marginal`, the other dimensions are removed
+        with a Schur complement of the precision, and get zero information:
+
+        >>> I = InfoMvn.fromMvn(C)
+        >>> assert I.marginal(0) == C.marginal(0)
+        >>> assert I.marginal([0, 2]) == C.marginal([0, 2])
+        >>> assert I.marginal([0, 2])._var is None
+        >>> assert I.marginal(slice(None)) == C
+        """
+        precision = self.precision
+
+        if precision is None:
+            return Mvn.marginal(self, index)
+
+        keep = helpers.binindex(index, self.ndim)
+        drop = ~keep
+
+        if not drop.any():
+            return self.copy(deep=True)
+
+        precision = numpy.asarray(precision)
+        info = numpy.asarray(self.info)
+
+        (val, vec) = numpy.linalg.eigh(precision[numpy.ix_(drop, drop)])
+        (inverse, _) = helpers.pseudoInverse(val)
+
+        cross = precision[numpy.ix_(drop, keep)]
+        gain = numpy.dot(vec*inverse, numpy.dot(vec.T, cross))
+
+        newPrecision = numpy.zeros_like(precision)
+        newPrecision[numpy.ix_(keep, keep)] = (
+            precision[numpy.ix_(keep, keep)]-numpy.dot(cross.T, gain)
+        )
+
+        newInfo = numpy.zeros_like(info)
+        newInfo[:, keep] = info[:, keep]-numpy.dot(info[:, drop], gain)
+
+        return type(self)._fromInfo(
+            Matrix(newPrecision, copy=False),
+            Matrix(newInfo, copy=False),
+        )
+
+
+def _precision(mvn):
+    """
+    :param mvn: an :py:class:`mvn.Mvn`
+
+    calculate the precision matrix from the eigen-decomposition, or return
+    None if the object is flat. Infinite variances become zeros.
+    """
+    var = mvn.var
+    vectors = numpy.asarray(mvn.vectors)
+
+    if mvn.flat or mvn.approx(var).any():
+        return None
+
+    return numpy.dot(vectors.conj().T/var, vectors).view(Matrix)
+
+
+def _infoParts(mvn):
+    """
+    :param mvn: an :py:class:`mvn.Mvn`
+
+    get the (precision, info) of any :py:class:`mvn.Mvn`, or (None, None) if
+    it is flat. The precision is cached on the object.
+    """
+    if isinstance(mvn, InfoMvn):
+        precision = mvn.precision
+        return (None, None) if precision is None else (precision, mvn.info)
+
+    precision = mvn._memo('precision', _precision)
+
+    if precision is None:
+        return (None, None)
+
+    return (precision, mvn.mean*precision)
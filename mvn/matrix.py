@@ -3,6 +3,16 @@
 ***************************
 Modified Numpy Matrix Class
 ***************************
+
+:py:class:`mvn.matrix.Matrix` is a thin facade over plain numpy arrays. The 
+hot paths in :py:mod:`mvn` and :py:mod:`mvn.square` work on ndarrays, 
+with :py:func:`numpy.dot`, and only wrap their results, as views, on the 
+way out:
+
+    >>> data = numpy.random.randn(3,4)
+    >>> M = data.view(Matrix)
+    >>> assert numpy.may_share_memory(M, data)
+    >>> assert M.H*M == numpy.dot(data.T, data)
 """
 
 #todo: update 'close' to match numpy's implementation for all_close  
@@ -52,11 +62,26 @@ class Matrix(numpy.matrix):
 
     def __new__(cls, data, dtype=None, copy=True):
         """
-        !!
-        """
-        self=numpy.matrix(data, dtype, copy)
-        self.__class__=cls
-        return self
+        like :py:class:`numpy.matrix`, but built as a view of an ndarray, 
+        without going through the (deprecated) matrix constructor
+
+        >>> data = numpy.arange(3.0)
+        >>> assert Matrix(data).shape == (1,3)
+        >>> assert not numpy.may_share_memory(Matrix(data), data)
+        >>> assert numpy.may_share_memory(Matrix(data, copy=False), data)
+        >>> assert Matrix(5).shape == (1,1)
+        """
+        if isinstance(data, cls) and not copy and (
+            dtype is None or numpy.dtype(dtype) == data.dtype
+        ):
+            return data
+
+        array = numpy.array(data, dtype, copy=copy, subok=False, ndmin=2)
+
+        if array.ndim > 2:
+            raise ValueError("matrix must be 2-dimensional")
+
+        return array.view(cls)
 
     @expandCallable
     def __eq__(self, other):
@@ -4,11 +4,12 @@
 Mixture Class
 *************
 """
-import pylab
 import numpy
 import collections
 import itertools
 
+import mvn.helpers as helpers
+
 def sample(item, count):
     if hasattr(item, 'sample'):
         return item.sample(count)
@@ -61,36 +62,174 @@ class Mixture(object):
                 item.plot(ax,alpha = alpha,**kwargs)
             else:
                 if ax is None:
+                    import pylab
                     ax = pylab.gca()
                 ax.plot(item, alpha = alpha)
             
-    def fit(self, data, weights = None):
-        
-        dataWeights = numpy.array([
-            item.density(data) 
-            for item in self.items
-        ]).T
-        
-        if weights is not None:           
-            dataWeights = dataWeights*weights[:, None]
+    def logpdfs(self, data):
+        """
+        the log-density of each item at each location, *shape=(N,K)*, with 
+        all the items scored in one pass over the data, see 
+        :py:meth:`mvn.Mvn.logpdfMany`
+        """
+        return type(self.items[0]).logpdfMany(self.items, data)
 
-        itemTotals = dataWeights.sum(0)
-        newWeights = itemTotals/itemTotals.sum()
-        
-        dataTotals = dataWeights.sum(1)
+    def logpdf(self, data):
+        """
+        the log-density of the mixture at each location, *shape=(N,)*, 
+        combined across the items with a log-sum-exp, so it stays finite 
+        where the items' densities underflow
 
-        dataMembership = dataWeights/dataTotals[:, None]   
-        
-        newItems = [
-            item.fit(
-                data = data,
-                weights = dataMembership[:, n],
-                bias = True
-            )
-            for n, item in enumerate(self.items)
-        ]          
-        
-        return Mixture(newItems, newWeights)
+        >>> from mvn import Mvn
+        >>> mixture = Mixture([Mvn.rand(3), Mvn.rand(3)], [0.3, 0.7])
+        >>> data = mixture.sample(10)
+        >>> assert numpy.allclose(
+        ...     numpy.exp(mixture.logpdf(data)),
+        ...     0.3*mixture.items[0].density(data)+
+        ...     0.7*mixture.items[1].density(data)
+        ... )
+        """
+        scores = self.logpdfs(data)
+        with numpy.errstate(divide='ignore'):
+            scores += numpy.log(self.weights)
+
+        return helpers.logSumExp(scores, axis=1)
+
+    def density(self, data):
+        """
+        the probability density of the mixture at each location, see 
+        :py:meth:`mvn.mixture.Mixture.logpdf`
+        """
+        return numpy.exp(self.logpdf(data))
+
+    def logLikelihood(self, data, weights=None):
+        """
+        the (weighted) sum of the log-density of the samples, see 
+        :py:meth:`mvn.mixture.Mixture.logpdf`
+        """
+        scores = self.logpdf(data)
+
+        if weights is None:
+            return scores.sum()
+
+        return numpy.dot(numpy.ravel(weights), scores)
+
+    def fit(
+        self, data, weights=None, tol=1e-6, maxIter=100, reg=1e-6, 
+        batchSize=None, decay=0.6
+    ):
+        """
+        :param data: *shape=(N,ndim)*, each row is a sample
+        :param weights: *shape=(N,)*, optional weight for each sample
+        :param tol: stop when the mean log-likelihood, per unit of weight, 
+            changes by less than this between iterations
+        :param maxIter: the maximum number of iterations (passes over the 
+            data)
+        :param reg: added to the diagonal of each covariance, so a component 
+            can't collapse onto a few points
+        :param batchSize: if given, run mini-batch (stepwise) EM, each 
+            iteration is a pass over the shuffled data, in batches of this 
+            size, with the sufficient statistics updated after each batch
+        :param decay: for mini-batch EM, the step size for the t'th batch is 
+            (t+2)**-decay, it should be in (0.5, 1]
+
+        fit the mixture to the data with the expectation-maximization 
+        algorithm, starting from the current items and weights, and return 
+        a new Mixture.
+
+        The responsibilities are calculated in log space, with 
+        :py:meth:`mvn.Mvn.logpdfMany` and a log-sum-exp, so they don't 
+        underflow in high dimensions, and the M-step builds each item from 
+        its weighted count, sum and sum of squares, each item's sum of 
+        squares is one *(ndim,N)* by *(N,ndim)* matrix product.
+
+        The result gets two extra attributes: **history**, the mean 
+        log-likelihood at each iteration, and **converged**.
+
+        >>> from mvn import Mvn
+        >>> source = Mixture([Mvn.eye(2, mean=[-5, 0]), Mvn.eye(2, mean=[5, 0])])
+        >>> data = source.sample(500)
+        >>> start = Mixture([Mvn.eye(2, mean=[-1, 1]), Mvn.eye(2, mean=[1, 1])])
+        >>> fitted = start.fit(data)
+        >>> assert fitted.converged
+        >>> assert numpy.all(numpy.diff(fitted.history) > -1e-9)
+        >>> means = sorted(item.mean[0, 0] for item in fitted.items)
+        >>> assert abs(means[0]+5) < 0.5 and abs(means[1]-5) < 0.5
+
+        >>> online = start.fit(data, batchSize=50, maxIter=20)
+        >>> means = sorted(item.mean[0, 0] for item in online.items)
+        >>> assert abs(means[0]+5) < 0.5 and abs(means[1]-5) < 0.5
+        """
+        data = numpy.asarray(data, dtype=float)
+        if data.ndim == 1:
+            data = data[:, None]
+
+        if weights is None:
+            weights = numpy.ones(data.shape[0])
+        else:
+            weights = numpy.asarray(weights, dtype=float).ravel()
+
+        assert weights.size == data.shape[0], (
+            'there must be one weight per sample'
+        )
+
+        #the statistics are taken about a fixed point near the data, so the 
+        #second moments don't lose precision to a large mean
+        shift = numpy.dot(weights, data)/weights.sum()
+
+        current = self
+        history = []
+        converged = False
+        step = 0
+        running = None
+
+        for iteration in xrange(maxIter):
+            if batchSize is None:
+                (stats, logLikelihood) = _expectations(
+                    current, data, weights, shift
+                )
+            else:
+                order = numpy.random.permutation(data.shape[0])
+                logLikelihood = 0.0
+                for start in xrange(0, order.size, batchSize):
+                    batch = order[start:start+batchSize]
+                    (batchStats, batchLikelihood) = _expectations(
+                        current, data[batch], weights[batch], shift
+                    )
+                    logLikelihood += batchLikelihood
+
+                    total = weights[batch].sum()
+                    if not total:
+                        continue
+
+                    batchStats = [stat/total for stat in batchStats]
+                    if running is None:
+                        running = batchStats
+                    else:
+                        rate = (step+2.0)**-decay
+                        running = [
+                            (1-rate)*old+rate*new 
+                            for (old, new) in zip(running, batchStats)
+                        ]
+
+                    step += 1
+                    current = _maximize(current, running, shift, reg)
+
+                stats = running
+
+            history.append(logLikelihood/weights.sum())
+
+            if batchSize is None:
+                current = _maximize(current, stats, shift, reg)
+
+            if len(history) > 1 and abs(history[-1]-history[-2]) < tol:
+                converged = True
+                break
+
+        current.history = history
+        current.converged = converged
+
+        return current
         
     def __getitem__(self, index):
         return Mixture(
@@ -104,30 +243,75 @@ class Mixture(object):
         
         
         
-    def fit2(self, data, weights = None):
-        dataWeights = numpy.array([
-            item.density(data) 
-            for item in self.items
-        ]).T
-        
-        if weights is None:           
-            dataWeights = dataWeights*weights[:, None]
+    def fit2(self, data, weights=None, **kwargs):
+        """
+        like :py:meth:`mvn.mixture.Mixture.fit`, but updates this mixture in 
+        place, and returns it
+        """
+        fitted = self.fit(data, weights, **kwargs)
+
+        self.items = fitted.items
+        self.weights = fitted.weights
+        self.history = fitted.history
+        self.converged = fitted.converged
+
+        return self
+
+
+def _expectations(mixture, data, weights, shift):
+    """
+    the E-step: returns ((counts, sums, squares), logLikelihood), the 
+    weighted sufficient statistics of each item, *shape=(K,)*, 
+    *(K,ndim)*, and *(K,ndim,ndim)*, about the shift, and the total 
+    log-likelihood of the data
+    """
+    logR = mixture.logpdfs(data)
+    with numpy.errstate(divide='ignore'):
+        logR += numpy.log(mixture.weights)
+
+    logTotals = helpers.logSumExp(logR, axis=1)
+    logR -= logTotals[:, None]
+
+    responsibility = numpy.exp(logR, out=logR)
+    responsibility *= weights[:, None]
+
+    deltas = data-shift
+
+    counts = responsibility.sum(0)
+    sums = numpy.dot(responsibility.T, deltas)
+    squares = numpy.array([
+        numpy.dot((deltas*column[:, None]).T, deltas)
+        for column in responsibility.T
+    ])
+
+    logLikelihood = numpy.dot(weights, logTotals)
+
+    return ((counts, sums, squares), logLikelihood)
+
+
+def _maximize(mixture, stats, shift, reg):
+    """
+    the M-step: build a new mixture from the sufficient statistics, an item 
+    with no weight is kept as it is
+    """
+    (counts, sums, squares) = stats
+
+    ndim = shift.size
+    items = []
+    for (item, count, total, square) in zip(
+        mixture.items, counts, sums, squares
+    ):
+        if count <= 0:
+            items.append(item)
+            continue
+
+        mean = total/count
+        cov = square/count-numpy.outer(mean, mean)+reg*numpy.eye(ndim)
+
+        items.append(type(item).fromCov(cov, mean=mean+shift))
+
+    return Mixture(items, counts)
 
-        itemTotals = dataWeights.sum(0)
-        self.weights = itemTotals/itemTotals.sum()
-        
-        dataTotals = dataWeights.sum(1)
-
-        dataMembership = dataWeights/dataTotals[:, None]        
-    
-        self.items = [
-            item.fit(
-                data = data,
-                weights = dataMembership,
-                bias = True
-            )
-            for n, item in enumerate(self.items)
-        ]
         
 if __name__ == '__main__':
     M = Mixture([1, 2, 'asd', None], [0.2, 0.3, 0.5, 0.25])
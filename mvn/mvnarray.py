@@ -0,0 +1,562 @@
+#! /usr/bin/env python
+"""
+***************
+Mvn Array Class
+***************
+
+A stack of K :py:class:`mvn.Mvn` objects, with the same number of dimensions,
+stored in a few contiguous arrays instead of K python objects.
+
+    | **mean** : *shape=(K,ndim)*
+    | **var** : *shape=(K,rank)*
+    | **vectors** : *shape=(K,rank,ndim)*
+
+Members with fewer vectors than the widest member are padded with zero
+variance rows, which contribute nothing to the covariance.
+
+The operators work on all K members at once, so the python overhead is paid
+once per operation instead of once per member:
+
+    >>> from mvn import Mvn
+    >>> mvns = [Mvn.rand(3) for n in range(4)]
+    >>> others = [Mvn.rand(3) for n in range(4)]
+    >>> M = Matrix.randn([3,2])
+    >>>
+    >>> stack = MvnArray.fromMvns(mvns)
+    >>> otherStack = MvnArray.fromMvns(others)
+    >>> assert len(stack) == 4
+    >>> assert all(s == m for s,m in zip(stack,mvns))
+    >>>
+    >>> assert all(
+    ...     s == a & b for s,a,b in zip(stack & otherStack, mvns, others)
+    ... )
+    >>> assert all(
+    ...     s == a + b for s,a,b in zip(stack + otherStack, mvns, others)
+    ... )
+    >>> assert all(s == a*M for s,a in zip(stack*M, mvns))
+    >>> assert all(s == a*2.5 for s,a in zip(stack*2.5, mvns))
+"""
+
+import numpy
+
+import mvn
+import mvn.helpers as helpers
+from mvn.matrix import Matrix
+
+
+class MvnArray(object):
+    """
+    .. inheritance-diagram:: mvn.mvnarray.MvnArray
+
+    a stack of K multivariate normal distributions.
+
+    Attributes:
+        | **mean** : *shape=(K,ndim)*, the mean of each member
+        | **var** :  *shape=(K,rank)*, the variance asociated with each vector
+        | **vectors** : *shape=(K,rank,ndim)*, the vectors of each member, as rows
+    """
+
+    rtol = 1e-5
+    """
+    relative tolerence
+
+    see :py:func:`mvn.helpers.approx`
+    """
+
+    atol = 1e-8
+    """
+    absolute tolerence
+
+    see :py:func:`mvn.helpers.approx`
+    """
+
+    ############## Creation
+    def __init__(self, vectors, var, mean):
+        """
+        :param vectors: *shape=(K,rank,ndim)*
+        :param var: *shape=(K,rank)*
+        :param mean: *shape=(K,ndim)*
+
+        the arrays are used directly, no copies are made, and no attempt is
+        made to put the members into a canonical form.
+        """
+        self.vectors = numpy.asarray(vectors)
+        self.var = numpy.asarray(var)
+        self.mean = numpy.asarray(mean)
+
+        assert self.vectors.ndim == 3, 'vectors must have shape (K,rank,ndim)'
+        assert self.var.shape == self.vectors.shape[:2], 'var must have shape (K,rank)'
+        assert self.mean.shape == (
+            self.vectors.shape[0],self.vectors.shape[2]
+        ), 'mean must have shape (K,ndim)'
+
+    @classmethod
+    def fromMvns(cls, mvns):
+        """
+        :param mvns: a sequence of :py:class:`mvn.Mvn`, all with the same ndim
+
+        pack the mvns into a single array, padding out the members with fewer
+        vectors with zero variance rows
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand([2,3]), Mvn.rand(3)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> assert stack.shape == (2,3,3)
+        >>> assert (stack.var[0,2:] == 0).all()
+        >>> assert stack[0] == mvns[0]
+        """
+        mvns = list(mvns)
+        K = len(mvns)
+
+        ndim = mvns[0].ndim
+        assert all(M.ndim == ndim for M in mvns), 'all ndims must match'
+
+        rank = max(M.rank for M in mvns)
+
+        mean = numpy.empty([K, ndim])
+        var = numpy.zeros([K, rank])
+        vectors = numpy.zeros([K, rank, ndim])
+
+        for (k, M) in enumerate(mvns):
+            mean[k] = M.mean
+            var[k, :M.rank] = M.var
+            vectors[k, :M.rank] = M.vectors
+
+        return cls(vectors=vectors, var=var, mean=mean)
+
+    @classmethod
+    def fromCov(cls, cov, mean):
+        """
+        :param cov: *shape=(K,ndim,ndim)*
+        :param mean: *shape=(K,ndim)*
+
+        decompose a stack of covariance matrixes with one batched eigh call
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> assert all(
+        ...     s == m for s,m in
+        ...     zip(MvnArray.fromCov(stack.cov, stack.mean), mvns)
+        ... )
+        """
+        cov = numpy.asarray(cov)
+        (var, vectors) = numpy.linalg.eigh(cov)
+
+        return cls(
+            mean=numpy.asarray(mean),
+            var=var,
+            vectors=vectors.swapaxes(-1, -2).conj(),
+        )
+
+    ############## properties
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def shape(self):
+        """
+        (K,rank,ndim)
+        """
+        return self.vectors.shape
+
+    @property
+    def ndim(self):
+        """
+        the number of dimensions of the space the mvns exist in
+        """
+        return self.vectors.shape[2]
+
+    @property
+    def rank(self):
+        """
+        the number of non-zero variances in each member, *shape=(K,)*
+        """
+        return (~self.approx(self.var)).sum(-1)
+
+    @property
+    def cov(self):
+        """
+        the stack of covariance matrixes, *shape=(K,ndim,ndim)*
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> cov = MvnArray.fromMvns(mvns).cov
+        >>> assert all(Matrix(c) == m.cov for c,m in zip(cov,mvns))
+        """
+        scaled = self.var[..., None]*self.vectors
+        return numpy.matmul(self.vectors.swapaxes(-1, -2).conj(), scaled)
+
+    @property
+    def scaled(self):
+        """
+        the vectors scaled by the square-root of their variances
+        """
+        return helpers.sqrt(self.var)[..., None]*self.vectors
+
+    def approx(self, *args):
+        return helpers.approx(*args, atol=self.atol, rtol=self.rtol)
+
+    def pdet(self):
+        """
+        the pseudo-determinant of each member's covariance, *shape=(K,)*
+        """
+        var = numpy.where(self.approx(self.var), 1.0, self.var)
+        return var.prod(-1)
+
+    def logPdet(self):
+        """
+        the log of the pseudo-determinant of each member's covariance, 
+        *shape=(K,)*, summed from the logs of the variances, see 
+        :py:meth:`mvn.Mvn.logPdet`
+        """
+        var = numpy.where(self.approx(self.var), 1.0, self.var)
+        return numpy.log(abs(var)).sum(-1)
+
+    def _ivar(self):
+        """
+        the inverse variances, with zeros in the padding
+        """
+        zeros = self.approx(self.var)
+        return numpy.where(zeros, 0.0, 1.0/numpy.where(zeros, 1.0, self.var))
+
+    ############## indexing
+    def __getitem__(self, index):
+        """
+        :param index:
+
+        integers return an :py:class:`mvn.Mvn`, anything else returns an
+        :py:class:`mvn.mvnarray.MvnArray`
+        """
+        if isinstance(index, (int, long, numpy.integer)):
+            return mvn.Mvn(
+                mean=self.mean[index],
+                var=self.var[index],
+                vectors=self.vectors[index],
+            )
+
+        return type(self)(
+            mean=self.mean[index],
+            var=self.var[index],
+            vectors=self.vectors[index],
+        )
+
+    def __iter__(self):
+        return (self[k] for k in xrange(len(self)))
+
+    def toMvns(self):
+        """
+        unpack the array into a list of :py:class:`mvn.Mvn`
+        """
+        return list(self)
+
+    def copy(self, deep=False):
+        """
+        return a copy of the array, deep copies the data
+        """
+        if not deep:
+            return type(self)(self.vectors, self.var, self.mean)
+
+        return type(self)(
+            self.vectors.copy(),
+            self.var.copy(),
+            self.mean.copy(),
+        )
+
+    def __repr__(self):
+        return '\n'.join([
+            '%s(' % self.__class__.__name__,
+            '    mean=',
+            ('        %r,' % self.mean).replace('\n', '\n'+8*' '),
+            '    var=',
+            ('        %r,' % self.var).replace('\n', '\n'+8*' '),
+            '    vectors=',
+            ('        %r' % self.vectors).replace('\n', '\n'+8*' '),
+            ')',
+        ])
+
+    __str__ = __repr__
+
+    ############## math
+    def _broadcast(self, other):
+        """
+        convert an :py:class:`mvn.Mvn` into an array with one copy for
+        each member of the self
+        """
+        if isinstance(other, MvnArray):
+            assert len(other) == len(self), 'array lengths must match'
+            return other
+
+        K = len(self)
+        return type(self)(
+            mean=numpy.tile(numpy.asarray(other.mean), [K, 1]),
+            var=numpy.tile(other.var, [K, 1]),
+            vectors=numpy.tile(numpy.asarray(other.vectors), [K, 1, 1]),
+        )
+
+    def __add__(self, other):
+        """
+        :param other:
+
+        self+other, member by member, see :py:meth:`mvn.Mvn.__add__`
+
+        like :py:meth:`mvn.Mvn._addMvn` the vectors are stacked, without
+        squaring
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> offset = numpy.random.randn(3)
+        >>> assert all(s == m+offset for s,m in zip(stack+offset,mvns))
+        >>> assert all(s == m+mvns[0] for s,m in zip(stack+mvns[0],mvns))
+        """
+        if not isinstance(other, (MvnArray, mvn.Mvn)):
+            return type(self)(
+                mean=self.mean+numpy.asarray(other),
+                var=self.var,
+                vectors=self.vectors,
+            )
+
+        other = self._broadcast(other)
+
+        return type(self)(
+            mean=self.mean+other.mean,
+            var=numpy.concatenate([self.var, other.var], axis=1),
+            vectors=numpy.concatenate([self.vectors, other.vectors], axis=1),
+        )
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self*(-1)
+
+    def __sub__(self, other):
+        return self+(-other)
+
+    def __mul__(self, other):
+        """
+        :param other:
+
+        self*other, member by member
+
+        scalars work like :py:meth:`mvn.Mvn._scalarMul`, 1d arrays like
+        :py:meth:`mvn.Mvn.__vectorMul__`, and matrixes like
+        :py:meth:`mvn.Mvn._matrixMul`. A *shape=(K,ndim,N)* stack of
+        matrixes applies a different transform to each member.
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> T = numpy.random.randn(4,3,2)
+        >>> assert all(s == m*t for s,m,t in zip(stack*T,mvns,T))
+        >>> V = numpy.random.randn(3)
+        >>> assert all(s == m*V for s,m in zip(stack*V,mvns))
+        """
+        other = numpy.asarray(other)
+
+        if other.ndim == 0:
+            return type(self)(
+                mean=other*self.mean,
+                var=other*self.var,
+                vectors=self.vectors,
+            )
+
+        if other.ndim == 1:
+            return type(self)(
+                mean=self.mean*other,
+                var=self.var,
+                vectors=self.vectors*other,
+            )
+
+        return type(self)(
+            mean=numpy.matmul(self.mean[:, None, :], other)[:, 0, :],
+            var=self.var,
+            vectors=numpy.matmul(self.vectors, other),
+        )
+
+    def __rmul__(self, other):
+        """
+        only defined for scalars
+        """
+        assert numpy.ndim(other) == 0, 'right multiply only accepts scalars'
+        return self*other
+
+    def __and__(self, other):
+        """
+        :param other:
+
+        self & other, member by member, see :py:meth:`mvn.Mvn.__and__`
+
+        While all the variances are finite this is done with batched
+        solves on the covariance matrixes:
+
+            C = C1*(C1+C2)**-1*C2
+
+        Members where that isn't safe (infinite variances, or two flat
+        operands, where C1+C2 may be singular) fall back to
+        :py:meth:`mvn.Mvn.__and__`.
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> line = Mvn(mean=[1,0,0],vectors=[1,0,0],var=numpy.inf)
+        >>> assert all(s == m&mvns[0] for s,m in zip(stack & mvns[0],mvns))
+        >>> assert all(s == m&line for s,m in zip(stack & line,mvns))
+        >>> flat = MvnArray.fromMvns([Mvn.rand([2,3]), mvns[1]])
+        >>> assert all(s == m&f for s,m,f in zip(flat & flat,flat,flat))
+        """
+        other = self._broadcast(other)
+
+        ndim = self.ndim
+
+        #if both members are flat C1+C2 can be singular
+        fast = (
+            numpy.isfinite(self.var).all(-1) &
+            numpy.isfinite(other.var).all(-1) &
+            ((self.rank == ndim) | (other.rank == ndim))
+        )
+
+        if not fast.any():
+            return self._andEach(other)
+
+        C1 = self[fast].cov
+        C2 = other[fast].cov
+
+        X = numpy.linalg.solve(C1+C2, C1)
+
+        # C1 and C2 are symetric so: X.H*C2 == C1*(C1+C2)**-1*C2
+        cov = numpy.matmul(X.swapaxes(-1, -2).conj(), C2)
+        cov = (cov+cov.swapaxes(-1, -2).conj())/2
+
+        delta = (other.mean[fast]-self.mean[fast])[:, None, :]
+        mean = self.mean[fast]+numpy.matmul(delta, X)[:, 0, :]
+
+        if fast.all():
+            return type(self).fromCov(cov, mean)
+
+        result = type(self).fromCov(cov, mean)
+        slow = self[~fast]._andEach(other[~fast])
+        
+        vectors = numpy.zeros([len(self), ndim, ndim], result.vectors.dtype)
+        var = numpy.zeros([len(self), ndim])
+        
+        vectors[fast] = result.vectors
+        var[fast] = result.var
+
+        rank = slow.shape[1]
+        vectors[~fast, :rank] = slow.vectors
+        var[~fast, :rank] = slow.var
+
+        mean = numpy.empty([len(self), ndim])
+        mean[fast] = result.mean
+        mean[~fast] = slow.mean
+
+        return type(self)(vectors=vectors, var=var, mean=mean)
+
+    def _andEach(self, other):
+        """
+        the slow path for :py:meth:`mvn.mvnarray.MvnArray.__and__`
+        """
+        return type(self).fromMvns([
+            a & b for (a, b) in zip(self, other)
+        ])
+
+    ############## data
+    def mah2(self, locations):
+        """
+        :param locations: *shape=(N,ndim)* or *shape=(ndim,)*
+
+        the squared mahalanobis distance from each member to each location,
+        the result has *shape=(K,N)* (or *(K,)* for a single location)
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> data = numpy.random.randn(10,3)
+        >>> D = stack.mah2(data)
+        >>> assert D.shape == (4,10)
+        >>> assert all(Matrix(d) == m.mah2(data) for d,m in zip(D,mvns))
+        """
+        locations = numpy.asarray(locations)
+        single = locations.ndim == 1
+        locations = numpy.atleast_2d(locations)
+
+        deltas = locations[None, :, :]-self.mean[:, None, :]
+
+        scaled = numpy.matmul(deltas, self.vectors.swapaxes(-1, -2).conj())
+        result = (
+            numpy.real(scaled*scaled.conj())*self._ivar()[:, None, :]
+        ).sum(-1)
+
+        return result[:, 0] if single else result
+
+    def entropy(self, locations):
+        """
+        :param locations:
+
+        the information required to encode each location, using a code based
+        on each member, see :py:meth:`mvn.Mvn.entropy`
+        """
+        return (
+            self.mah2(locations).T+
+            self.rank*numpy.log(2*numpy.pi)+
+            self.logPdet()
+        ).T/2
+
+    def logpdf(self, locations):
+        """
+        :param locations:
+
+        the log of the probability density of each member at each location, 
+        *shape=(K,N)*, see :py:meth:`mvn.Mvn.logpdf`
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> data = numpy.random.randn(10,3)
+        >>> L = stack.logpdf(data)
+        >>> assert all(Matrix(l) == m.logpdf(data) for l,m in zip(L,mvns))
+        """
+        return -self.entropy(locations)
+
+    def density(self, locations):
+        """
+        :param locations:
+
+        the probability density of each member at each location,
+        *shape=(K,N)*, see :py:meth:`mvn.Mvn.density`
+
+        >>> from mvn import Mvn
+        >>> mvns = [Mvn.rand(3) for n in range(4)]
+        >>> stack = MvnArray.fromMvns(mvns)
+        >>> data = numpy.random.randn(10,3)
+        >>> D = stack.density(data)
+        >>> assert all(Matrix(d) == m.density(data) for d,m in zip(D,mvns))
+        """
+        return numpy.exp(self.logpdf(locations))
+
+    def sample(self, shape=(1,)):
+        """
+        :param shape:
+
+        take samples from each member, the result has
+        *shape=(K,)+shape+(ndim,)*
+
+        >>> from mvn import Mvn
+        >>> stack = MvnArray.fromMvns([Mvn.rand(3) for n in range(4)])
+        >>> assert stack.sample(5).shape == (4,5,3)
+        >>> assert stack.sample([5,6]).shape == (4,5,6,3)
+        """
+        try:
+            shape = list(shape)
+        except TypeError:
+            shape = [shape]
+
+        (K, rank, ndim) = self.shape
+
+        count = int(numpy.prod(shape))
+        units = numpy.random.randn(K, count, rank)
+
+        samples = numpy.matmul(units, self.scaled)+self.mean[:, None, :]
+
+        return samples.reshape([K]+shape+[ndim])
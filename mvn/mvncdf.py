@@ -1,295 +1,1104 @@
-'''
-downloaded from: http://projects.scipy.org/scipy/attachment/ticket/846/mvncdf.py
-    april 2011
-
-multivariate normal probabilities and cumulative distribution function
-a wrapper for scipy.stats.kde.mvndst
-
-
-      SUBROUTINE MVNDST( N, LOWER, UPPER, INFIN, CORREL, MAXPTS,
-     &                   ABSEPS, RELEPS, ERROR, VALUE, INFORM )
-*
-*     A subroutine for computing multivariate normal probabilities.
-*     This subroutine uses an algorithm given in the paper
-*     "Numerical Computation of Multivariate Normal Probabilities", in
-*     J. of Computational and Graphical Stat., 1(1992), pp. 141-149, by
-*          Alan Genz 
-*          Department of Mathematics
-*          Washington State University 
-*          Pullman, WA 99164-3113
-*          Email : AlanGenz@wsu.edu
-*
-*  Parameters
-*
-*     N      INTEGER, the number of variables.
-*     LOWER  REAL, array of lower integration limits.
-*     UPPER  REAL, array of upper integration limits.
-*     INFIN  INTEGER, array of integration limits flags:
-*            if INFIN(I) < 0, Ith limits are (-infinity, infinity);
-*            if INFIN(I) = 0, Ith limits are (-infinity, UPPER(I)];
-*            if INFIN(I) = 1, Ith limits are [LOWER(I), infinity);
-*            if INFIN(I) = 2, Ith limits are [LOWER(I), UPPER(I)].
-*     CORREL REAL, array of correlation coefficients; the correlation
-*            coefficient in row I column J of the correlation matrix
-*            should be stored in CORREL( J + ((I-2)*(I-1))/2 ), for J < I.
-*            THe correlation matrix must be positive semidefinite.
-*     MAXPTS INTEGER, maximum number of function values allowed. This 
-*            parameter can be used to limit the time. A sensible 
-*            strategy is to start with MAXPTS = 1000*N, and then
-*            increase MAXPTS if ERROR is too large.
-*     ABSEPS REAL absolute error tolerance.
-*     RELEPS REAL relative error tolerance.
-*     ERROR  REAL estimated absolute error, with 99% confidence level.
-*     VALUE  REAL estimated value for the integral
-*     INFORM INTEGER, termination status parameter:
-*            if INFORM = 0, normal completion with ERROR < EPS;
-*            if INFORM = 1, completion with ERROR > EPS and MAXPTS 
-*                           function vaules used; increase MAXPTS to 
-*                           decrease ERROR;
-*            if INFORM = 2, N > 500 or N < 1.
-*
-
-
->>> eps = 2e-16
->>> exception = 0
->>> mvndst = scipy.stats.kde.mvn.mvndst
->>> zeros = [0,0]
->>>
->>> assert ((eps,Matrix(1.0),exception) ==
-...     mvndst(zeros,[10.0,10.0],zeros,[0.5]))
->>>
->>> assert ((eps,Matrix(1.0),exception) ==
-...     mvndst(zeros,[100.0,100.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.70786098173714096),exception) ==
-...     mvndst(zeros,[1.0,1.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.42100802096993045),exception) ==
-...     mvndst(zeros,[0.001,1.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.50039894221391101),exception) ==
-...     mvndst(zeros,[0.001,10.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.50039894221391101),exception) ==
-...     mvndst(zeros,[0.001,100.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.5039893563146316),exception) ==
-...     mvndst(zeros,[0.01,100.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.53982783727702899),exception) ==
-...     mvndst(zeros,[0.1,100.0],zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.019913918638514494),exception) ==
-...     mvndst(zeros,[0.1,100.0],[2,2],[0.0]))
->>>
->>> assert ((eps,Matrix(0.25),exception) ==
-...     mvndst(zeros,zeros,zeros,[0.0]))
->>>
->>> assert ((eps,Matrix(0.5),exception) ==
-...     mvndst(zeros,zeros,[-1,0],[0.0]))
->>>
->>> assert ((eps,Matrix(0.5),exception) ==
-...     mvndst(zeros,zeros,[-1,0],[0.5]))
->>>
->>> assert ((eps,Matrix(0.33333333333333337),exception) ==
-...     mvndst(zeros,zeros,zeros,[0.5]))
->>>
->>> assert ((eps,Matrix(0.47747329317779391),exception) ==
-...     mvndst(zeros,zeros,zeros,[0.99]))
-'''
-import numpy as np
-import scipy
-from scipy.stats.mvn import mvndst
-
-from mvn.matrix import Matrix
-
-class MvnDstError(BaseException):
-    informcode = {
-        0: 'normal completion with ERROR < EPS',
-        1: '''completion with ERROR > EPS and MAXPTS function values used;
-              increase MAXPTS to decrease ERROR''',
-        2: 'N > 500 or N < 1'
-    }
-
-    def __init__(self,informCode,error,*args,**kwargs):
-        message = ''.join([
-            self.informcode[informCode],
-            ', ERROR = %s' % error
-        ])
-        BaseException.__init__(self,message,*args,**kwargs)
-
-def mvstdnormcdf(lower, upper, corrcoef,maxpts = None, **kwds):
-    '''standardized multivariate normal cumulative distribution function
-
-    This is a wrapper for scipy.stats.kde.mvn.mvndst which calculates
-    a rectangular integral over a standardized multivariate normal
-    distribution.
-    
-    This function assumes standardized scale, that is the variance in each dimension
-    is one, but correlation can be arbitrary, covariance = correlation matrix
-
-    Parameters
-    ----------
-    lower, upper : array_like, 1d
-       lower and upper integration limits with length equal to the number
-       of dimensions of the multivariate normal distribution. It can contain
-       -np.inf or np.inf for open integration intervals
-    corrcoef : float or array_like
-       specifies correlation matrix in one of three ways, see notes
-    optional keyword parameters to influence integration
-        * maxpts : int, maximum number of function values allowed. This 
-             parameter can be used to limit the time. A sensible 
-             strategy is to start with `maxpts` = 1000*N, and then
-             increase `maxpts` if ERROR is too large.
-        * abseps : float absolute error tolerance.
-        * releps : float relative error tolerance.
-
-    Returns
-    -------
-    cdfvalue : float
-        value of the integral
-
-
-    Notes
-    -----
-    The correlation matrix corrcoef can be given in 3 different ways
-    If the multivariate normal is two-dimensional than only the
-    correlation coefficient needs to be provided.
-    For general dimension the correlation matrix can be provided either
-    as a one-dimensional array of the upper triangular correlation
-    coefficients stacked by rows, or as full square correlation matrix
-
-    See Also
-    --------
-    mvnormcdf : cdf of multivariate normal distribution without
-        standardization
-
-    Examples
-    --------
-
-    >>> print mvstdnormcdf([-np.inf,-np.inf], [0.0,np.inf], 0.5)
-    0.5
-    >>> corr = [[1.0, 0, 0.5],[0,1,0],[0.5,0,1]]    
-    >>> assert Matrix(0.166666399198) == mvstdnormcdf(
-    ...    [-np.inf,-np.inf,-100.0], 
-    ...    [0.0,0.0,0.0], 
-    ...    corr, abseps=2e-6
-    ... )
-    
-    >>> 
-    >>> assert Matrix(0.166666588293) == mvstdnormcdf(
-    ...     [-np.inf,-np.inf,-100.0],
-    ...     [    0.0,    0.0,   0.0],
-    ...     corr, abseps=1e-8)                                                  #doctest: +IGNORE_EXCEPTION_DETAIL                                                 
-    Traceback (most recent call last):                                         
-    ...
-    MvnDstError: completion with ERROR > EPS and MAXPTS function values used;
-                 increase MAXPTS to decrease ERROR, ERROR = 1.8253048422e-07   
-    
-    >>> assert Matrix(0.166666588293) == mvstdnormcdf(
-    ...    [-np.inf,-np.inf,-100.0],
-    ...    [0.0,0.0,0.0],
-    ...    corr,maxpts=1000000, abseps=1e-8
-    ... )
-    
-    
-    '''
-    n = len(lower)
-    #don't know if converting to array is necessary,
-    #but it makes ndim check possible
-    lower = np.array(lower)
-    upper = np.array(upper)
-    corrcoef = np.array(corrcoef)
-    
-    correl = np.zeros(n*(n-1)/2.0)  #dtype necessary?
-    
-    if (lower.ndim != 1) or (upper.ndim != 1):
-        raise ValueError, 'can handle only 1D bounds'
-    if len(upper) != n:
-        raise ValueError, 'bounds have different lengths'
-    if n==2 and corrcoef.size==1:
-        correl = corrcoef
-        #print 'case scalar rho', n
-    elif corrcoef.ndim == 1 and len(corrcoef) == n*(n-1)/2.0:
-        #print 'case flat corr', corrcoeff.shape
-        correl = corrcoef
-    elif corrcoef.shape == (n,n):
-        correl = corrcoef[np.tri(n,n,-1,dtype=bool)]
-    else:
-        raise ValueError, 'corrcoef has incorrect dimension'
-
-    if maxpts is None:
-        maxpts = 10000*n
-
-
-    lowinf = np.isneginf(lower)
-    uppinf = np.isposinf(upper)
-    infin = 2.0*np.ones(n)
-    
-    infin[lowinf] = 0
-    infin[uppinf] = 1
-    infin[lowinf & uppinf] = -1
-
-
-    error, cdfvalue, inform = mvndst(lower,upper,infin,correl,maxpts,**kwds)
-    
-    if inform:
-        raise MvnDstError(inform, error)
-        
-    return cdfvalue
-
-
-def mvnormcdf(lower, upper, mu, cov, **kwds):
-    '''multivariate normal cumulative distribution function
-
-    This is a wrapper for scipy.stats.kde.mvn.mvndst which calculates
-    a rectangular integral over a multivariate normal distribution.
-    
-    Parameters
-    ----------
-    lower, upper : array_like, 1d
-       lower and upper integration limits with length equal to the number
-       of dimensions of the multivariate normal distribution. It can contain
-       -np.inf or np.inf for open integration intervals
-    mu : array_lik, 1d
-       list or array of means
-    cov : array_like, 2d
-       specifies covariance matrix
-    optional keyword parameters to influence integration
-        * maxpts : int, maximum number of function values allowed. This 
-             parameter can be used to limit the time. A sensible 
-             strategy is to start with `maxpts` = 1000*N, and then
-             increase `maxpts` if ERROR is too large.
-        * abseps : float absolute error tolerance.
-        * releps : float relative error tolerance.
-
-    Returns
-    -------
-    cdfvalue : float
-        value of the integral
-
-
-    Notes
-    -----
-    This function normalizes the location and scale of the multivariate
-    normal distribution and then uses `mvstdnormcdf` to call the integration.
-
-    See Also
-    --------
-    mvstdnormcdf : location and scale standardized multivariate normal cdf
-    '''
-    
-    lower = np.array(lower)
-    upper = np.array(upper)
-    cov = np.array(cov)
-    stdev = np.sqrt(np.diag(cov)) # standard deviation vector
-    #do I need to make sure stdev is float and not int?
-    #is this correct to normalize to corr?
-    lower = (lower - mu)/stdev
-    upper = (upper - mu)/stdev
-    divrow = np.atleast_2d(stdev)
-    corr = cov/divrow/divrow.T
-    #v/np.sqrt(np.atleast_2d(np.diag(covv)))/np.sqrt(np.atleast_2d(np.diag(covv))).T
-
-    return mvstdnormcdf(lower, upper, corr, **kwds)
-
+'''
+downloaded from: http://projects.scipy.org/scipy/attachment/ticket/846/mvncdf.py
+    april 2011
+
+multivariate normal probabilities and cumulative distribution function
+a wrapper for scipy.stats.kde.mvndst
+
+
+      SUBROUTINE MVNDST( N, LOWER, UPPER, INFIN, CORREL, MAXPTS,
+     &                   ABSEPS, RELEPS, ERROR, VALUE, INFORM )
+*
+*     A subroutine for computing multivariate normal probabilities.
+*     This subroutine uses an algorithm given in the paper
+*     "Numerical Computation of Multivariate Normal Probabilities", in
+*     J. of Computational and Graphical Stat., 1(1992), pp. 141-149, by
+*          Alan Genz 
+*          Department of Mathematics
+*          Washington State University 
+*          Pullman, WA 99164-3113
+*          Email : AlanGenz@wsu.edu
+*
+*  Parameters
+*
+*     N      INTEGER, the number of variables.
+*     LOWER  REAL, array of lower integration limits.
+*     UPPER  REAL, array of upper integration limits.
+*     INFIN  INTEGER, array of integration limits flags:
+*            if INFIN(I) < 0, Ith limits are (-infinity, infinity);
+*            if INFIN(I) = 0, Ith limits are (-infinity, UPPER(I)];
+*            if INFIN(I) = 1, Ith limits are [LOWER(I), infinity);
+*            if INFIN(I) = 2, Ith limits are [LOWER(I), UPPER(I)].
+*     CORREL REAL, array of correlation coefficients; the correlation
+*            coefficient in row I column J of the correlation matrix
+*            should be stored in CORREL( J + ((I-2)*(I-1))/2 ), for J < I.
+*            THe correlation matrix must be positive semidefinite.
+*     MAXPTS INTEGER, maximum number of function values allowed. This 
+*            parameter can be used to limit the time. A sensible 
+*            strategy is to start with MAXPTS = 1000*N, and then
+*            increase MAXPTS if ERROR is too large.
+*     ABSEPS REAL absolute error tolerance.
+*     RELEPS REAL relative error tolerance.
+*     ERROR  REAL estimated absolute error, with 99% confidence level.
+*     VALUE  REAL estimated value for the integral
+*     INFORM INTEGER, termination status parameter:
+*            if INFORM = 0, normal completion with ERROR < EPS;
+*            if INFORM = 1, completion with ERROR > EPS and MAXPTS 
+*                           function vaules used; increase MAXPTS to 
+*                           decrease ERROR;
+*            if INFORM = 2, N > 500 or N < 1.
+*
+
+
+>>> eps = 2e-16
+>>> exception = 0
+>>> mvndst = scipy.stats.kde.mvn.mvndst
+>>> zeros = [0,0]
+>>>
+>>> assert ((eps,Matrix(1.0),exception) ==
+...     mvndst(zeros,[10.0,10.0],zeros,[0.5]))
+>>>
+>>> assert ((eps,Matrix(1.0),exception) ==
+...     mvndst(zeros,[100.0,100.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.70786098173714096),exception) ==
+...     mvndst(zeros,[1.0,1.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.42100802096993045),exception) ==
+...     mvndst(zeros,[0.001,1.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.50039894221391101),exception) ==
+...     mvndst(zeros,[0.001,10.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.50039894221391101),exception) ==
+...     mvndst(zeros,[0.001,100.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.5039893563146316),exception) ==
+...     mvndst(zeros,[0.01,100.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.53982783727702899),exception) ==
+...     mvndst(zeros,[0.1,100.0],zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.019913918638514494),exception) ==
+...     mvndst(zeros,[0.1,100.0],[2,2],[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.25),exception) ==
+...     mvndst(zeros,zeros,zeros,[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.5),exception) ==
+...     mvndst(zeros,zeros,[-1,0],[0.0]))
+>>>
+>>> assert ((eps,Matrix(0.5),exception) ==
+...     mvndst(zeros,zeros,[-1,0],[0.5]))
+>>>
+>>> assert ((eps,Matrix(0.33333333333333337),exception) ==
+...     mvndst(zeros,zeros,zeros,[0.5]))
+>>>
+>>> assert ((eps,Matrix(0.47747329317779391),exception) ==
+...     mvndst(zeros,zeros,zeros,[0.99]))
+'''
+import time
+
+import numpy as np
+import scipy
+from scipy.special import ndtr, ndtri
+
+try:
+    from scipy.stats.mvn import mvndst
+except ImportError:
+    #removed from newer versions of scipy, genzcdf doesn't need it
+    mvndst = None
+
+from mvn.matrix import Matrix
+
+class MvnDstError(BaseException):
+    informcode = {
+        0: 'normal completion with ERROR < EPS',
+        1: '''completion with ERROR > EPS and MAXPTS function values used;
+              increase MAXPTS to decrease ERROR''',
+        2: 'N > 500 or N < 1'
+    }
+
+    def __init__(self,informCode,error,*args,**kwargs):
+        message = ''.join([
+            self.informcode[informCode],
+            ', ERROR = %s' % error
+        ])
+        BaseException.__init__(self,message,*args,**kwargs)
+
+def flatcorr(corrcoef, n):
+    '''the correlation coefficients in the flat layout mvndst expects
+
+    Parameters
+    ----------
+    corrcoef : float or array_like
+       a scalar correlation (for n == 2), the flattened lower triangle, 
+       or the full square correlation matrix
+    n : int
+       the number of dimensions
+
+    Returns
+    -------
+    correl : ndarray, 1d
+       the coefficients below the diagonal, stacked by rows
+
+    >>> corr = [[1.0, 0.1, 0.2],[0.1, 1.0, 0.3],[0.2, 0.3, 1.0]]
+    >>> flatcorr(corr, 3)
+    array([0.1, 0.2, 0.3])
+    '''
+    corrcoef = np.array(corrcoef)
+
+    if n==2 and corrcoef.size==1:
+        return corrcoef.ravel()
+    elif corrcoef.ndim == 1 and len(corrcoef) == n*(n-1)//2:
+        return corrcoef
+    elif corrcoef.shape == (n,n):
+        return corrcoef[np.tri(n,n,-1,dtype=bool)]
+    else:
+        raise ValueError, 'corrcoef has incorrect dimension'
+
+def fullcorr(corrcoef, n):
+    '''the full square correlation matrix, the inverse of `flatcorr`
+
+    >>> corr = np.array([[1.0, 0.1, 0.2],[0.1, 1.0, 0.3],[0.2, 0.3, 1.0]])
+    >>> assert (fullcorr(flatcorr(corr, 3), 3) == corr).all()
+    >>> assert (fullcorr(corr, 3) == corr).all()
+    '''
+    corrcoef = np.array(corrcoef, dtype=float)
+
+    if corrcoef.shape == (n,n):
+        return corrcoef
+
+    corr = np.eye(n)
+    below = np.tri(n,n,-1,dtype=bool)
+    corr[below] = flatcorr(corrcoef, n)
+    corr.T[below] = corr[below]
+
+    return corr
+
+def limitflags(lower, upper):
+    '''the INFIN flags, that mark the infinite limits, for mvndst
+
+    Parameters
+    ----------
+    lower, upper : array_like
+       integration limits, of any matching shape
+
+    Returns
+    -------
+    infin : ndarray
+       -1 for (-inf, inf), 0 for (-inf, upper], 1 for [lower, inf), 2 
+       otherwise
+
+    >>> limitflags([-np.inf, 0, -np.inf, 0], [np.inf, np.inf, 0, 1])
+    array([-1.,  1.,  0.,  2.])
+    '''
+    lowinf = np.isneginf(lower)
+    uppinf = np.isposinf(upper)
+    infin = 2.0*np.ones(np.broadcast(lowinf, uppinf).shape)
+    
+    infin[lowinf] = 0
+    infin[uppinf] = 1
+    infin[lowinf & uppinf] = -1
+
+    return infin
+
+def mvstdnormcdf(lower, upper, corrcoef,maxpts = None, **kwds):
+    '''standardized multivariate normal cumulative distribution function
+
+    This is a wrapper for scipy.stats.kde.mvn.mvndst which calculates
+    a rectangular integral over a standardized multivariate normal
+    distribution.
+    
+    This function assumes standardized scale, that is the variance in each dimension
+    is one, but correlation can be arbitrary, covariance = correlation matrix
+
+    Two and three dimensional boxes are calculated exactly, with 
+    `bvnormcdf` and `tvnormcdf`, the integration options are ignored.
+
+    Parameters
+    ----------
+    lower, upper : array_like, 1d
+       lower and upper integration limits with length equal to the number
+       of dimensions of the multivariate normal distribution. It can contain
+       -np.inf or np.inf for open integration intervals
+    corrcoef : float or array_like
+       specifies correlation matrix in one of three ways, see notes
+    optional keyword parameters to influence integration
+        * maxpts : int, maximum number of function values allowed. This 
+             parameter can be used to limit the time. A sensible 
+             strategy is to start with `maxpts` = 1000*N, and then
+             increase `maxpts` if ERROR is too large.
+        * abseps : float absolute error tolerance.
+        * releps : float relative error tolerance.
+
+    Returns
+    -------
+    cdfvalue : float
+        value of the integral
+
+
+    Notes
+    -----
+    The correlation matrix corrcoef can be given in 3 different ways
+    If the multivariate normal is two-dimensional than only the
+    correlation coefficient needs to be provided.
+    For general dimension the correlation matrix can be provided either
+    as a one-dimensional array of the upper triangular correlation
+    coefficients stacked by rows, or as full square correlation matrix
+
+    See Also
+    --------
+    mvnormcdf : cdf of multivariate normal distribution without
+        standardization
+
+    Examples
+    --------
+
+    >>> print mvstdnormcdf([-np.inf,-np.inf], [0.0,np.inf], 0.5)
+    0.5
+    >>> corr = [[1.0, 0, 0.5],[0,1,0],[0.5,0,1]]    
+    >>> assert Matrix(1.0/6) == mvstdnormcdf(
+    ...    [-np.inf,-np.inf,-100.0], 
+    ...    [0.0,0.0,0.0], 
+    ...    corr, abseps=1e-8
+    ... )
+
+    >>> corr = [[1.0, 0, 0.5, 0],[0,1,0,0],[0.5,0,1,0],[0,0,0,1]]
+    >>> assert Matrix(1.0/12) == mvstdnormcdf(
+    ...     [-np.inf,-np.inf,-100.0,-np.inf],
+    ...     [    0.0,    0.0,   0.0,    0.0],
+    ...     corr, abseps=1e-10)                                                 #doctest: +IGNORE_EXCEPTION_DETAIL                                                 
+    Traceback (most recent call last):                                         
+    ...
+    MvnDstError: completion with ERROR > EPS and MAXPTS function values used;
+                 increase MAXPTS to decrease ERROR, ERROR = 1.8253048422e-07   
+    
+    >>> assert Matrix(1.0/12) == mvstdnormcdf(
+    ...    [-np.inf,-np.inf,-100.0,-np.inf],
+    ...    [0.0,0.0,0.0,0.0],
+    ...    corr,maxpts=1000000, abseps=1e-6
+    ... )
+    
+    
+    '''
+    n = len(lower)
+    #don't know if converting to array is necessary,
+    #but it makes ndim check possible
+    lower = np.array(lower)
+    upper = np.array(upper)
+    
+    if (lower.ndim != 1) or (upper.ndim != 1):
+        raise ValueError, 'can handle only 1D bounds'
+    if len(upper) != n:
+        raise ValueError, 'bounds have different lengths'
+
+    correl = flatcorr(corrcoef, n)
+
+    if n in (2, 3):
+        return float(_exact(lower, upper, correl))
+
+    if maxpts is None:
+        maxpts = 10000*n
+
+    infin = limitflags(lower, upper)
+
+    if mvndst is None:
+        (cdfvalue, error, inform) = [
+            item[0] for item in genzcdf(
+                lower[None, :], upper[None, :], fullcorr(correl, n), 
+                maxpts=maxpts, **kwds
+            )
+        ]
+    else:
+        error, cdfvalue, inform = mvndst(
+            lower,upper,infin,correl,maxpts,**kwds
+        )
+    
+    if inform:
+        raise MvnDstError(inform, error)
+        
+    return cdfvalue
+
+
+def mvnormcdf(lower, upper, mu, cov, **kwds):
+    '''multivariate normal cumulative distribution function
+
+    This is a wrapper for scipy.stats.kde.mvn.mvndst which calculates
+    a rectangular integral over a multivariate normal distribution.
+    
+    Parameters
+    ----------
+    lower, upper : array_like, 1d
+       lower and upper integration limits with length equal to the number
+       of dimensions of the multivariate normal distribution. It can contain
+       -np.inf or np.inf for open integration intervals
+    mu : array_lik, 1d
+       list or array of means
+    cov : array_like, 2d
+       specifies covariance matrix
+    optional keyword parameters to influence integration
+        * maxpts : int, maximum number of function values allowed. This 
+             parameter can be used to limit the time. A sensible 
+             strategy is to start with `maxpts` = 1000*N, and then
+             increase `maxpts` if ERROR is too large.
+        * abseps : float absolute error tolerance.
+        * releps : float relative error tolerance.
+
+    Returns
+    -------
+    cdfvalue : float
+        value of the integral
+
+
+    Notes
+    -----
+    This function normalizes the location and scale of the multivariate
+    normal distribution and then uses `mvstdnormcdf` to call the integration.
+
+    See Also
+    --------
+    mvstdnormcdf : location and scale standardized multivariate normal cdf
+    '''
+    
+    lower = np.array(lower)
+    upper = np.array(upper)
+    cov = np.array(cov)
+    stdev = np.sqrt(np.diag(cov)) # standard deviation vector
+    #do I need to make sure stdev is float and not int?
+    #is this correct to normalize to corr?
+    lower = (lower - mu)/stdev
+    upper = (upper - mu)/stdev
+    divrow = np.atleast_2d(stdev)
+    corr = cov/divrow/divrow.T
+    #v/np.sqrt(np.atleast_2d(np.diag(covv)))/np.sqrt(np.atleast_2d(np.diag(covv))).T
+
+    return mvstdnormcdf(lower, upper, corr, **kwds)
+
+
+def bvnormcdf(lower, upper, rho):
+    '''standardized bivariate normal probabilities, vectorized
+
+    Exact to about 1e-15, with Genz's version of the Drezner and 
+    Wesolowsky method, a 20 point Gauss-Legendre rule over the 
+    correlation, with an asymptotic expansion for abs(rho) >= 0.925. 
+    It's deterministic, and there's no budget to set.
+
+    Parameters
+    ----------
+    lower, upper : array_like
+       *shape=(...,2)*, the limits of each box, can contain -np.inf or 
+       np.inf for open intervals
+    rho : array_like
+       *shape=(...)*, the correlation for each box, -1 <= rho <= 1
+
+    Returns
+    -------
+    values : ndarray
+       *shape=(...)*, the probability of each box
+
+    >>> print bvnormcdf([-np.inf,-np.inf], [0.0,np.inf], 0.5)
+    0.5
+    >>> assert abs(bvnormcdf([-np.inf,-np.inf], [0.0, 0.0], 0.5)-1.0/3) < 1e-15
+
+    the limits and correlations broadcast against each other:
+
+    >>> rho = np.linspace(-1, 1, 5)
+    >>> values = bvnormcdf([-np.inf,-np.inf], [0.0,0.0], rho)
+    >>> assert abs(values-(0.25+np.arcsin(rho)/(2*np.pi))).max() < 1e-15
+    '''
+    (corners, signs, shape) = _corners(lower, upper, rho)
+    (rho, corners) = (corners[..., -1], corners[..., :-1])
+
+    (rows, cols) = (~np.isneginf(corners).any(-1)).nonzero()
+
+    values = np.zeros(corners.shape[:2])
+    values[rows, cols] = _bvnu(
+        -corners[rows, cols, 0], -corners[rows, cols, 1], rho[rows, cols]
+    )
+
+    return np.clip(values.dot(signs), 0, 1).reshape(shape)
+
+def tvnormcdf(lower, upper, correl):
+    '''standardized trivariate normal probabilities, vectorized
+
+    Uses Plackett's reduction, as Genz does, the orthant probability is 
+    the one with two of the correlations set to zero, plus a one 
+    dimensional integral along those two correlations. The pair with the 
+    largest correlation is kept fixed, and the integral is taken with 
+    Gauss-Legendre panels, graded towards the end where a singular 
+    correlation makes the integrand steep. It's accurate to about 1e-13, 
+    singular correlations included, and deterministic.
+
+    Parameters
+    ----------
+    lower, upper : array_like
+       *shape=(...,3)*, the limits of each box, can contain -np.inf or 
+       np.inf for open intervals
+    correl : array_like
+       *shape=(...,3)*, the correlations for each box, in the layout of 
+       `flatcorr`: (r21, r31, r32)
+
+    Returns
+    -------
+    values : ndarray
+       *shape=(...)*, the probability of each box
+
+    >>> corr = [[1.0, 0, 0.5],[0,1,0],[0.5,0,1]]
+    >>> value = tvnormcdf(
+    ...     [-np.inf,-np.inf,-100.0], [0.0,0.0,0.0], flatcorr(corr, 3)
+    ... )
+    >>> assert abs(value-1.0/6) < 1e-14
+
+    with no correlation it's the product of the one dimensional 
+    probabilities:
+
+    >>> lowers = -np.random.rand(5, 3)
+    >>> uppers = np.random.rand(5, 3)
+    >>> values = tvnormcdf(lowers, uppers, [0.0, 0.0, 0.0])
+    >>> exact = (ndtr(uppers)-ndtr(lowers)).prod(1)
+    >>> assert abs(values-exact).max() < 1e-14
+
+    and with perfect correlation it's the smallest of them:
+
+    >>> value = tvnormcdf([-np.inf]*3, [0.5, -0.2, 1.0], [1.0, 1.0, 1.0])
+    >>> assert abs(value-ndtr(-0.2)) < 1e-13
+    '''
+    correl = np.asarray(correl, dtype=float)
+    (corners, signs, shape) = _corners(lower, upper, correl[..., 0])
+    correl = np.broadcast_to(correl, shape+(3,)).reshape([-1, 1, 3])
+    corners = corners[..., :-1]
+
+    (rows, cols) = (~np.isneginf(corners).any(-1)).nonzero()
+
+    values = np.zeros(corners.shape[:2])
+    values[rows, cols] = _tvnl(corners[rows, cols], correl[rows, 0])
+
+    return np.clip(values.dot(signs), 0, 1).reshape(shape)
+
+def _exact(lower, upper, corrcoef):
+    '''
+    the two or three dimensional probabilities, with `bvnormcdf` or 
+    `tvnormcdf`, for limits of *shape=(...,n)*
+    '''
+    n = np.shape(lower)[-1]
+    correl = flatcorr(corrcoef, n)
+
+    if n == 2:
+        return bvnormcdf(lower, upper, correl[0])
+
+    return tvnormcdf(lower, upper, correl)
+
+def _corners(lower, upper, extra):
+    '''
+    broadcasts the limits, and the extra per box parameter, and expands 
+    each box into the corners used by inclusion-exclusion. Returns 
+    (corners, signs, shape): *shape=(M,2**n,n+1)*, with extra as the last 
+    column, *shape=(2**n,)* and the broadcast shape of the boxes.
+    '''
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    extra = np.asarray(extra, dtype=float)
+
+    n = lower.shape[-1]
+    shape = np.broadcast(lower[..., 0], upper[..., 0], extra).shape
+
+    limits = np.stack([
+        np.broadcast_to(lower, shape+(n,)).reshape([-1, n]),
+        np.broadcast_to(upper, shape+(n,)).reshape([-1, n]),
+    ], 1)
+
+    #each corner takes the upper limit where its bit is set
+    bits = (np.arange(2**n)[:, None] >> np.arange(n)) & 1
+    corners = np.empty([limits.shape[0], 2**n, n+1])
+    corners[..., :n] = limits[:, bits, np.arange(n)]
+    corners[..., n] = np.broadcast_to(extra, shape).reshape([-1, 1])
+
+    signs = (-1.0)**(n-bits.sum(1))
+
+    return (corners, signs, shape)
+
+#the 20 point Gauss-Legendre rule, on (0, 2)
+(_bvnNodes, _bvnWeights) = np.polynomial.legendre.leggauss(20)
+_bvnNodes = _bvnNodes+1
+
+def _bvnu(h, k, r):
+    '''
+    P(X > h, Y > k), for a standard bivariate normal with correlation r, 
+    Genz's BVNU, for 1d arrays of matching shape, h and k can be infinite.
+    '''
+    values = np.empty(h.shape)
+
+    #the infinite limits reduce to one dimension, or zero
+    infinite = np.isinf(h) | np.isinf(k)
+    values[infinite] = np.where(
+        (h == np.inf) | (k == np.inf), 0.0, 
+        ndtr(-np.where(np.isneginf(h), k, h))
+    )[infinite]
+
+    low = ~infinite & (abs(r) < 0.925)
+    if low.any():
+        (H, K, R) = (h[low, None], k[low, None], r[low, None])
+        half = np.arcsin(R)/2
+        sn = np.sin(half*_bvnNodes)
+        values[low] = (
+            np.exp((sn*H*K-(H*H+K*K)/2)/(1-sn*sn)).dot(_bvnWeights)*
+            half[:, 0]/(2*np.pi)+ndtr(-H[:, 0])*ndtr(-K[:, 0])
+        )
+
+    high = ~infinite & ~low
+    if high.any():
+        (H, K, R) = (h[high], k[high], r[high])
+        K = np.where(R < 0, -K, K)
+        hk = H*K
+
+        bvn = np.zeros(H.shape)
+        inner = abs(R) < 1
+        if inner.any():
+            bvn[inner] = _bvnuSeries(H[inner], K[inner], R[inner], hk[inner])
+
+        bvn = np.where(
+            R > 0, 
+            bvn+ndtr(-np.maximum(H, K)),
+            np.where(
+                H >= K, -bvn,
+                np.where(H < 0, ndtr(K)-ndtr(H), ndtr(-H)-ndtr(-K))-bvn
+            )
+        )
+        values[high] = bvn
+
+    return np.clip(values, 0, 1)
+
+def _bvnuSeries(h, k, r, hk):
+    '''
+    the asymptotic expansion part of `_bvnu`, for 0.925 <= abs(r) < 1, 
+    k already has the sign of r
+    '''
+    As = 1-r*r
+    a = np.sqrt(As)
+    bs = (h-k)**2
+    b = np.sqrt(bs)
+    c = (4-hk)/8
+    d = (12-hk)/80
+
+    exponent = -(bs/As+hk)/2
+    bvn = np.where(
+        exponent > -100, 
+        a*np.exp(np.maximum(exponent, -100))*(
+            1-c*(bs-As)*(1-d*bs)/3+c*d*As*As
+        ), 
+        0.0
+    )
+    bvn -= np.where(
+        hk > -100, 
+        np.exp(-np.maximum(hk, -100)/2)*np.sqrt(2*np.pi)*ndtr(-b/a)*b*(
+            1-c*bs*(1-d*bs)/3
+        ),
+        0.0
+    )
+
+    a = a[:, None]/2
+    xs = (a*_bvnNodes)**2
+    exponent = -(bs[:, None]/xs+hk[:, None])/2
+    sp = 1+c[:, None]*xs*(1+5*d[:, None]*xs)
+    rs = np.sqrt(1-xs)
+    ep = np.exp(-(hk[:, None]/2)*xs/(1+rs)**2)/rs
+    terms = np.where(
+        exponent > -100, np.exp(np.maximum(exponent, -100))*(sp-ep), 0.0
+    )
+
+    return (a[:, 0]*terms.dot(_bvnWeights)-bvn)/(2*np.pi)
+
+#Gauss-Legendre rules on (0, 1), the 20 point rule for well conditioned 
+#correlations, and 10 point panels, halving towards 1, for the rest
+_tvnEdges = np.concatenate([1-0.5**np.arange(11), [1.0]])
+(_tvnNodes, _tvnWeights) = np.polynomial.legendre.leggauss(10)
+_tvnRules = [
+    (_bvnNodes/2, _bvnWeights/2),
+    (
+        (
+            _tvnEdges[:-1, None]+
+            np.diff(_tvnEdges)[:, None]*(_tvnNodes+1)/2
+        ).ravel(),
+        (np.diff(_tvnEdges)[:, None]*_tvnWeights/2).ravel(),
+    ),
+]
+
+def _tvnl(h, correl):
+    '''
+    P(X < h), for a standard trivariate normal, with Plackett's reduction, 
+    for *shape=(M,3)* arrays of limits and (r21, r31, r32) correlations. 
+    The infinite limits are clipped, at +-40 the normal probabilities are 
+    0 or 1 in double precision.
+    '''
+    h = np.clip(h, -40, 40)
+    corr = np.empty([h.shape[0], 3, 3])
+    corr[:] = np.eye(3)
+    for (i, j, c) in ((1, 0, 0), (2, 0, 1), (2, 1, 2)):
+        corr[:, i, j] = corr[:, j, i] = correl[:, c]
+
+    #the variable left out of the most correlated pair goes first
+    order = np.array([[2, 0, 1], [1, 0, 2], [0, 1, 2]])[
+        abs(correl).argmax(1)
+    ]
+    rows = np.arange(h.shape[0])[:, None]
+    h = h[rows, order].T
+    corr = corr[rows[:, :, None], order[:, :, None], order[:, None, :]]
+    r = np.array([corr[:, 0, 1], corr[:, 0, 2], corr[:, 1, 2]])
+
+    total = ndtr(h[0])*_bvnu(-h[1], -h[2], r[2])
+
+    #near singular correlations make the integrand steep near t=1
+    steep = 1-(r*r).sum(0)+2*r.prod(0) < 0.1
+    for (group, (nodes, weights)) in zip((~steep, steep), _tvnRules):
+        if group.any():
+            total[group] += _plackett(h[:, group], r[:, group], nodes, weights)
+
+    return np.clip(total, 0, 1)
+
+def _plackett(h, r, nodes, weights):
+    '''
+    the integral part of `_tvnl`, along r12 and r13, for *shape=(3,M)* 
+    limits and (r12, r13, r23) correlations, with the given rule on (0, 1)
+    '''
+    h1 = h[0][:, None]
+    rjk = r[2][:, None]
+
+    total = 0
+    for (j, k) in ((1, 2), (2, 1)):
+        (hj, hk, r1j, r1k) = (
+            h[j][:, None], h[k][:, None], r[j-1][:, None], r[k-1][:, None]
+        )
+
+        #r1j*t = sin(theta), which removes the 1/sqrt(1-(r1j*t)**2)
+        top = np.arcsin(r1j)
+        u = np.sin(top*nodes)
+        t = np.where(r1j == 0, 0.0, u/np.where(r1j == 0, 1.0, r1j))
+        s = 1-u*u
+
+        #the third variable, given the other two, at correlation t
+        b1 = (t*r1k-u*rjk)/s
+        bj = (rjk-u*t*r1k)/s
+        var = np.maximum(1-b1*t*r1k-bj*rjk, 0)
+        diff = hk-b1*h1-bj*hj
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = np.where(var > 0, diff/np.sqrt(var), np.sign(diff)*np.inf)
+
+        f = np.exp(-(h1*h1-2*u*h1*hj+hj*hj)/(2*s))*ndtr(c)
+        total = total+f.dot(weights)*top[:, 0]/(2*np.pi)
+
+    return total
+
+def mvstdnormcdfs(
+    lowers, uppers, corrcoef, maxpts=None, workers=None, method='genz', 
+    **kwds
+):
+    '''standardized multivariate normal probabilities for a batch of boxes
+
+    Like `mvstdnormcdf`, but for K boxes that share one correlation matrix. 
+    The correlation is prepared once for the whole batch, and the boxes can 
+    be spread over a pool of processes. This doesn't raise `MvnDstError`, 
+    the error estimates and status codes are returned instead. Two and 
+    three dimensional boxes are exact, unless the method is 'mvndst', the 
+    errors are zero.
+
+    Parameters
+    ----------
+    lowers, uppers : array_like, 2d
+       *shape=(K,n)*, the limits of each box, can contain -np.inf or 
+       np.inf for open intervals
+    corrcoef : float or array_like
+       the correlation, see `flatcorr`
+    maxpts : int
+       maximum number of function values for each box
+    workers : int
+       the number of processes to use, None (the default) does all the 
+       work in this process
+    method : str
+       'genz' (the default) uses `genzcdf`, 'mvndst' calls the Fortran 
+       routine once per box
+    optional keyword parameters, abseps, releps (and maxtime, for genz), 
+    are passed on
+
+    Returns
+    -------
+    values, errors, informs : ndarray, 1d
+       the probability, its estimated absolute error (99% confidence), and 
+       the mvndst status code, for each box
+
+    >>> corr = [[1.0, 0, 0.5],[0,1,0],[0.5,0,1]]
+    >>> lowers = [[-np.inf,-np.inf,-100.0], [-np.inf,-np.inf,-np.inf]]
+    >>> uppers = [[0.0, 0.0, 0.0], [np.inf, np.inf, np.inf]]
+    >>> values, errors, informs = mvstdnormcdfs(
+    ...     lowers, uppers, corr, abseps=1e-5
+    ... )
+    >>> assert abs(values-[1.0/6, 1.0]).max() < 2e-5
+    >>> assert (errors < 1e-5).all() and not informs.any()
+    '''
+    lowers = np.atleast_2d(np.asarray(lowers, dtype=float))
+    uppers = np.atleast_2d(np.asarray(uppers, dtype=float))
+    (lowers, uppers) = np.broadcast_arrays(lowers, uppers)
+
+    n = lowers.shape[1]
+    if method == 'genz':
+        correl = fullcorr(corrcoef, n)
+    else:
+        assert method == 'mvndst', 'unknown method: %r' % method
+        assert mvndst is not None, 'mvndst is not available'
+        correl = flatcorr(corrcoef, n)
+
+    if n in (2, 3) and method != 'mvndst':
+        count = lowers.shape[0]
+        return (
+            _exact(lowers, uppers, correl), 
+            np.zeros(count), 
+            np.zeros(count, dtype=int),
+        )
+
+    if maxpts is None:
+        maxpts = 10000*n
+
+    task = (method, lowers, uppers, correl, maxpts, kwds)
+
+    if workers is None or lowers.shape[0] < 2:
+        return _boxes(task)
+
+    import multiprocessing
+
+    slices = np.array_split(np.arange(lowers.shape[0]), 2*workers)
+    tasks = [
+        (method, lowers[part], uppers[part], correl, maxpts, kwds)
+        for part in slices if part.size
+    ]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_boxes, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def _boxes(task):
+    '''
+    runs a batch of boxes, used by `mvstdnormcdfs`. This is a module level 
+    function, so it can be sent to a process pool.
+    '''
+    (method, lowers, uppers, correl, maxpts, kwds) = task
+
+    if method == 'genz':
+        return genzcdf(lowers, uppers, correl, maxpts=maxpts, **kwds)
+
+    infins = limitflags(lowers, uppers)
+
+    count = lowers.shape[0]
+    values = np.empty(count)
+    errors = np.empty(count)
+    informs = np.empty(count, dtype=int)
+
+    for k in xrange(count):
+        (errors[k], values[k], informs[k]) = mvndst(
+            lowers[k], uppers[k], infins[k], correl, maxpts, **kwds
+        )
+
+    return (values, errors, informs)
+
+
+def genzcdf(
+    lowers, uppers, corr, abseps=1e-6, releps=1e-6, maxpts=None, 
+    maxtime=None, shifts=8
+):
+    '''standardized multivariate normal probabilities, in numpy
+
+    Genz's separation of variables algorithm, integrated with a randomized 
+    quasi-Monte Carlo lattice, for a batch of K boxes that share one 
+    correlation matrix. The same points are used for all the boxes, and 
+    each step of the integrand is one vector operation over every box and 
+    point at once.
+
+    The variables of each box are reordered, so the ones with the 
+    smallest expected probability come first (Genz and Bretz), that 
+    moves most of the variation into the outer integrals, where the 
+    lattice does best. The points are a Korobov lattice, with a baker's 
+    transform, repeated with independent random shifts. The spread of the 
+    shifted estimates gives the error estimate. The lattice size is 
+    roughly doubled, for the boxes that haven't met their tolerance, 
+    until the point or time budget is used up, and the estimates of each 
+    size are combined by their inverse variance.
+
+    There is no limit on the number of dimensions, and nothing is raised 
+    if the tolerance isn't met, that box's inform is set to 1.
+
+    Parameters
+    ----------
+    lowers, uppers : array_like, 2d
+       *shape=(K,n)*, the limits of each box, lowers <= uppers, they can 
+       contain -np.inf or np.inf for open intervals
+    corr : array_like, 2d
+       *shape=(n,n)*, the correlation matrix, it may be singular
+    abseps, releps : float
+       the absolute and relative error tolerances
+    maxpts : int
+       the maximum number of integrand evaluations for each box, the 
+       default is 10000*n
+    maxtime : float
+       stop adding points after this many seconds
+    shifts : int
+       the number of independent random shifts of the lattice
+
+    Returns
+    -------
+    values, errors, informs : ndarray, 1d
+       the probability, its estimated absolute error (3 standard errors), 
+       and 1 where the tolerance wasn't met, 0 elsewhere, for each box
+
+    >>> corr = [[1.0, 0, 0.5],[0,1,0],[0.5,0,1]]
+    >>> (values, errors, informs) = genzcdf(
+    ...     [[-np.inf,-np.inf,-100.0]], [[0.0,0.0,0.0]], corr, abseps=1e-5
+    ... )
+    >>> assert abs(values[0]-1.0/6) < 2e-5
+    >>> assert errors[0] < 1e-5 and not informs.any()
+
+    with no correlation it's the product of the one dimensional 
+    probabilities:
+
+    >>> lowers = -np.random.rand(5, 4)
+    >>> uppers = np.random.rand(5, 4)
+    >>> (values, errors, informs) = genzcdf(lowers, uppers, np.eye(4))
+    >>> exact = (ndtr(uppers)-ndtr(lowers)).prod(1)
+    >>> assert (abs(values-exact) <= errors+1e-12).all()
+    '''
+    lowers = np.atleast_2d(np.asarray(lowers, dtype=float))
+    uppers = np.atleast_2d(np.asarray(uppers, dtype=float))
+    (lowers, uppers) = np.broadcast_arrays(lowers, uppers)
+    corr = np.asarray(corr, dtype=float)
+
+    (count, n) = lowers.shape
+
+    values = np.ones(count)
+    errors = np.zeros(count)
+    informs = np.zeros(count, dtype=int)
+
+    if not n or not count:
+        return (values, errors, informs)
+
+    if n == 1:
+        values = ndtr(uppers[:, 0])-ndtr(lowers[:, 0])
+        return (values, errors, informs)
+
+    if maxpts is None:
+        maxpts = 10000*n
+
+    started = time.time()
+
+    (factor, lowers, uppers) = _reorder(lowers, uppers, corr)
+
+    #each step of the integrand only needs the limits, and the row of the 
+    #factor, divided by the diagonal
+    diagonal = factor[:, np.arange(n), np.arange(n)]
+    factor = factor/diagonal[:, :, None]
+    lowers = lowers/diagonal
+    uppers = uppers/diagonal
+
+    size = 2**6
+    used = 0
+    weights = np.zeros(count)
+    sums = np.zeros(count)
+    active = np.arange(count)
+
+    while active.size:
+        lattice = _lattice(_primeBelow(size), n-1)
+        if used and used+shifts*lattice.shape[0] > maxpts:
+            break
+
+        offsets = np.random.rand(shifts, 1, n-1)
+        points = abs(2*((lattice+offsets) % 1.0)-1).reshape([-1, n-1])
+
+        #keep the work arrays to about 2**20 values
+        group = max(1, 2**20//(points.shape[0]*n))
+        estimates = np.empty([active.size, shifts])
+        for start in xrange(0, active.size, group):
+            part = active[start:start+group]
+            estimates[start:start+group] = _sov(
+                factor[part], lowers[part], uppers[part], points
+            ).reshape([part.size, shifts, -1]).mean(-1)
+
+        used += points.shape[0]
+
+        #combine with the earlier rounds, weighted by inverse variance
+        variance = np.maximum(estimates.var(1, ddof=1)/shifts, 1e-300)
+        weights[active] += 1/variance
+        sums[active] += estimates.mean(1)/variance
+
+        values[active] = sums[active]/weights[active]
+        errors[active] = 3/np.sqrt(weights[active])
+
+        done = errors[active] <= np.maximum(abseps, releps*abs(values[active]))
+        active = active[~done]
+
+        if maxtime is not None and time.time()-started > maxtime:
+            break
+
+        size *= 2
+
+    informs[active] = 1
+
+    return (values, errors, informs)
+
+def _sov(factor, lowers, uppers, points):
+    '''
+    the separation of variables integrand, for K boxes at P points
+
+    factor : *shape=(K,n,n)*, each box's reordered cholesky factor, with 
+        each row divided by its diagonal
+    lowers, uppers : *shape=(K,n)*, the reordered limits, also divided by 
+        the diagonal
+    points : *shape=(P,n-1)*, in the unit cube
+
+    returns *shape=(K,P)*
+    '''
+    n = lowers.shape[1]
+    tiny = np.finfo(float).eps
+
+    low = ndtr(lowers[:, :1])
+    high = ndtr(uppers[:, :1])
+    result = np.repeat(high-low, points.shape[0], 1)
+    low = np.repeat(low, points.shape[0], 1)
+    width = result.copy()
+
+    ys = np.empty(result.shape+(n-1,))
+    for i in xrange(1, n):
+        ys[:, :, i-1] = ndtri(np.clip(
+            low+points[:, i-1]*width, tiny, 1-tiny
+        ))
+        shift = np.einsum('kpm,km->kp', ys[:, :, :i], factor[:, i, :i])
+
+        low = ndtr(lowers[:, i:i+1]-shift)
+        width = ndtr(uppers[:, i:i+1]-shift)-low
+        result *= width
+
+    return result
+
+def _reorder(lowers, uppers, corr):
+    '''
+    the Genz-Bretz variable prioritization, for each of K boxes: the 
+    variable with the smallest expected probability, given the expected 
+    values of the variables already chosen, goes next. The cholesky factor 
+    of the reordered correlation is built along the way. Returns 
+    (factor, lowers, uppers), reordered, *shape=(K,n,n)*, *(K,n)*, *(K,n)*
+
+    >>> corr = np.array([[1.0, 0.5],[0.5, 1.0]])
+    >>> (factor, low, up) = _reorder(
+    ...     np.array([[-1.0, -0.1]]), np.array([[1.0, 0.1]]), corr
+    ... )
+    >>> assert (low == [[-0.1, -1.0]]).all()
+    >>> assert np.allclose(np.dot(factor[0], factor[0].T), corr[::-1, ::-1])
+    '''
+    (count, n) = lowers.shape
+    boxes = np.arange(count)
+
+    lowers = lowers.copy()
+    uppers = uppers.copy()
+    corr = np.repeat(corr[None, :, :], count, 0)
+    factor = np.zeros([count, n, n])
+    ys = np.zeros([count, n])
+
+    #a zero conditional variance makes the variable a step function
+    tiny = 1e-10
+
+    for i in xrange(n):
+        rest = factor[:, i:, :i]
+        shift = np.einsum('kjm,km->kj', rest, ys[:, :i])
+        var = corr[:, np.arange(i, n), np.arange(i, n)]-(rest**2).sum(-1)
+        std = np.sqrt(np.maximum(var, tiny**2))
+
+        low = (lowers[:, i:]-shift)/std
+        high = (uppers[:, i:]-shift)/std
+        chosen = i+np.argmin(ndtr(high)-ndtr(low), 1)
+
+        for array in (lowers, uppers):
+            array[boxes, i], array[boxes, chosen] = (
+                array[boxes, chosen], array[boxes, i].copy()
+            )
+        for array in (corr, factor):
+            array[boxes, i], array[boxes, chosen] = (
+                array[boxes, chosen], array[boxes, i].copy()
+            )
+        corr[boxes, :, i], corr[boxes, :, chosen] = (
+            corr[boxes, :, chosen], corr[boxes, :, i].copy()
+        )
+
+        pick = chosen-i
+        diagonal = std[boxes, pick]
+        factor[:, i, i] = diagonal
+        factor[:, i+1:, i] = (
+            corr[:, i+1:, i]-
+            np.einsum('kjm,km->kj', factor[:, i+1:, :i], factor[:, i, :i])
+        )/diagonal[:, None]
+
+        #the expected value of the chosen variable, truncated to its limits
+        (low, high) = (low[boxes, pick], high[boxes, pick])
+        mass = ndtr(high)-ndtr(low)
+        density = np.exp(-np.minimum(low**2, 1e300)/2)-np.exp(-np.minimum(high**2, 1e300)/2)
+        middle = np.clip((low+high)/2, -10, 10)
+        ys[:, i] = np.where(
+            mass > tiny, 
+            density/np.sqrt(2*np.pi)/np.where(mass > tiny, mass, 1),
+            middle
+        )
+
+    return (factor, lowers, uppers)
+
+_lattices = {}
+
+def _lattice(size, ndim):
+    '''
+    the points of a Korobov rank-1 lattice rule, *shape=(size,ndim)*, 
+    size should be prime. The generator, (1, a, a**2, ...) mod size, is 
+    the best of a set of candidates, by the P2 criterion (the worst case 
+    error for periodic integrands with square integrable mixed second 
+    derivatives). The rules are cached.
+
+    >>> points = _lattice(61, 3)
+    >>> assert points.shape == (61, 3)
+    >>> assert (points[0] == 0).all() and (points >= 0).all() and (points < 1).all()
+    >>> assert _lattice(61, 3) is points
+    '''
+    key = (size, ndim)
+    if key in _lattices:
+        return _lattices[key]
+
+    index = np.arange(size)[:, None]
+
+    random = np.random.RandomState(size)
+    candidates = random.randint(2, max(3, size-1), max(
+        10, min(100, 2**24//(size*ndim))
+    ))
+
+    best = None
+    for a in candidates:
+        generator = np.ones(ndim, dtype=np.int64)
+        for j in xrange(1, ndim):
+            generator[j] = generator[j-1]*a % size
+
+        points = (index*generator % size)/float(size)
+        criterion = (1+2*np.pi**2*(points**2-points+1.0/6)).prod(1).mean()
+
+        if best is None or criterion < best[0]:
+            best = (criterion, points)
+
+    _lattices[key] = best[1]
+
+    return best[1]
+
+def _primeBelow(limit):
+    '''
+    the largest prime number, not more than limit
+
+    >>> _primeBelow(64)
+    61
+    '''
+    for candidate in xrange(int(limit), 1, -1):
+        if all(candidate % k for k in xrange(2, int(candidate**0.5)+1)):
+            return candidate
@@ -45,14 +45,17 @@ class Plane(object):
         mean = mean if callable(mean) else numpy.array(mean).flatten()[None, :]
         vectors = vectors if callable(vectors) else Matrix(vectors)
 
-        stack=helpers.autoshape([
-            [vectors],
-            [mean   ],
-        ],default= 1)
+        if callable(mean) or callable(vectors):
+            stack=helpers.autoshape([
+                [vectors],
+                [mean   ],
+            ],default= 1)
+
+            (vectors, mean) = (stack[0, 0], stack[1, 0])
         
         #unpack the stack into the object's parameters
-        self.vectors = Matrix(numpy.real_if_close(stack[0, 0]))
-        self.mean    = Matrix(numpy.real_if_close(stack[1, 0]))
+        self.vectors = Matrix(numpy.real_if_close(vectors), copy=False)
+        self.mean    = Matrix(numpy.real_if_close(mean), copy=False)
 
     def __repr__(self):
         """
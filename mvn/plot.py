@@ -1,9 +1,6 @@
 import functools
 
-import pylab
-import matplotlib
-import matplotlib.lines
-import matplotlib.patches 
+#matplotlib is imported where it's used, so importing mvn doesn't load it
 
 import mvn
 import mvn.helpers as helpers
@@ -85,6 +82,7 @@ class Plotter(object):
         vertical   = ['vertical'  , 'v', 'V']
         
         if axis is None:
+            import pylab
             axis = pylab.gca()        
 
         
@@ -112,7 +110,10 @@ class Plotter(object):
             
         plot a :py:meth:`mvn.Mvn.patch`, with axis autoscaling
         """
+        import matplotlib.lines
+
         if axis is None:
+            import pylab
             axis = pylab.gca()
  
         bBox = self.dist.bBox(nstd).array()
@@ -139,6 +140,7 @@ class Plotter(object):
         from mpl_toolkits.mplot3d import Axes3D
 
         if axis is None:
+            import pylab
             axis = pylab.gca(projection = '3d')
             
         assert isinstance(axis, Axes3D)  
@@ -200,6 +202,7 @@ class Plotter(object):
     def _convertAlpha(cls,color,alpha):
 
         if isinstance(color,str):
+            import matplotlib.colors
             colorConverter = matplotlib.colors.ColorConverter()
             color = colorConverter.to_rgb(color)
 
@@ -236,6 +239,9 @@ class Plotter(object):
             'slope' controls how quickly the the alpha drops to zero
             'minalpha' is used to make sure that very large elipses are not invisible.  
         """
+        import matplotlib.lines
+        import matplotlib.patches
+
         shape = self.dist.shape
 
         assert shape[1] == 2,'this method can only produce patches for 2d data'
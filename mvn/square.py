@@ -1,18 +1,53 @@
 #!/usr/bin/env python
 """
-This module contains one function: square
+This module contains the function behind :py:meth:`mvn.Mvn.square`: square,
+and the diagnostics for the paths it can take.
+
+The eigen-decomposition is calculated from a square root of the covariance,
+the vectors scaled by the square-roots of their variances, with a thin SVD,
+instead of forming the covariance and using eigh. That squares the condition
+number, so the small variances of nearly singular distributions lose half
+their digits. There are three paths:
+
+    | **svd** : a thin SVD of the scaled vectors
+    | **qr** : for tall (N >> ndim) inputs, an SVD of the triangular factor
+        from a QR decomposition
+    | **gram** : eigh of the covariance, only used if there is a mix of
+        positive and negative variances, which have no real square root
+
+:py:func:`mvn.square.choose` picks the path, and
+:py:func:`mvn.square.diagnose` times and checks all of them on a given input.
+
+    >>> Q = numpy.linalg.qr(numpy.random.randn(4, 4))[0]
+    >>> var = numpy.array([1, 1e-4, 1e-8, 1e-14])
+    >>> (val, vec) = square(Q.T, var)
+    >>> error = abs(numpy.sort(val)-numpy.sort(var))/numpy.sort(var)
+    >>> assert (error < 1e-6).all()
 """
 
+import time
+
 import numpy
-import scipy
 
 import mvn.helpers as helpers
 from mvn.matrix import Matrix
 
+tall = 4
+"""
+inputs with more than tall times as many vectors as dimensions go through
+the **qr** path...
+"""
+
+small = 2500
+"""
+...unless they have fewer elements than this, then the fixed cost of the
+extra decomposition is more than it saves
+"""
+
 def square(vectors, var=None, full=False):
     """
-    calculates the eigen-vectors and eigen-values of the covariance matrix that 
-    would be produced by multiplying out A.var*numpy.array(A.vectors.H)*A.vectors 
+    calculates the eigen-vectors and eigen-values of the covariance matrix that
+    would be produced by multiplying out A.var*numpy.array(A.vectors.H)*A.vectors
     without necessarily calculating the covariance matrix itself.
 
     It is also setup to handle vectors with infinite variances.
@@ -22,28 +57,40 @@ def square(vectors, var=None, full=False):
         '''if T = A*A.H = B*B.H, then there exists a unitary U s.t. A = B*U'''
 
     http://en.wikipedia.org/wiki/Unitary_matrix
-        '''In mathematics, a unitary matrix is an nxn complex matrix U satisfying 
+        '''In mathematics, a unitary matrix is an nxn complex matrix U satisfying
         the condition U.H*U = I, U*U.H = I'''
 
     *********************************
     A better description for all this is the compact singular value decomposition.
     http://en.wikipedia.org/wiki/Singular_value_decomposition#Compact_SVD
 
-    but here I only need one of the two sets of vectors, so I actually calculate the smaller of 
-    the two possible covariance marixes and, and then it's eigen-stuff.
-    """ 
+    which is what this calculates, on the vectors scaled by the square-roots
+    of the variances. The infinite vectors are handled by projection: an
+    orthonormal basis for their span comes from the SVD of the infinite
+    vectors alone, and that span is projected out of the finite vectors.
+
+    >>> vectors = numpy.random.randn(3, 4)
+    >>> (var, vec) = square(vectors, numpy.array([numpy.inf, 1, 1]))
+    >>> assert numpy.isinf(var).sum() == 1
+    >>> assert abs(vec[:2]*vec[2].H).max() < 1e-12
+    """
+    #the work is all done on plain arrays, the vectors are only wrapped in a
+    #Matrix on the way out
+    vectors = numpy.asarray(vectors)
+
     if var is None:
-        var = numpy.ones(vectors.shape[0]) 
+        var = numpy.ones(vectors.shape[0])
 
-    finite = numpy.isfinite(var) & numpy.isfinite(vectors.asarray()).all(1)  
+    finite = numpy.isfinite(var) & numpy.isfinite(vectors).all(1)
 
     infinite = ~finite
 
     Ivar = numpy.array([])
-    Ivectors = Matrix(numpy.zeros((0, vectors.shape[1])))
+    Ivectors = numpy.zeros((0, vectors.shape[1]))
 
     if infinite.any():
-        #square up the infinite vectors
+        #get an orthonormal basis for the span of the infinite vectors, and
+        #its complement
         #Ivar is unused
 
         (Ivar, Ivectors) = _subSquare(
@@ -55,52 +102,61 @@ def square(vectors, var=None, full=False):
         #take the finite variances and vectors
         var = var[~infinite]
         vectors = vectors[~infinite, :]
-        
+
         small = helpers.approx(Ivar)
-        
+
         Ivar = Ivar[~small]
 
         SIvectors = Ivectors[~small, :]
 
         if vectors.any():
             #revove the component parallel to each infinite vector
-            vectors = vectors-vectors*SIvectors.H*SIvectors            
+            vectors = vectors-numpy.dot(
+                numpy.dot(vectors, SIvectors.conj().T),
+                SIvectors
+            )
         elif var.size :
             num = helpers.approx(var).sum()
-            #gab the extra vectors here, because if the vectors are all zeros eig will fail
+            #gab the extra vectors here, because if the vectors are all zeros
+            #there is nothing to decompose
             vectors = Ivectors[small, :]
             vectors = vectors[:num, :]
 
         Ivectors = SIvectors
-        
+
     if var.size:
         (var, vectors) = _subSquare(vectors, var)
 
     if Ivar.size and var.size:
         #sort the finite variances
-        order = numpy.argsort(abs(var))    
+        order = numpy.argsort(abs(var))
         var = var[order]
         vectors = vectors[order, :]
-        
-        #if there are more vectors than dimensions 
+
+        #if there are more vectors than dimensions
         kill = var.size + Ivar.size - vectors.shape[1]
         if kill>0:
-            #squeeze the vectors with the smallest variances 
+            #squeeze the vectors with the smallest variances
             var = var[kill:]
             vectors = vectors[kill:, :]
-    
+
     return (
         numpy.concatenate((var, numpy.inf*numpy.ones_like(Ivar))),
-        numpy.vstack([vectors, Ivectors])
+        numpy.vstack([vectors, Ivectors]).view(Matrix)
     )
-    
+
 
 def _subSquare(vectors, var, full=False):
     """
-    given a series of vectors, this function calculates:
-        (variances,vectors)=numpy.linalg.eigh(vectors.H*vectors)
-    it's a seperate function because if there are less vectors 
-    than dimensions the process can be accelerated, it just takes some dancing
+    given a series of vectors, and their variances, this function calculates 
+    the eigen-decomposition of the covariance, vectors.H*diag(var)*vectors, 
+    as (variances, vectors), by whichever path :py:func:`mvn.square.choose` 
+    picks. The **svd** and **qr** paths never form the covariance, the 
+    vectors are the right singular vectors of the scaled vectors, see 
+    :py:func:`mvn.square._svdPath`.
+
+    if full is set the result is padded out to a full basis, with zero
+    variances.
 
     it is based on this:
 
@@ -108,47 +164,220 @@ def _subSquare(vectors, var, full=False):
     ...     numpy.random.randint(1,10),numpy.random.randint(1,10),2
     ... )))
     >>> cov = vectors.H*vectors
-    >>> Xcov = vectors*vectors.H 
-    >>> (Xval,Xvec) = numpy.linalg.eigh(Xcov)
-    >>> vec = Xvec.H*vectors
-    >>> assert vec.H*vec == cov
+    >>> (_, sigma, vec) = numpy.linalg.svd(vectors, full_matrices=False)
+    >>> vec = Matrix(vec)
+    >>> assert numpy.multiply(vec.H, sigma**2)*vec == cov
     """
-    vectors = Matrix(vectors)
+    vectors = numpy.asarray(vectors)
     shape = vectors.shape
 
     if not all(shape):
         val = numpy.zeros([0])
         vec = numpy.zeros([0, shape[1]])
         return (val, vec)
-    
-    eig = numpy.linalg.eigh
-
-    if shape[0] >= shape[1] or full or not vectors.any() or (var < 0).any():
-        scaled = Matrix(var[:, None]*numpy.array(vectors))
-        
-        cov = vectors.H*scaled
-        
-        (val, vec) = eig(cov)
-        vec = vec.H
-
-    elif not var.any():
-        cov = vectors.H*vectors
-        (_,vec) = eig(cov)
-        vec = vec.H
-        val = numpy.zeros(vec.shape[0])
-
-    else:
-        scaled = Matrix(scipy.sqrt(var)[:, None]*numpy.array(vectors))
-        Xcov = scaled*scaled.H        
-        #Xcov = var[:,None]*numpy.array(vectors)*vectors.H
-        
-        (_, Xvec) = eig(Xcov)
-        
-        Xscaled = (Xvec.H*scaled)
-        val = helpers.mag2(Xscaled)
-
-        vec = numpy.array(Xscaled)/scipy.sqrt(val[:, numpy.newaxis])
-
-    
+
+    return paths[choose(shape, var)](vectors, var, full)
+
+
+def choose(shape, var):
+    """
+    :param shape: the shape of the vectors
+    :param var: the variances
+
+    pick the name of the path, in :py:data:`mvn.square.paths`, to use
+
+    >>> choose((3, 5), numpy.ones(3))
+    'svd'
+    >>> choose((1000, 5), numpy.ones(1000))
+    'qr'
+    >>> choose((100, 5), numpy.ones(100))
+    'svd'
+    >>> choose((3, 5), numpy.array([1, -1, 1]))
+    'gram'
+    """
+    if (var < 0).any() and (var > 0).any():
+        return 'gram'
+
+    if shape[0] > tall*shape[1] and shape[0]*shape[1] > small:
+        return 'qr'
+
+    return 'svd'
+
+
+def _scale(vectors, var):
+    """
+    return (sign, scaled), where scaled.H*scaled*sign is the covariance.
+
+    All zero variances keep the vectors, so the span is still found.
+    """
+    if not var.any():
+        return (0.0, vectors)
+
+    sign = -1.0 if (var <= 0).all() else 1.0
+
+    return (sign, numpy.sqrt(sign*var)[:, None]*vectors)
+
+
+def _svdPath(vectors, var, full=False):
+    """
+    a thin SVD of the scaled vectors.
+
+    The variances aren't the squared singular values, they're recalculated 
+    along each vector from the unscaled vectors, the way the covariance 
+    would give them, so the rounding of the square roots in the scaling 
+    doesn't come back. Exact inputs give exact variances, like the old eigh 
+    of the covariance did:
+
+    >>> vectors = numpy.array([[-1.0], [1.0]])
+    >>> (val, vec) = _svdPath(vectors, numpy.array([0.5, 0.5]))
+    >>> assert val == 1
+    """
+    (_, scaled) = _scale(vectors, var)
+
+    (_, sigma, vec) = numpy.linalg.svd(scaled, full_matrices=full)
+
+    projected = numpy.dot(vectors, vec[:sigma.size].conj().T)
+    val = (var[:, None]*abs(projected)**2).sum(0)
+    if val.size < vec.shape[0]:
+        val = numpy.concatenate([val, numpy.zeros(vec.shape[0]-val.size)])
+
     return (val, vec)
 
+
+def _qrPath(vectors, var, full=False):
+    """
+    reduce a tall stack of scaled vectors to a triangle, then use an SVD
+    """
+    (sign, scaled) = _scale(vectors, var)
+
+    triangle = numpy.linalg.qr(scaled, mode='r')
+
+    return _svdPath(triangle, sign*numpy.ones(triangle.shape[0]), full)
+
+
+def _gramPath(vectors, var, full=False):
+    """
+    eigh of the covariance matrix, this works for any mix of signs
+    """
+    cov = numpy.dot(vectors.conj().T, var[:, None]*vectors)
+    (val, vec) = numpy.linalg.eigh(cov)
+
+    return (val, vec.conj().T)
+
+
+paths = {
+    'svd': _svdPath,
+    'qr': _qrPath,
+    'gram': _gramPath,
+}
+"""
+the functions that calculate (variances, vectors) from (vectors, variances),
+by name
+"""
+
+
+def update(var, vectors, weights, rows):
+    """
+    :param var: *shape=(rank,)*, the variances of an eigen-decomposition
+    :param vectors: *shape=(rank,ndim)*, its (orthonormal) vectors
+    :param weights: *shape=(k,)*, the variances of the update, any sign
+    :param rows: *shape=(k,ndim)*, the vectors of the update
+
+    rank-k update, or downdate, of an eigen-decomposition. Instead of 
+    squaring the stacked vectors this works in the span of the old vectors 
+    and the new rows, where the covariance is diagonal plus rank k, and 
+    only that *(rank+k,rank+k)* matrix is decomposed.
+
+    >>> (var, vectors) = square(numpy.random.randn(8, 5))
+    >>> rows = numpy.random.randn(2, 5)
+    >>> weights = numpy.array([1.0, 2.0])
+    >>> (newVar, newVectors) = update(var, vectors, weights, rows)
+    >>> (stackVar, stackVectors) = square(
+    ...     numpy.vstack([vectors, rows]), 
+    ...     numpy.concatenate([var, weights])
+    ... )
+    >>> assert Matrix(numpy.sort(newVar)) == numpy.sort(stackVar)
+    >>> assert numpy.multiply(newVectors.H, newVar)*newVectors == (
+    ...     numpy.multiply(stackVectors.H, stackVar)*stackVectors
+    ... )
+    """
+    vectors = numpy.asarray(vectors)
+    rows = numpy.asarray(rows)
+
+    basis = vectors
+    if vectors.shape[0] < vectors.shape[1]:
+        #add an orthonormal basis for the part of the rows outside the span
+        residual = rows-numpy.dot(numpy.dot(rows, vectors.conj().T), vectors)
+        (_, sigma, extra) = numpy.linalg.svd(residual, full_matrices=False)
+
+        scale = max(numpy.sqrt(helpers.mag2(rows).max()), 1.0)
+        basis = numpy.vstack([vectors, extra[~helpers.approx(sigma/scale), :]])
+
+    #the covariance, in that basis
+    coefficients = numpy.dot(rows, basis.conj().T)
+    core = numpy.dot(coefficients.conj().T, weights[:, None]*coefficients)
+
+    diagonal = numpy.arange(var.size)
+    core[diagonal, diagonal] += var
+
+    (val, vec) = numpy.linalg.eigh(core)
+
+    return (val, numpy.dot(vec.conj().T, basis).view(Matrix))
+
+
+def diagnose(vectors, var=None, number=10):
+    """
+    :param vectors: *shape=(N,ndim)*
+    :param var: *shape=(N,)*, defaults to ones
+    :param number: the number of calls to time, for each path
+
+    run every path that applies to the input, and return a dictionary, from
+    the path name to a dictionary of:
+
+        | **seconds** : the best time for one call
+        | **var** : the variances it found
+        | **residual** : the relative (frobenius) error of the covariance
+            rebuilt from the results
+        | **orthogonality** : the largest error in vec*vec.H == eye
+        | **chosen** : if this is the path :py:func:`mvn.square.choose` takes
+
+    >>> report = diagnose(numpy.random.randn(20, 3))
+    >>> sorted(report)
+    ['gram', 'qr', 'svd']
+    >>> assert report['svd']['chosen']
+    >>> assert all(item['residual'] < 1e-12 for item in report.values())
+    """
+    vectors = numpy.asarray(vectors)
+    if var is None:
+        var = numpy.ones(vectors.shape[0])
+    var = numpy.asarray(var, dtype=float)
+
+    cov = numpy.dot(vectors.conj().T, var[:, None]*vectors)
+    scale = numpy.linalg.norm(cov) or 1.0
+
+    chosen = choose(vectors.shape, var)
+
+    names = list(paths) if (var >= 0).all() or (var <= 0).all() else ['gram']
+
+    report = {}
+    for name in names:
+        path = paths[name]
+
+        times = []
+        for _ in range(number):
+            start = time.time()
+            (val, vec) = path(vectors, var)
+            times.append(time.time()-start)
+
+        rebuilt = numpy.dot(vec.conj().T, val[:, None]*vec)
+        gram = numpy.dot(vec, vec.conj().T)
+
+        report[name] = {
+            'seconds': min(times),
+            'var': val,
+            'residual': numpy.linalg.norm(rebuilt-cov)/scale,
+            'orthogonality': abs(gram-numpy.eye(gram.shape[0])).max(),
+            'chosen': name == chosen,
+        }
+
+    return report
@@ -0,0 +1,641 @@
+#! /usr/bin/env python
+"""
+*********************
+Square-Root Mvn Class
+*********************
+
+An :py:class:`mvn.Mvn` that stores an upper triangular square-root of the
+covariance matrix instead of its eigen-decomposition:
+
+    | **mean** : *shape=(1,ndim)*
+    | **factor** : *shape=(rank,ndim)*, upper triangular, with
+        factor.H*factor == cov
+
+The operators that only need a square root keep the factor form:
+
+    | addition is a QR of the stacked factors, or a rank-k update of the 
+        factor if the other side has a low rank
+    | the blend (&) is one QR of a block array
+    | matrix multiplication is a QR of factor*matrix
+
+The eigen-decomposition (**var**, **vectors**) is only calculated, once, the
+first time it is read. Anything the factor form cannot handle (infinite or
+negative variances, planes that do not intersect) falls back to the
+:py:class:`mvn.Mvn` implementation.
+
+    >>> from mvn import Mvn
+    >>> a = SqrtMvn.fromMvn(Mvn.rand(3))
+    >>> b = SqrtMvn.fromMvn(Mvn.rand(3))
+    >>> M = Matrix.randn([3,3])
+    >>>
+    >>> result = (a*M+b) & a
+    >>> assert isinstance(result, SqrtMvn)
+    >>> assert result == (Mvn.fromMvn(a)*M+Mvn.fromMvn(b)) & Mvn.fromMvn(a)
+"""
+
+import numpy
+import scipy.linalg
+
+from mvn import Mvn
+from mvn.matrix import Matrix
+
+
+class SqrtMvn(Mvn):
+    """
+    .. inheritance-diagram:: mvn.squareroot.SqrtMvn
+
+    A multivariate normal distribution, stored as a mean, and an upper
+    triangular square-root of the covariance.
+
+    The constructor takes the same arguments as :py:class:`mvn.Mvn`:
+
+    >>> from mvn import Mvn
+    >>> S = SqrtMvn(vectors=[[1,0],[1,1]], var=[1,2], mean=[1,2])
+
+    but the eigen-decomposition is not calculated until it is used:
+
+    >>> assert S._var is None
+    >>> assert S.factor.H*S.factor == S.cov
+    >>> S.var.shape
+    (2,)
+    >>> assert S._var is not None
+    >>> assert S == Mvn(vectors=[[1,0],[1,1]], var=[1,2], mean=[1,2])
+    """
+
+    #objects built by :py:meth:`mvn.Mvn._fromParts` start without a factor
+    _factor = None
+
+    def __init__(
+        self,
+        vectors=Matrix.eye,
+        var=Matrix.ones,
+        mean=Matrix.zeros,
+        **kwargs
+    ):
+        """
+        see :py:meth:`mvn.Mvn.__init__`
+        """
+        self._factor = None
+        self._var = None
+        self._vectors = None
+
+        Mvn.__init__(self, vectors=vectors, var=var, mean=mean, **kwargs)
+
+    def cannonize(self, square=True, squeeze=True):
+        """
+        if the variances are all finite and positive, replace the
+        eigen-decomposition with a triangular factor, otherwise use
+        :py:meth:`mvn.Mvn.cannonize`
+        """
+        rows = _sqrtRows(self)
+
+        if rows is None:
+            Mvn._cannonize(self, square=square, squeeze=squeeze)
+        else:
+            self._setFactor(_triangular(rows))
+
+    @classmethod
+    def fromFactor(cls, factor, mean=Matrix.zeros):
+        """
+        :param factor: *shape=(M,ndim)*, any matrix where factor.H*factor is the
+            covariance
+        :param mean: *shape=(1,ndim)*
+
+        >>> from mvn import Mvn
+        >>> L = numpy.tril(numpy.random.randn(3,3))
+        >>> S = SqrtMvn.fromFactor(L.T, mean=[1,2,3])
+        >>> assert S == Mvn.fromCov(numpy.dot(L,L.T), mean=[1,2,3])
+        """
+        factor = Matrix(factor)
+
+        if callable(mean):
+            mean = mean([1, factor.shape[1]])
+
+        result = cls.__new__(cls)
+        result.mean = Matrix(numpy.array(mean).reshape([1, -1]))
+        result._setFactor(_triangular(factor))
+
+        return result
+
+    @classmethod
+    def fromMvn(cls, other, mean=None):
+        """
+        :param other: an :py:class:`mvn.Mvn`
+        :param mean: ignored, for compatibility with :py:meth:`mvn.Mvn.fromMvn`
+
+        convert an :py:class:`mvn.Mvn` to a :py:class:`mvn.squareroot.SqrtMvn`
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert S == A
+        >>> assert isinstance(S, SqrtMvn)
+        """
+        if isinstance(other, SqrtMvn):
+            return other.copy(deep=True)
+
+        return cls(mean=other.mean, var=other.var, vectors=other.vectors)
+
+    ############ factor and lazy eigen-decomposition
+    def _raw(self):
+        """
+        the factor rows, with unit variances, if they exist, see
+        :py:meth:`mvn.Mvn._raw`
+        """
+        factor = self._factor
+        if factor is None:
+            return (self.var, self.vectors)
+
+        return (numpy.ones(factor.shape[0]), factor)
+
+    def _unsquared(self):
+        """
+        see :py:meth:`mvn.Mvn._unsquared`
+        """
+        return self._factor is not None
+
+    def _setFactor(self, factor):
+        """
+        switch to the factor form
+        """
+        self._factor = factor
+        self._var = None
+        self._vectors = None
+        self._cache = {}
+
+    def _decompose(self):
+        """
+        calculate the eigen-decomposition from the factor, with an svd
+        """
+        factor = self._factor
+        ndim = factor.shape[1]
+
+        if factor.shape[0]:
+            (_, sigma, vectors) = numpy.linalg.svd(factor, full_matrices=False)
+            var = sigma**2
+            keep = ~self.approx(var)
+        else:
+            var = numpy.zeros(0)
+            vectors = numpy.zeros([0, ndim])
+            keep = numpy.zeros(0, bool)
+
+        self._var = var[keep]
+        self._vectors = Matrix(vectors[keep, :])
+
+    def _getFactor(self):
+        'get the triangular factor, or None if there is no real square root'
+        if self._factor is None:
+            rows = _sqrtRows(self)
+            if rows is None:
+                return None
+            self._factor = _triangular(rows)
+
+        return self._factor
+
+    factor = property(
+        fget=_getFactor,
+        doc="""
+            get the upper triangular square-root of the covariance matrix
+
+            >>> S = SqrtMvn.fromMvn(A)
+            >>> assert S.factor.H*S.factor == A.cov
+            >>> assert S.factor == numpy.triu(S.factor)
+        """
+    )
+
+    def _getVar(self):
+        'get the variances'
+        if self._var is None:
+            self._decompose()
+        return self._var
+
+    def _setVar(self, var):
+        'set the variances'
+        if self._var is None and self._factor is not None:
+            self._decompose()
+        self._var = var
+        self._factor = None
+        self._cache = {}
+
+    var = property(
+        fget=_getVar,
+        fset=_setVar,
+        doc="""
+            the variance asociated with each vector, calculated on first use
+
+            >>> S = SqrtMvn.fromMvn(A)
+            >>> assert Matrix(sorted(S.var)) == sorted(A.var)
+        """
+    )
+
+    def _getVectors(self):
+        'get the vectors'
+        if self._vectors is None:
+            self._decompose()
+        return self._vectors
+
+    def _setVectors(self, vectors):
+        'set the vectors'
+        if self._vectors is None and self._factor is not None:
+            self._decompose()
+        self._vectors = vectors
+        self._factor = None
+        self._cache = {}
+
+    vectors = property(
+        fget=_getVectors,
+        fset=_setVectors,
+        doc="""
+            the unit eigen-vectors, as rows, calculated on first use
+
+            >>> S = SqrtMvn.fromMvn(A)
+            >>> assert S.vectors*S.vectors.H == Matrix.eye
+        """
+    )
+
+    def _getCov(self):
+        'get the covariance matrix'
+        factor = self._factor
+
+        if factor is None:
+            return Mvn._getCov(self)
+
+        return self._memo('cov', lambda self: factor.H*factor)
+
+    def _fullFactor(self):
+        'the factor, if it is set, square, and not singular, otherwise None'
+        factor = self._factor
+
+        if (
+            factor is None or 
+            factor.shape[0] != factor.shape[1] or
+            self.approx(numpy.diag(factor)).any()
+        ):
+            return None
+
+        return factor
+
+    @property
+    def rank(self):
+        """
+        see :py:attr:`mvn.plane.Plane.rank`, a full rank factor doesn't need 
+        the eigen-decomposition
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert S.rank == A.rank
+        """
+        if self._fullFactor() is not None:
+            return self.ndim
+
+        return Mvn.rank.fget(self)
+
+    def pdet(self):
+        """
+        see :py:meth:`mvn.Mvn.pdet`, for a full rank factor it's the square of 
+        the product of the diagonal
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert Matrix(S.pdet()) == A.pdet()
+        """
+        factor = self._fullFactor()
+
+        if factor is None:
+            return Mvn.pdet(self)
+
+        return self._memo(
+            'pdet', 
+            lambda self: abs(numpy.diag(factor).prod())**2
+        )
+
+    def logPdet(self):
+        """
+        see :py:meth:`mvn.Mvn.logPdet`, for a full rank factor it's twice the 
+        sum of the logs of its diagonal
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert Matrix(S.logPdet()) == A.logPdet()
+        """
+        factor = self._fullFactor()
+
+        if factor is None:
+            return Mvn.logPdet(self)
+
+        return self._memo(
+            'logPdet',
+            lambda self: 2*numpy.log(abs(numpy.diag(factor))).sum()
+        )
+
+    def _calculateWhitener(self):
+        """
+        with a full rank factor the whitener is its inverse, one triangular 
+        solve, and the eigen-decomposition is never calculated, see 
+        :py:meth:`mvn.Mvn._whitener`
+
+        >>> S = SqrtMvn.fromMvn(Mvn.rand(3))
+        >>> data = Matrix.randn([10, 3])
+        >>> logpdf = S.logpdf(data)
+        >>> assert S._var is None
+        >>> assert Matrix(logpdf) == Mvn.fromMvn(S).logpdf(data)
+        """
+        factor = self._fullFactor()
+
+        if factor is None:
+            return Mvn._calculateWhitener(self)
+
+        whitener = scipy.linalg.solve_triangular(
+            numpy.asarray(factor), numpy.eye(self.ndim)
+        )
+
+        return (numpy.ascontiguousarray(whitener), None)
+
+    def freeze(self):
+        """
+        see :py:meth:`mvn.Mvn.freeze`, this fills in both the factor and the 
+        eigen-decomposition first.
+
+        >>> S = SqrtMvn.fromMvn(A).freeze()
+        >>> assert S.factor.H*S.factor == S.cov == A.cov
+        """
+        self.factor
+
+        return Mvn.freeze(self)
+
+    cov = property(
+        fget=_getCov,
+        fset=Mvn.__dict__['cov'].fset,
+        doc="""
+            get or set the covariance matrix
+
+            >>> S = SqrtMvn.fromMvn(A)
+            >>> assert S.cov == A.cov
+            >>> assert S._var is None
+        """
+    )
+
+    ############ operators
+    def __and__(self, other):
+        """
+        :param other:
+
+        self & other
+
+        the blend is done with one QR decomposition of the array:
+
+            | [[R2, 0 ],
+            |  [R1, R1]]
+
+        where R1 and R2 are the factors of self and other. The triangular
+        result holds the factor of the sum of the covariances, the gain, and
+        the factor of the result.
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> T = SqrtMvn.fromMvn(B)
+        >>> assert S & T == A & B
+        >>> assert (S & T)._var is None
+
+        the same cases as the :py:class:`mvn.Mvn` blend are handled, falling
+        back to its implementation where needed:
+
+        >>> L1=SqrtMvn(mean=[1,0],vectors=[0,1],var=numpy.inf)
+        >>> L2=SqrtMvn(mean=[0,1],vectors=[1,0],var=numpy.inf)
+        >>> assert (L1&L2).mean==[1,1]
+        >>> assert (L1&L2).var.size==0
+        """
+        R1 = _sqrtRows(self)
+        R2 = _sqrtRows(other)
+
+        ndim = self.ndim
+
+        if R1 is None or R2 is None or R1.shape[0]+R2.shape[0] < ndim:
+            return Mvn.__and__(self, other)
+
+        R1 = numpy.asarray(R1)
+        R2 = numpy.asarray(R2)
+
+        pre = numpy.vstack([
+            numpy.hstack([R2, numpy.zeros_like(R2)]),
+            numpy.hstack([R1, R1]),
+        ])
+        post = numpy.linalg.qr(pre, mode='r')
+
+        total = post[:ndim, :ndim]
+        gain = post[:ndim, ndim:]
+        factor = post[ndim:, ndim:]
+
+        diagonal = abs(numpy.diag(total))
+        if (diagonal <= self.rtol*diagonal.max()).any():
+            #the sum of the covariances is singular
+            return Mvn.__and__(self, other)
+
+        delta = numpy.asarray(other.mean-self.mean).T
+        whitened = scipy.linalg.solve_triangular(total, delta, trans='T')
+
+        return type(self).fromFactor(
+            factor,
+            mean=self.mean+numpy.dot(whitened.T, gain),
+        )
+
+    def _addSqrt(self, other):
+        """
+        :param other:
+
+        self+other, with a QR decomposition of the stacked factors
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> T = SqrtMvn.fromMvn(B)
+        >>> assert S+T == A+B
+        >>> assert (S+T)._var is None
+        >>> assert S+A == A+A
+
+        A square factor is updated in place of the QR when the other side 
+        has a low rank (see :py:attr:`mvn.Mvn.lowRank`), one row at a time,
+        in *O(ndim**2)* each. That includes downdates, where the other side's 
+        variances are all negative, so long as the result stays positive 
+        definite:
+
+        >>> S = SqrtMvn.fromMvn(Mvn.rand(10))
+        >>> noise = Mvn(vectors=Matrix.randn([2, 10]), var=[0.5, 2])
+        >>> assert (S+noise)._var is None
+        >>> assert S+noise == Mvn.fromMvn(S)+noise
+        >>> assert (S+noise)+(-1*noise) == S
+        """
+        for (big, small) in [(self, other), (other, self)]:
+            factor = getattr(big, '_factor', None)
+            if factor is None or factor.shape[0] != factor.shape[1]:
+                continue
+
+            (var, vectors) = small._raw()
+
+            if not (
+                0 < var.size <= self.lowRank*factor.shape[0] and
+                numpy.isfinite(var).all() and
+                ((var > 0).all() or (var < 0).all())
+            ):
+                continue
+
+            factor = _update(
+                factor,
+                numpy.sqrt(abs(var))[:, None]*numpy.asarray(vectors),
+                downdate=var[0] < 0,
+            )
+
+            if factor is not None:
+                result = type(self).__new__(type(self))
+                result.mean = self.mean+other.mean
+                result._setFactor(factor)
+
+                return result
+
+        R1 = _sqrtRows(self)
+        R2 = _sqrtRows(other)
+
+        if R1 is None or R2 is None:
+            return Mvn._addMvn(self, other)
+
+        return type(self).fromFactor(
+            numpy.vstack([R1, R2]),
+            mean=self.mean+other.mean,
+        )
+
+    def _matrixMul(self, matrix):
+        """
+        :param matrix:
+
+        self*matrix, with a QR decomposition of factor*matrix
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert S*M == A*M
+        >>> assert (S*M)._var is None
+        """
+        factor = self._factor
+
+        if factor is None:
+            return Mvn._matrixMul(self, matrix)
+
+        return type(self).fromFactor(
+            factor*matrix,
+            mean=self.mean*matrix,
+        )
+
+    def _scalarMul(self, scalar):
+        """
+        :param scalar:
+
+        self*scalar, scalar*self
+
+        positive scalars scale the factor by their square-root
+
+        >>> S = SqrtMvn.fromMvn(A)
+        >>> assert S*K1 == A*K1
+        >>> assert (S*3)._var is None
+        """
+        factor = self._factor
+
+        if factor is None or not numpy.isreal(scalar) or scalar < 0:
+            return Mvn._scalarMul(self, scalar)
+
+        scalar = numpy.real(scalar)
+
+        return type(self).fromFactor(
+            factor*numpy.sqrt(scalar),
+            mean=scalar*self.mean,
+        )
+
+
+def _sqrtRows(mvn):
+    """
+    :param mvn: an :py:class:`mvn.Mvn`
+
+    get rows whose product, rows.H*rows, is the covariance matrix, or None if
+    that needs infinite or imaginary values
+    """
+    if isinstance(mvn, SqrtMvn) and mvn._factor is not None:
+        return mvn._factor
+
+    var = numpy.asarray(mvn.var)
+
+    if not (numpy.isfinite(var) & (var >= 0)).all():
+        return None
+
+    return Matrix(numpy.multiply(numpy.sqrt(var)[:, None], mvn.vectors))
+
+
+def _update(factor, rows, downdate=False):
+    """
+    :param factor: *shape=(ndim,ndim)*, upper triangular
+    :param rows: *shape=(k,ndim)*
+    :param downdate: subtract the rows' product, instead of adding it
+
+    get the upper triangular factor of factor.H*factor +/- rows.H*rows, one
+    row at a time. Returns None if a downdate leaves the result indefinite.
+
+    An update is a row inserted into a QR decomposition of the factor. For 
+    a downdate, with factor.H*p == row, and a == (1-sqrt(1-p.H*p))/(p.H*p):
+
+        | (I-a*p*p.H)**2 == I-p*p.H
+
+    so the new factor is the triangle from the QR of factor-a*p*row, a rank 
+    one update.
+
+    >>> factor = numpy.triu(numpy.random.randn(4, 4))+3*numpy.eye(4)
+    >>> rows = numpy.random.randn(2, 4)
+    >>> up = _update(factor, rows)
+    >>> assert Matrix(numpy.dot(up.T, up)) == (
+    ...     numpy.dot(factor.T, factor)+numpy.dot(rows.T, rows)
+    ... )
+    >>> assert Matrix(_update(up, rows, downdate=True)) == numpy.triu(
+    ...     _update(up, rows, downdate=True)
+    ... )
+    >>> down = _update(up, rows, downdate=True)
+    >>> assert Matrix(numpy.dot(down.T, down)) == numpy.dot(factor.T, factor)
+    >>> assert _update(factor, 10*factor[:1], downdate=True) is None
+    """
+    factor = numpy.asarray(factor)
+    ndim = factor.shape[0]
+
+    for row in numpy.asarray(rows):
+        eye = numpy.eye(ndim)
+
+        if not downdate:
+            (_, factor) = scipy.linalg.qr_insert(
+                eye, factor, row, ndim, 'row', check_finite=False
+            )
+            factor = factor[:ndim]
+            continue
+
+        p = scipy.linalg.solve_triangular(
+            factor, row, trans='T', check_finite=False
+        )
+        norm2 = numpy.dot(p, p)
+        remainder = 1-norm2
+
+        if not numpy.isfinite(remainder) or remainder <= Mvn.rtol:
+            return None
+
+        a = (1-numpy.sqrt(remainder))/norm2 if norm2 else 0.0
+
+        (_, factor) = scipy.linalg.qr_update(
+            eye, factor, -a*p, row, check_finite=False
+        )
+
+    return Matrix(factor)
+
+
+def _triangular(rows):
+    """
+    :param rows: *shape=(M,N)*
+
+    get an upper triangular, *shape=(min(M,N),N)*, matrix with the same
+    rows.H*rows
+    """
+    rows = numpy.asarray(rows)
+
+    if not rows.shape[0]:
+        return Matrix(numpy.zeros([0, rows.shape[1]]))
+
+    return Matrix(numpy.linalg.qr(rows, mode='r'))
+
+
+Mvn.__add__.register(SqrtMvn, SqrtMvn)(SqrtMvn.__dict__['_addSqrt'])
+Mvn.__add__.register(SqrtMvn, Mvn)(SqrtMvn.__dict__['_addSqrt'])
+Mvn.__mul__.register(SqrtMvn, Matrix)(SqrtMvn.__dict__['_matrixMul'])
+Mvn.__mul__.register(SqrtMvn)(SqrtMvn.__dict__['_scalarMul'])
+Mvn.__rmul__.register(SqrtMvn)(SqrtMvn.__dict__['_scalarMul'])
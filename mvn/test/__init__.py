@@ -27,7 +27,7 @@ def main(argv = None):
     )
     
     tests = subprocess.Popen(
-        ['nosetests']+args+targets,
+        [sys.executable, '-m', 'mvn.test.doc']+args+targets,
         stdout = tee.stdin,
         stderr = tee.stdin
     )
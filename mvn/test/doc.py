@@ -26,6 +26,10 @@ import cPickle
 import doctest
 import copy
 
+#3rd party
+import nose
+import nose.plugins
+
 def getDocTests(module,fixture=None):
     if fixture is None:
         fixture = {}
@@ -35,3 +39,39 @@ def getDocTests(module,fixture=None):
     
     testCases=doctest.DocTestSuite(module, setUp = setUp)
     return testCases
+
+
+class Fixture(nose.plugins.Plugin):
+    """
+    give each doctest a copy of the objects from :py:mod:`mvn.test.fixture` 
+    (A, B, C...) as globals, so the modules don't have to load them. A 
+    module's own globals, with the same names, are left alone.
+    """
+    name = 'mvn-fixture'
+    enabled = True
+
+    def options(self, parser, env):
+        pass
+
+    def configure(self, options, conf):
+        self.conf = conf
+
+    def beforeTest(self, test):
+        case = getattr(test, 'test', None)
+        if isinstance(case, doctest.DocTestCase):
+            import mvn.test.fixture
+            globs = case._dt_test.globs
+            for (name, value) in mvn.test.fixture.lookup['last'].iteritems():
+                if name not in globs:
+                    globs[name] = copy.deepcopy(value)
+
+
+def main(argv=None):
+    """
+    run nose with the :py:class:`mvn.test.doc.Fixture` plugin
+    """
+    return nose.main(argv=argv, addplugins=[Fixture()])
+
+
+if __name__ == '__main__':
+    main()
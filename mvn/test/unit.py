@@ -4,9 +4,15 @@ import unittest
 import operator
 import cPickle
 import copy
+import os
 import sys
+import json
+import tempfile
+import time
+import subprocess
 
 import numpy
+import scipy.linalg
 import itertools
 
 import mvn
@@ -16,6 +22,7 @@ Mvn = mvn.Mvn
 Matrix = mvn.Matrix
 
 import mvn.helpers as helpers
+import mvn.bench as bench
 
 import mvn.test.fixture as fixture
 
@@ -163,6 +170,220 @@ class densityTester(myTests):
             numpy.exp(-fix.A.entropy(data))
         )
 
+class scoreTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.data = numpy.asarray(fix.A.sample(100))
+
+    def testLogpdf(self):
+        self.assertTrue(
+            Matrix(fix.A.logpdf(self.data)) == -fix.A.entropy(self.data)
+        )
+
+        # far out in the tails the density underflows, the log doesn't 
+        far = self.data*1e4
+        self.assertTrue(numpy.isfinite(fix.A.logpdf(far)).all())
+
+    def testChunks(self):
+        out = numpy.empty(self.data.shape[0])
+        self.assertTrue(fix.A.mah2(self.data, out=out, chunkSize=7) is out)
+        self.assertTrue(Matrix(out) == fix.A.mah2(self.data))
+
+        chunks = fix.A.logpdf(iter(numpy.array_split(self.data, 9)))
+        self.assertTrue(
+            Matrix(numpy.concatenate(list(chunks))) == 
+            fix.A.logpdf(self.data)
+        )
+
+        chunks = iter(numpy.array_split(self.data, 9))
+        self.assertTrue(
+            Matrix(fix.A.logpdf(chunks, out=out)) == fix.A.logpdf(self.data)
+        )
+
+    def testMemmap(self):
+        with tempfile.NamedTemporaryFile() as f:
+            mapped = numpy.memmap(f.name, float, 'w+', shape=self.data.shape)
+            mapped[:] = self.data
+            mapped.flush()
+
+            mapped = numpy.memmap(f.name, float, 'r', shape=self.data.shape)
+            self.assertTrue(
+                Matrix(fix.A.logpdf(mapped, chunkSize=17)) ==
+                fix.A.logpdf(self.data)
+            )
+
+    def testMany(self):
+        mvns = [fix.A, fix.B, fix.C, mvn.SqrtMvn.fromMvn(fix.A)]
+        scores = Mvn.logpdfMany(mvns, self.data, chunkSize=17)
+
+        self.assertTrue(scores.shape == (self.data.shape[0], len(mvns)))
+        for (column, item) in zip(scores.T, mvns):
+            self.assertTrue(Matrix(column) == item.logpdf(self.data))
+
+        stack = mvn.MvnArray.fromMvns([fix.A, fix.C])
+        self.assertTrue(
+            Matrix(Mvn.logpdfMany(stack, self.data)) == 
+            -stack.entropy(self.data).T
+        )
+
+    def testLogLikelihood(self):
+        weights = numpy.random.rand(self.data.shape[0])
+        self.assertTrue(
+            Matrix(fix.A.logLikelihood(self.data, weights)) == 
+            numpy.dot(weights, numpy.log(fix.A.density(self.data)))
+        )
+
+        # in many dimensions the pdet underflows, its log doesn't
+        wide = Mvn.eye(200, mean=numpy.zeros(200))*1e-3
+        data = numpy.asarray(wide.sample(10))
+        self.assertTrue(wide.pdet() == 0)
+        self.assertTrue(numpy.isfinite(wide.logLikelihood(data)))
+
+        mixture = mvn.Mixture([wide, wide+Mvn.eye(200)])
+        self.assertTrue(numpy.isfinite(mixture.logpdf(data)).all())
+        self.assertTrue(
+            Matrix(mixture.logLikelihood(data)) == mixture.logpdf(data).sum()
+        )
+
+    def testSqrt(self):
+        S = mvn.SqrtMvn.fromMvn(fix.A)
+        self.assertTrue(
+            Matrix(S.logpdf(self.data)) == fix.A.logpdf(self.data)
+        )
+        self.assertTrue(
+            Matrix(S.mah2(self.data)) == fix.A.mah2(self.data)
+        )
+
+class boxTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.mvn = fix.A[:, :3]
+        mean = numpy.asarray(self.mvn.mean)
+        self.lowers = mean-numpy.random.rand(7, 3)
+        self.uppers = mean+numpy.random.rand(7, 3)
+
+    def testBatch(self):
+        (P, E) = self.mvn.inBox(self.lowers, self.uppers, errors=True)
+        self.assertTrue(P.shape == E.shape == (7,))
+
+        for (p, e, lower, upper) in zip(P, E, self.lowers, self.uppers):
+            self.assertTrue(abs(p-self.mvn.inBox(lower, upper)) < 3*e+1e-6)
+
+        grid = self.mvn.inBox(self.lowers[:, None], self.uppers[None, :])
+        self.assertTrue(grid.shape == (7, 7))
+
+    def testWorkers(self):
+        (P1, E1) = self.mvn.inBox(
+            self.lowers, self.uppers, errors=True, workers=2
+        )
+        (P2, E2) = self.mvn.inBox(self.lowers, self.uppers, errors=True)
+        self.assertTrue((abs(P1-P2) < 3*(E1+E2)+1e-6).all())
+
+    def testSigns(self):
+        (lower, upper) = (self.lowers[0], self.uppers[0])
+        flipped = lower.copy()
+        flipped[0] = upper[0]
+        backwards = upper.copy()
+        backwards[0] = lower[0]
+
+        self.assertTrue(
+            Matrix(self.mvn.inBox(flipped, backwards)) == 
+            -self.mvn.inBox(lower, upper)
+        )
+        self.assertTrue(Matrix(self.mvn.inBox(lower, lower)) == 0)
+
+    def testMeanChange(self):
+        M = self.mvn.copy(deep=True)
+        mean = numpy.asarray(M.mean)
+        width = numpy.asarray(M.width())
+        (lower, upper) = (mean-width, mean+width)
+        (P1, E1) = M.inBox(lower, upper, errors=True)
+
+        M.mean = M.mean+10*M.width()
+        fresh = Mvn(mean=M.mean, vectors=M.vectors, var=M.var)
+        (P2, E2) = M.inBox(lower, upper, errors=True)
+        (P3, E3) = fresh.inBox(lower, upper, errors=True)
+        self.assertTrue(abs(P2-P3) < 3*(E2+E3)+1e-6)
+        self.assertTrue(abs(P1-P2) > 3*(E1+E2))
+
+        N = Mvn(var=numpy.ones(2))
+        self.assertTrue(Matrix(N > [0, 0]) == 0.25)
+        N.mean = N.mean+10
+        self.assertTrue(Matrix(N > [0, 0]) == 1)
+
+    def testOneDimension(self):
+        import scipy.stats
+        a = fix.A[:, 0]
+        dist = scipy.stats.norm(a.mean[0, 0], numpy.sqrt(a.var[0]))
+
+        limits = numpy.sort(numpy.random.randn(5, 2), 1)
+        self.assertTrue(
+            Matrix(a.inBox(limits[:, :1], limits[:, 1:])) ==
+            dist.cdf(limits[:, 1])-dist.cdf(limits[:, 0])
+        )
+
+    def testFlatAxis(self):
+        # no variance along an axis, that axis is just inside or out
+        flat = Mvn(mean=[1, 0], vectors=[0, 1], var=1)
+        self.assertTrue(
+            Matrix(flat.inBox([0, -numpy.inf], [2, 0])) == 0.5
+        )
+        self.assertTrue(Matrix(flat.inBox([2, -numpy.inf], [3, 0])) == 0)
+
+    def wide(self):
+        # five dimensions, past the exact two and three dimensional paths
+        wide = Mvn.rand(5)
+        mean = numpy.asarray(wide.mean)
+        lowers = mean-numpy.random.rand(7, 5)
+        uppers = mean+numpy.random.rand(7, 5)
+        return (wide, lowers, uppers)
+
+    def testMethods(self):
+        (wide, lowers, uppers) = self.wide()
+        (P1, E1) = wide.inBox(lowers, uppers, errors=True, method='genz')
+        (P2, E2) = wide.inBox(lowers, uppers, errors=True, method='mvndst')
+        self.assertTrue((abs(P1-P2) < 3*(E1+E2)+1e-6).all())
+
+    def testExact(self):
+        for ndim in (2, 3):
+            # well conditioned, so mvndst's error estimates hold
+            small = Mvn.rand(ndim)+Mvn(var=numpy.ones(ndim))
+            mean = numpy.asarray(small.mean)
+            lowers = mean-numpy.random.rand(7, ndim)
+            uppers = mean+numpy.random.rand(7, ndim)
+            lowers[0, 0] = -numpy.inf
+
+            (P1, E1) = small.inBox(lowers, uppers, errors=True)
+            (P2, E2) = small.inBox(
+                lowers, uppers, errors=True, method='mvndst'
+            )
+            self.assertTrue((E1 == 0).all())
+            self.assertTrue((abs(P1-P2) < 3*E2+1e-7).all())
+            self.assertTrue((small.inBox(lowers, uppers) == P1).all())
+
+    def testHighDimension(self):
+        # past mvndst's 500 dimension limit, with no correlation the 
+        # probability is the product of the one dimensional probabilities
+        import scipy.special
+        ndim = 600
+        wide = Mvn(mean=numpy.zeros(ndim), var=numpy.ones(ndim))
+        upper = 3+numpy.random.rand(ndim)
+        (P, E) = wide.inBox(-upper, upper, errors=True, maxpts=2**12)
+        exact = (2*scipy.special.ndtr(upper)-1).prod()
+        self.assertTrue(abs(P-exact) < 3*E+1e-6)
+
+    def testBudget(self):
+        # a budget that's too small doesn't raise, the error says so
+        (wide, lowers, uppers) = self.wide()
+        (P, E) = wide.inBox(
+            lowers, uppers, errors=True, maxpts=64, abseps=1e-12
+        )
+        self.assertTrue((E > 0).all() and numpy.isfinite(P).all())
+
+        started = time.time()
+        wide.inBox(lowers, uppers, abseps=1e-12, maxtime=0.1)
+        self.assertTrue(time.time()-started < 5)
+
 class equalityTester(myTests):
     def testEq(self):
         # always equal if same object
@@ -798,6 +1019,20 @@ class blendTester(myTests):
         self.assertTrue( (L1&L2).var == 1 )
         self.assertTrue( (L1&L2).vectors == [1, 0] )
 
+    def testFuse(self):
+        abc = list(numpy.random.permutation([fix.A, fix.B, fix.C]))
+        self.assertTrue( Mvn.fuse(abc) == fix.A & fix.B & fix.C )
+        self.assertTrue( Mvn.fuse(abc) == reduce(operator.and_, abc) )
+
+        sensors = [Mvn.rand(fix.ndim) for n in range(30)]
+        self.assertTrue( Mvn.fuse(sensors) == reduce(operator.and_, sensors) )
+
+    def testFuseFlatInfinite(self):
+        L1 = Mvn(mean=[1, 2, 3], vectors=[[1, 0, 0], [0, 1, 0]], var=[1, numpy.inf])
+        L2 = Mvn.eye(3, mean=[5, 7, 11])
+        self.assertTrue( Mvn.fuse([L1, L2]).mean == [3, 7, 3] )
+        self.assertTrue( Mvn.fuse([L1, L2]) == L1 & L2 )
+
 class quadTester(myTests):
     def testDerivation(self):
         Na = 25
@@ -996,13 +1231,86 @@ class quadTester(myTests):
             4*(A*A.mean.H).trace()
         )
 
+        Q = A.quad()
+        self.assertTrue( Matrix(Q.mean) == A.mean*A.mean.H + A.trace() )
         self.assertTrue(
-            A.quad() ==
-            Mvn(
-                mean= A.mean*A.mean.H + A.trace(),
-                var= 2*(A*A).trace()+4*(A*A.mean.H).trace()
-            )
+            Matrix(Q.var) == 2*(A*A).trace()+4*(A*A.mean.H).trace()
+        )
+
+class chi2Tester(myTests):
+    def testNoncentral(self):
+        import scipy.stats
+        A = Mvn(mean=numpy.random.randn(1, 4), var=2*numpy.ones(4))
+        Q = A.quad()
+        nc = (numpy.asarray(A.mean)**2).sum()/2
+
+        x = numpy.linspace(0.1, 60, 50)
+        self.assertTrue(
+            abs(Q.cdf(x)-scipy.stats.ncx2(4, nc).cdf(x/2)).max() < 1e-10
         )
+        self.assertTrue(
+            abs(Q.sf(x)-scipy.stats.ncx2(4, nc).sf(x/2)).max() < 1e-10
+        )
+
+    def testInverse(self):
+        Q = (Mvn.rand(4)+Mvn(var=numpy.ones(4))).quad()
+        q = numpy.array([1e-9, 0.01, 0.3, 0.5, 0.7, 0.99])
+        self.assertTrue( abs(Q.cdf(Q.ppf(q))-q).max() < 1e-10 )
+        self.assertTrue( abs(Q.sf(Q.isf(q))-q).max() < 1e-11 )
+        self.assertTrue( numpy.diff(Q.ppf(q)).min() > 0 )
+
+    def testSamples(self):
+        N = 20000
+        A = Mvn.rand(3)+Mvn(var=numpy.ones(3))
+        B = Mvn.rand(3)+Mvn(var=numpy.ones(3))
+
+        cases = [
+            (A.quad(), (numpy.asarray(A.sample(N))**2).sum(1)),
+            (A.dist2(B), (numpy.asarray(A.sample(N)-B.sample(N))**2).sum(1)),
+            (A.mah2(B), A.mah2(
+                numpy.asarray(A.sample(N)-B.sample(N)), mean=numpy.zeros(3)
+            )),
+        ]
+
+        M = Matrix.randn([3, 3])
+        samples = numpy.asarray(A.sample(N))
+        cases.append((
+            A.quad(M), (numpy.dot(samples, numpy.asarray(M))*samples).sum(1)
+        ))
+
+        for (Q, samples) in cases:
+            x = numpy.percentile(samples, [5, 25, 50, 75, 95])
+            #the binomial std of the fraction below x is less than 0.004
+            expected = [0.05, 0.25, 0.5, 0.75, 0.95]
+            self.assertTrue( abs(Q.cdf(x)-expected).max() < 0.02 )
+            drawn = Q.sample(N)
+            self.assertTrue( abs(drawn.mean()-Q.mean) < 5*(Q.var/N)**0.5 )
+
+    def testNearlySingular(self):
+        #the thin direction is a tiny weight with a huge noncentrality
+        Q = Mvn(mean=[1, 2, 3.8], var=[1, 2, 1.2e-8]).quad()
+        self.assertTrue( Q.noncentralities.max() > 1e9 )
+
+        x = Q.ppf([0.05, 0.5, 0.95])
+        self.assertTrue( abs(Q.cdf(x)-[0.05, 0.5, 0.95]).max() < 1e-10 )
+        self.assertTrue( abs(Q.cdf(x)-Q._imhof(x, False)).max() < 1e-10 )
+
+    def testRoot(self):
+        N = 20000
+        A = Mvn.rand(3)+Mvn(var=numpy.ones(3))
+        B = Mvn.rand(3)+Mvn(var=numpy.ones(3))
+
+        R = A.mah(B)
+        samples = A.mah(
+            numpy.asarray(A.sample(N)-B.sample(N)), mean=numpy.zeros(3)
+        )
+        x = numpy.percentile(samples, [5, 25, 50, 75, 95])
+        expected = [0.05, 0.25, 0.5, 0.75, 0.95]
+        self.assertTrue( abs(R.cdf(x)-expected).max() < 0.02 )
+        self.assertTrue( Matrix(R.ppf(0.5)**2) == A.mah2(B).ppf(0.5) )
+
+        D = A.dist(B)
+        self.assertTrue( Matrix(D.sf(1.0)) == A.dist2(B).sf(1.0) )
 
 class innerTester(myTests):
     def testDerivation(self):
@@ -1328,6 +1636,545 @@ class refereceTester(myTests):
             assert fix.A & fix.B == wiki(fix.A, fix.B)
 
 
+class lazyTester(myTests):
+    def testChain(self):
+        X = fix.A*fix.M+fix.B*fix.M-fix.C*fix.M
+        self.assertTrue( X.cov == fix.M.H*(fix.A.cov+fix.B.cov-fix.C.cov)*fix.M )
+        self.assertTrue( X.vectors*X.vectors.H == Matrix.eye )
+
+    def testSetState(self):
+        state = dict(
+            mean=fix.A.mean,
+            var=fix.A.var,
+            vectors=fix.A.vectors,
+        )
+        A = Mvn.__new__(Mvn)
+        A.__setstate__(state)
+        self.assertTrue( A == fix.A )
+
+    def testCopy(self):
+        X = fix.A+fix.B
+        Y = X.copy()
+        self.assertTrue( Y.cov == X.cov )
+        self.assertTrue( Y == fix.A+fix.B )
+
+    def testUnshared(self):
+        A = fix.A.copy(deep=True)
+        results = [
+            A*2.0, A*fix.M, A*numpy.ones(A.ndim), A**2, A+fix.B, 
+            Mvn.stack(A, fix.B),
+        ]
+
+        for result in results:
+            (var, vectors) = result._raw()
+            self.assertFalse( numpy.may_share_memory(var, A.var) )
+            self.assertFalse( numpy.may_share_memory(vectors, A.vectors) )
+            self.assertFalse( numpy.may_share_memory(result.mean, A.mean) )
+
+
+class updateTester(myTests):
+    def stacked(self, X, Y):
+        lowRank = Mvn.lowRank
+        Mvn.lowRank = 0
+        try:
+            return Mvn.fromMvn(X)+Mvn.fromMvn(Y)
+        finally:
+            Mvn.lowRank = lowRank
+
+    def testEigen(self):
+        for rank in (8, 5):
+            state = Mvn.rand([rank, 8]).freeze()
+            noise = Mvn(vectors=Matrix.randn([1, 8]), var=2)
+            result = state+noise
+
+            self.assertFalse( result._unsquared() )
+            self.assertTrue( result == self.stacked(state, noise) )
+            self.assertTrue( noise+state == result )
+
+    def testDowndate(self):
+        state = Mvn.rand(8).freeze()
+        noise = Mvn(vectors=Matrix.randn([1, 8]).unit(), var=-0.1)
+        self.assertTrue( state+noise == self.stacked(state, noise) )
+
+    def testFactor(self):
+        state = mvn.SqrtMvn.fromFactor(
+            numpy.triu(numpy.random.randn(8, 8))+3*numpy.eye(8)
+        )
+        noise = Mvn(vectors=Matrix.randn([2, 8]), var=[1, 2])
+
+        result = state+noise
+        self.assertTrue( result._var is None )
+        self.assertTrue( result == self.stacked(state, noise) )
+
+        result = result+(-1*noise)
+        self.assertTrue( result._var is None )
+        self.assertTrue( result == state )
+
+    def testIndefinite(self):
+        state = mvn.SqrtMvn.fromFactor(numpy.eye(8))
+        noise = Mvn(vectors=Matrix.eye(8)[:1], var=-2)
+        self.assertTrue( state+noise == self.stacked(state, noise) )
+
+
+class cacheTester(myTests):
+    def testInvalidate(self):
+        A = fix.A.copy()
+        cov = A.cov
+        self.assertTrue( A.cov is cov )
+
+        A.var = A.var*2
+        self.assertTrue( A.cov == 2*cov )
+        self.assertTrue( fix.A.cov is cov )
+
+    def testReadOnly(self):
+        cov = fix.A.cov
+        self.assertRaises(ValueError, cov.__setitem__, (0, 0), 1)
+
+    def testFreeze(self):
+        A = fix.A.copy().freeze()
+        self.assertRaises(AttributeError, setattr, A, 'var', A.var*2)
+        self.assertRaises(AttributeError, A.copy, fix.B)
+        self.assertTrue( A.width() is A.width() )
+        self.assertTrue( A == fix.A )
+
+        B = A.copy()
+        B.mean += 1
+        self.assertTrue( A == fix.A )
+
+
+class accumulatorTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.data = numpy.array(fix.A.sample(200)).squeeze()
+        self.weights = numpy.random.rand(200)
+
+    def testBatches(self):
+        acc = mvn.MvnAccumulator()
+        for (data, weights) in zip(
+            numpy.array_split(self.data, 9),
+            numpy.array_split(self.weights, 9)
+        ):
+            acc.update(data, weights)
+
+        self.assertTrue(
+            acc.result() == Mvn.fromData(self.data, weights=self.weights)
+        )
+
+    def testMerge(self):
+        accs = [
+            mvn.MvnAccumulator().update(data)
+            for data in numpy.array_split(self.data, 4)
+        ]
+        total = reduce(mvn.MvnAccumulator.merge, accs, mvn.MvnAccumulator())
+
+        self.assertTrue( total.result() == Mvn.fromData(self.data) )
+        self.assertTrue(
+            total.result(bias=False) == Mvn.fromData(self.data, bias=False)
+        )
+
+    def testMvns(self):
+        acc = mvn.MvnAccumulator()
+        acc.update(fix.A, 3)
+        acc.update(fix.B, 2)
+
+        self.assertTrue(
+            acc.result() == Mvn.fromData([fix.A, fix.B], weights=[3, 2])
+        )
+
+    def testChunks(self):
+        chunks = zip(
+            numpy.array_split(self.data, 9),
+            numpy.array_split(self.weights, 9)
+        )
+        self.assertTrue(
+            Mvn.fromData(iter(chunks), bias=False, workers=2) == 
+            Mvn.fromData(self.data, weights=self.weights, bias=False)
+        )
+
+    def testMemmap(self):
+        with tempfile.NamedTemporaryFile() as f:
+            mapped = numpy.memmap(f.name, float, 'w+', shape=self.data.shape)
+            mapped[:] = self.data
+            mapped.flush()
+
+            mapped = numpy.memmap(f.name, float, 'r', shape=self.data.shape)
+            self.assertTrue(
+                Mvn.fromData(mapped, chunkSize=17, workers=2) ==
+                Mvn.fromData(self.data)
+            )
+            self.assertTrue(
+                Mvn.fromData(mapped[5:50], chunkSize=17) ==
+                Mvn.fromData(self.data[5:50])
+            )
+
+
+class mvnArrayTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.mvns = [fix.A, fix.B, fix.C]
+        self.stack = mvn.MvnArray.fromMvns(self.mvns)
+
+    def testRoundTrip(self):
+        for (s, m) in zip(self.stack, self.mvns):
+            self.assertTrue( s == m )
+
+    def testAnd(self):
+        for (s, m) in zip(self.stack & fix.A, self.mvns):
+            self.assertTrue( s == m & fix.A )
+
+    def testAdd(self):
+        for (s, m) in zip(self.stack + fix.B, self.mvns):
+            self.assertTrue( s == m + fix.B )
+
+    def testMul(self):
+        for (s, m) in zip(self.stack*fix.M, self.mvns):
+            self.assertTrue( s == m*fix.M )
+
+    def testMah2(self):
+        data = fix.A.sample(10)
+        for (d, m) in zip(self.stack.mah2(data), self.mvns):
+            self.assertTrue( Matrix(d) == m.mah2(data) )
+
+
+class sqrtMvnTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.sqrt = dict(
+            (name, mvn.SqrtMvn.fromMvn(getattr(fix, name)))
+            for name in 'ABC'
+        )
+
+    def testRoundTrip(self):
+        for (name, S) in self.sqrt.iteritems():
+            self.assertTrue( S == getattr(fix, name) )
+            self.assertTrue( S.cov == getattr(fix, name).cov )
+
+    def testAdd(self):
+        S = self.sqrt
+        self.assertTrue( S['A']+S['B'] == fix.A+fix.B )
+        self.assertTrue( S['A']+S['C'] == fix.A+fix.C )
+        self.assertTrue( S['A']+fix.B == fix.A+fix.B )
+
+    def testAnd(self):
+        S = self.sqrt
+        self.assertTrue( S['A'] & S['B'] == fix.A & fix.B )
+        self.assertTrue( S['A'] & S['C'] == fix.A & fix.C )
+        self.assertTrue( S['B'] & S['A'] == fix.B & fix.A )
+        self.assertTrue( S['A'] & fix.B == fix.A & fix.B )
+
+    def testMul(self):
+        S = self.sqrt
+        self.assertTrue( S['A']*fix.M == fix.A*fix.M )
+        self.assertTrue( S['A']*fix.K1 == fix.A*fix.K1 )
+        self.assertTrue( fix.K1*S['A'] == fix.K1*fix.A )
+
+    def testKalman(self):
+        S = self.sqrt
+        transform = 0.9*fix.E+0.1*Matrix.randn([fix.ndim, fix.ndim])
+        measurements = numpy.random.randn(10, fix.ndim)
+
+        state = fix.A+Mvn.eye(fix.ndim)
+        sqrtState = mvn.SqrtMvn.fromMvn(state)
+        for z in measurements:
+            state = (state*transform + fix.C) & (fix.B + z)
+            sqrtState = (sqrtState*transform + S['C']) & (S['B'] + z)
+
+        self.assertTrue( isinstance(sqrtState, mvn.SqrtMvn) )
+        self.assertTrue( sqrtState == state )
+
+
+class infoMvnTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        self.info = dict(
+            (name, mvn.InfoMvn.fromMvn(getattr(fix, name)))
+            for name in 'ABC'
+        )
+
+    def testRoundTrip(self):
+        for (name, I) in self.info.iteritems():
+            self.assertTrue( I == getattr(fix, name) )
+            self.assertTrue( I.toMvn() == getattr(fix, name) )
+
+            if I.precision is not None:
+                J = mvn.InfoMvn.fromInfo(I.precision, I.info)
+                self.assertTrue( J == getattr(fix, name) )
+
+    def testAnd(self):
+        I = self.info
+        self.assertTrue( I['A'] & I['B'] == fix.A & fix.B )
+        self.assertTrue( I['A'] & I['C'] == fix.A & fix.C )
+        self.assertTrue( I['C'] & fix.A == fix.C & fix.A )
+        self.assertTrue( fix.C & I['A'] == fix.C & fix.A )
+
+    def testFuse(self):
+        sensors = [Mvn.rand(fix.ndim) for n in range(20)]
+        sensors = [item for item in sensors if not item.flat]
+        infos = [mvn.InfoMvn.fromMvn(item) for item in sensors]
+
+        fused = reduce(operator.and_, infos)
+        self.assertTrue( fused._var is None )
+        self.assertTrue( fused == reduce(operator.and_, sensors) )
+
+    def testInfinite(self):
+        I = self.info['C'] & ~self.info['C']
+        self.assertTrue( I.precision == Matrix.zeros )
+        self.assertTrue( I == fix.C & ~fix.C )
+
+        line = Mvn(
+            mean=fix.A.mean,
+            vectors=Matrix.eye(fix.ndim)[1:],
+            var=Matrix.infs,
+        )+Mvn(vectors=Matrix.eye(fix.ndim)[:1])
+        self.assertTrue( self.info['C'] & line == fix.C & line )
+
+    def testGiven(self):
+        I = self.info['C']
+        x = Mvn(mean=[1], var=[2])
+        self.assertTrue( I.given(0, x) == fix.C.given(0, x) )
+        self.assertTrue( I.given(0, 1) == fix.C.given(0, 1) )
+        self.assertTrue( I.given(0) == fix.C.given(0) )
+
+    def testMarginal(self):
+        I = self.info['C']
+        for n in range(fix.ndim):
+            self.assertTrue( I.marginal(n) == fix.C.marginal(n) )
+
+
+class mixtureTester(myTests):
+    def setUp(self):
+        myTests.setUp(self)
+        ndim = fix.A.ndim
+        self.source = mvn.Mixture([
+            Mvn.eye(ndim, mean=-3*numpy.ones(ndim)),
+            Mvn.eye(ndim, mean=3*numpy.ones(ndim)),
+        ])
+        self.data = self.source.sample(300)
+        self.start = mvn.Mixture([
+            Mvn.eye(ndim, mean=-numpy.ones(ndim)),
+            Mvn.eye(ndim, mean=numpy.ones(ndim)),
+        ])
+
+    def testOneStep(self):
+        # one iteration, without regularization, is the plain EM step
+        densities = numpy.array([
+            item.density(self.data) for item in self.start.items
+        ]).T*self.start.weights
+        membership = densities/densities.sum(1)[:, None]
+
+        fitted = self.start.fit(self.data, maxIter=1, reg=0)
+
+        self.assertTrue(
+            Matrix(fitted.weights) == membership.sum(0)/membership.sum()
+        )
+        for (item, column) in zip(fitted.items, membership.T):
+            self.assertTrue(
+                item == Mvn.fit(self.data, weights=column, bias=True)
+            )
+
+    def testConverge(self):
+        fitted = self.start.fit(self.data, tol=1e-8)
+        self.assertTrue(fitted.converged)
+        self.assertTrue((numpy.diff(fitted.history) > -1e-9).all())
+
+        means = sorted(
+            (numpy.asarray(item.mean).ravel() for item in fitted.items),
+            key=lambda mean: mean[0]
+        )
+        for (mean, item) in zip(means, self.source.items):
+            error = mean-numpy.asarray(item.mean).ravel()
+            self.assertTrue(abs(error).max() < 0.5)
+
+    def testWeights(self):
+        # an integer weight is the same as repeating the sample
+        weights = numpy.random.randint(1, 4, self.data.shape[0])
+        repeated = numpy.repeat(self.data, weights, axis=0)
+
+        weighted = self.start.fit(self.data, weights, maxIter=3)
+        plain = self.start.fit(repeated, maxIter=3)
+
+        self.assertTrue(Matrix(weighted.history) == plain.history)
+        for (a, b) in zip(weighted.items, plain.items):
+            self.assertTrue(a == b)
+
+    def testHighDimension(self):
+        # the densities underflow here, the log-densities don't
+        ndim = 400
+        mixture = mvn.Mixture([
+            Mvn.eye(ndim, mean=-numpy.ones(ndim)),
+            Mvn.eye(ndim, mean=numpy.ones(ndim)),
+        ])
+        data = mixture.sample(50)
+        self.assertTrue((mixture.items[0].density(data) == 0).any())
+
+        fitted = mixture.fit(data, maxIter=2)
+        self.assertTrue(numpy.isfinite(fitted.history).all())
+        self.assertTrue(numpy.isfinite(fitted.weights).all())
+
+    def testInPlace(self):
+        mixture = mvn.Mixture(self.start.items, self.start.weights)
+        fitted = self.start.fit(self.data, maxIter=5)
+
+        self.assertTrue(mixture.fit2(self.data, maxIter=5) is mixture)
+        self.assertTrue(Matrix(mixture.weights) == fitted.weights)
+
+    def testMiniBatch(self):
+        numpy.random.seed(0)
+        online = self.start.fit(self.data, batchSize=30, maxIter=10)
+        full = self.start.fit(self.data)
+
+        self.assertTrue(
+            abs(online.history[-1]-full.history[-1]) < 0.1
+        )
+
+
+class kalmanFilterTester(myTests):
+    def testOperatorForm(self):
+        import mvn.filters
+
+        transform = 0.9*fix.E+0.1*Matrix.randn([fix.ndim, fix.ndim])
+        state = fix.A+Mvn.eye(fix.ndim)
+        measurements = numpy.random.randn(20, fix.ndim)
+
+        KF = mvn.filters.KalmanFilter(transform, fix.C, fix.B)
+        (means, covs) = KF.filter(measurements, state)
+
+        for (z, mean, cov) in zip(measurements, means, covs):
+            state = (state*transform + fix.C) & (fix.B + z)
+            self.assertTrue( state == Mvn.fromCov(cov, mean=mean) )
+
+    def testSmooth(self):
+        """
+        compare the smoother to conditioning the dense joint distribution
+        of all the states on all the measurements
+        """
+        steps = 6
+        ndim = fix.ndim
+
+        transform = 0.9*fix.E+0.1*Matrix.randn([ndim, ndim])
+        state = fix.A+Mvn.eye(ndim)
+        sensor = fix.B+Mvn.eye(ndim)
+        measurements = numpy.random.randn(steps, ndim)
+
+        (states, logL) = state.smooth(
+            measurements, transform, fix.C, sensor
+        )
+
+        #column form
+        F = numpy.array(transform.T)
+        q = numpy.array(fix.C.mean).ravel()
+
+        #states = mean+M*[x0, w1, ... wT]
+        M = numpy.zeros([steps*ndim, (steps+1)*ndim])
+        mean = numpy.zeros(steps*ndim)
+        power = numpy.eye(ndim)
+        x = numpy.array(state.mean).ravel()
+        for t in xrange(steps):
+            x = numpy.dot(F, x)+q
+            mean[t*ndim:(t+1)*ndim] = x
+            for k in xrange(t+1):
+                block = numpy.linalg.matrix_power(F, t+1-k)
+                M[t*ndim:(t+1)*ndim, k*ndim:(k+1)*ndim] = block
+
+            M[t*ndim:(t+1)*ndim, (t+1)*ndim:(t+2)*ndim] = numpy.eye(ndim)
+
+        blocks = [numpy.array(state.cov)]+[numpy.array(fix.C.cov)]*steps
+        cov = numpy.dot(numpy.dot(M, scipy.linalg.block_diag(*blocks)), M.T)
+
+        R = scipy.linalg.block_diag(*[numpy.array(sensor.cov)]*steps)
+        Y = (measurements+numpy.array(sensor.mean)).ravel()
+
+        S = cov+R
+        gain = numpy.linalg.solve(S, cov).T
+        smoothMean = mean+numpy.dot(gain, Y-mean)
+        smoothCov = cov-numpy.dot(gain, cov)
+
+        for (t, smoothed) in enumerate(states):
+            chunk = slice(t*ndim, (t+1)*ndim)
+            self.assertTrue(
+                smoothed == 
+                Mvn.fromCov(smoothCov[chunk, chunk], mean=smoothMean[chunk])
+            )
+
+        innovation = Y-mean
+        (sign, logdet) = numpy.linalg.slogdet(S)
+        expected = -0.5*(
+            numpy.dot(innovation, numpy.linalg.solve(S, innovation))+
+            logdet+
+            Y.size*numpy.log(2*numpy.pi)
+        )
+        self.assertTrue( numpy.allclose(logL, expected) )
+
+
+class benchTester(myTests):
+    def testRun(self):
+        results = bench.run(
+            ndims=[2], flats=[0, 1], infinite=[False, True],
+            select=['construct', 'and'], budget=0.001, repeat=1,
+        )
+
+        self.assertTrue( len(results['records']) == 2*2*2 )
+        self.assertTrue( all(
+            record['seconds'] > 0 
+            for record in results['records']
+        ))
+
+    def testCompare(self):
+        results = bench.run(
+            ndims=[2], flats=[0], infinite=[False],
+            select=['add'], budget=0.001, repeat=1,
+        )
+        slow = copy.deepcopy(results)
+        slow['records'][0]['seconds'] *= 2
+        broken = copy.deepcopy(results)
+        del broken['records'][0]['seconds']
+        broken['records'][0]['error'] = 'ValueError'
+
+        self.assertTrue( not bench.compare(results, results) )
+        self.assertTrue( bench.compare(slow, results) )
+        self.assertTrue( not bench.compare(slow, results, tolerance=1.5) )
+        self.assertTrue( bench.compare(broken, results) )
+
+
+class importTester(unittest.TestCase):
+    budget = 0.5
+    """
+    seconds allowed for a cold 'import mvn', with the fixture, matplotlib and 
+    scipy.stats loaded it was ~0.6s, without them it's ~0.15s 
+    """
+
+    heavy = ['matplotlib', 'pylab', 'scipy.stats', 'mvn.test.fixture']
+
+    def coldImport(self):
+        #an application that happens to import doctest doesn't get the 
+        #fixture either
+        script = '; '.join([
+            'import sys, time, json, doctest',
+            'start = time.time()',
+            'import mvn',
+            'elapsed = time.time()-start',
+            'loaded = [name for name in %r if name in sys.modules]' % self.heavy,
+            'print json.dumps([elapsed, loaded])',
+        ])
+
+        (root, _) = os.path.split(os.path.dirname(mvn.__file__))
+        env = dict(os.environ, PYTHONPATH=root)
+
+        output = subprocess.check_output(
+            [sys.executable, '-W', 'ignore', '-c', script], env=env
+        )
+
+        return json.loads(output.splitlines()[-1])
+
+    def testModules(self):
+        (_, loaded) = self.coldImport()
+        self.assertEqual(loaded, [])
+
+    def testBudget(self):
+        elapsed = min(self.coldImport()[0] for _ in range(3))
+        self.assertTrue( elapsed < self.budget )
+
+
 def getTests(fixture=None):
     testCases = [
         value for (name, value) in globals().iteritems() 